@@ -0,0 +1,66 @@
+"""
+Micro-benchmarks of the JSON codecs available to the client on realistic ProvStore payloads.
+
+Covers encoding upload envelopes and parsing document metadata, bundle listings and PROV-JSON documents.
+
+Usage::
+
+    python benchmarks/bench_codec.py [--records N] [--repeat N]
+"""
+import json
+import timeit
+import argparse
+
+from provstore.api import Api, _json_envelope
+from provstore.codec import available_codecs
+import provstore.tests.examples as examples
+
+
+def payloads(records):
+    prov_document = examples.large_document(records)
+
+    metadata = json.dumps({
+        'id': 148, 'document_name': "bench_codec", 'public': False, 'owner': "provstore-api-test",
+        'created_at': "2015-01-01T00:00:00.000000", 'views_count': 12
+    }).encode('utf-8')
+
+    bundles = json.dumps({
+        'meta': {'limit': 20, 'offset': 0, 'next': None, 'previous': None, 'total_count': 20},
+        'objects': [{'id': i, 'identifier': "ex:bundle-%i" % i, 'created_at': "2015-01-01T00:00:00.000000"}
+                    for i in range(20)]
+    }).encode('utf-8')
+
+    return prov_document, prov_document.serialize().encode('utf-8'), metadata, bundles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    prov_document, prov_json, metadata, bundles = payloads(args.records)
+
+    # Label, case and number of calls to time
+    cases = (
+        ('encode envelope', lambda api: b''.join(_json_envelope(api.codec, prov_document, rec_id="bench")),
+         args.repeat),
+        ('parse metadata', lambda api: api.codec.loads(metadata), 1000),
+        ('parse bundle listing', lambda api: api.codec.loads(bundles), 1000),
+        ('parse PROV-JSON', lambda api: api.codec.loads(prov_json), args.repeat),
+        ('deserialize document', lambda api: api._deserialize(prov_json), args.repeat),
+    )
+
+    codecs = available_codecs()
+    print("%-22s" % "us per call" + "".join("%12s" % codec.name for codec in codecs))
+    for label, case, number in cases:
+        row = "%-22s" % label
+        for codec in codecs:
+            api = Api(codec=codec)
+            seconds = min(timeit.repeat(lambda: case(api), number=number, repeat=3)) / number
+            row += "%12.1f" % (seconds * 1e6)
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Throughput and latency percentiles of storing, fetching and iterating over the bundles of documents of several sizes.
+
+Runs against a local ProvStore stand-in, optionally answering with injected latency to approximate a remote store.
+
+Usage::
+
+    python benchmarks/bench_store.py [--records 10 100 1000] [--operations N] [--threads N] [--bundles N]
+                                     [--latency SECONDS]
+"""
+import time
+import argparse
+import threading
+
+from provstore.api import Api
+from provstore.tests.server import FakeProvStore, FakeProvStoreServer
+import provstore.tests.examples as examples
+
+
+def percentile(latencies, p):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+def run(fn, operations, threads):
+    # Calls fn(i) for i in range(operations) across threads, returning the elapsed time and each call's latency
+    latencies = []
+    lock = threading.Lock()
+    indices = iter(range(operations))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(indices, None)
+            if i is None:
+                return
+
+            start = time.time()
+            fn(i)
+            latency = time.time() - start
+
+            with lock:
+                latencies.append(latency)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.time()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+
+    return time.time() - start, latencies
+
+
+def report(records, label, operations, elapsed, latencies):
+    print("%8i  %-16s %10.1f %10.1f %10.1f %10.1f" % (
+        records, label, operations / elapsed,
+        percentile(latencies, 50) * 1000, percentile(latencies, 90) * 1000, percentile(latencies, 99) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--operations', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--bundles', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    store = FakeProvStore(latency=args.latency)
+
+    print("%8s  %-16s %10s %10s %10s %10s" % ("records", "operation", "ops/s", "p50 (ms)", "p90 (ms)", "p99 (ms)"))
+    with FakeProvStoreServer(store) as server, Api(base_url=server.base_url, pool_maxsize=args.threads) as api:
+        for records in args.records:
+            prov_document = examples.large_document(records)
+            created = []
+
+            def create(i):
+                created.append(api.document.create(prov_document, name="bench_store %i" % i).id)
+
+            elapsed, latencies = run(create, args.operations, args.threads)
+            report(records, 'create', args.operations, elapsed, latencies)
+
+            def get(i):
+                api.document.get(created[i]).prov
+
+            elapsed, latencies = run(get, args.operations, args.threads)
+            report(records, 'get', args.operations, elapsed, latencies)
+
+            document = api.document.get(created[0], prov=False)
+            for i in range(args.bundles):
+                store.add_bundle(document.id, prov_document.serialize(), 'ex:bundle-%i' % i)
+
+            def iterate(i):
+                for bundle in api.document.get(document.id, prov=False).bundles.iter_prov(concurrency=args.threads):
+                    bundle.prov
+
+            operations = max(1, args.operations // args.bundles)
+            elapsed, latencies = run(iterate, operations, 1)
+            # Throughput in bundles, latency of iterating over all of a document's bundles
+            report(records, 'bundle iteration', operations * args.bundles, elapsed, latencies)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Requests per second against a local ProvStore stand-in, with and without connection pooling.
+
+Usage::
+
+    python benchmarks/bench_transport.py [--requests N] [--threads N]
+"""
+import time
+import argparse
+import threading
+
+import requests
+
+from provstore.api import Api
+from provstore.tests.server import FakeProvStoreServer
+import provstore.tests.examples as examples
+
+
+def unpooled(api, document_id):
+    # What every call did before the client owned a connection pool
+    requests.request('get', "%s/documents/%i/" % (api.base_url, document_id), headers=api.headers, timeout=30)
+
+
+def pooled(api, document_id):
+    api.get_document_meta(document_id)
+
+
+def run(fn, api, document_id, total, threads):
+    per_thread = total // threads
+
+    def worker():
+        for _ in range(per_thread):
+            fn(api, document_id)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.time()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+
+    return per_thread * threads / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    with FakeProvStoreServer() as server:
+        document_id = server.store.add_document(examples.flat_document().serialize(), "bench_transport")
+
+        with Api(base_url=server.base_url, pool_maxsize=args.threads) as api:
+            for label, fn in (('requests.request', unpooled), ('pooled session', pooled)):
+                connections = server.store.connections
+                rate = run(fn, api, document_id, args.requests, args.threads)
+                print("%-18s %8.1f req/s  %5i connections opened" % (
+                    label, rate, server.store.connections - connections))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Peak memory and CPU time of building document upload bodies, before and after single-pass encoding.
+
+The previous path serialized the document to a string and then JSON encoded that string into the request envelope.
+The current path embeds the PROV-JSON in the envelope as it is encoded and, above the stream threshold, hands the body
+to the connection in blocks.
+
+Usage::
+
+    python benchmarks/bench_upload.py [--records 10000 100000 1000000]
+"""
+import json
+import time
+import argparse
+import tracemalloc
+
+from provstore.api import Api, _json_envelope
+import provstore.tests.examples as examples
+
+
+def double_encoded(prov_document):
+    return json.dumps({
+        'content': prov_document.serialize(),
+        'public':  False,
+        'rec_id':  "bench_upload"
+    }).encode('utf-8')
+
+
+def single_pass(prov_document):
+    api = Api()
+    body = api._body(_json_envelope(api.codec, prov_document, public=False, rec_id="bench_upload"))
+
+    if isinstance(body, bytes):
+        return len(body)
+
+    # Drain as the connection would, one block at a time
+    return sum(len(block) for block in body)
+
+
+def measure(fn, prov_document):
+    start = time.process_time()
+    fn(prov_document)
+    cpu = time.process_time() - start
+
+    tracemalloc.start()
+    fn(prov_document)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    print("%10s  %-14s %10s %12s" % ("records", "path", "cpu (s)", "peak (MB)"))
+    for records in args.records:
+        prov_document = examples.large_document(records)
+
+        for label, fn in (('double encoded', double_encoded), ('single pass', single_pass)):
+            cpu, peak = measure(fn, prov_document)
+            print("%10i  %-14s %10.2f %12.1f" % (records, label, cpu, peak / 1024.0 / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,585 @@
+"""
+Asyncio ProvStore client.
+
+Mirrors :py:class:`provstore.api.Api`, :py:class:`provstore.document.Document` and
+:py:class:`provstore.bundle_manager.BundleManager` with coroutines so that many store operations can be in flight on
+a single event loop. Requires Python 3 and `aiohttp <https://docs.aiohttp.org/>`_
+(``pip install provstore-api[async]``).
+
+Example::
+
+  >>> from provstore.aio import AsyncApi
+  >>> async with AsyncApi(username="provstore username", api_key="api key") as api:
+  ...     documents = await asyncio.gather(*[api.document.get(document_id) for document_id in ids])
+"""
+import os
+import asyncio
+from urllib.parse import urlencode
+
+import aiohttp
+from prov.model import ProvDocument, parse_xsd_datetime
+from prov.serializers.provjson import decode_json_document
+
+from provstore.api import (DEFAULT_BASE_URL, DEFAULT_PAGE_SIZE, STATUS_EXCEPTIONS, ProvStoreException,
+                           RequestTimeoutException, NotFoundException, _json_envelope)
+from provstore.codec import default_codec
+from provstore.document import AbstractDocumentException, EmptyDocumentException, ImmutableDocumentException
+
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+
+class AsyncApi(object):
+    """
+    Asyncio ProvStore API client
+
+    :param int max_concurrency: Maximum number of requests in flight at once, further requests wait their turn
+    :param int pool_maxsize: Maximum number of connections kept open to the store
+    :param timeout: Seconds to wait for each request
+    :param codec: JSON codec for request and response bodies, the fastest available by default
+    :type codec: :py:class:`provstore.codec.Codec`
+    """
+    FORMAT_MAP = {
+        'json': 'application/json'
+    }
+
+    def __init__(self,
+                 username=None,
+                 api_key=None,
+                 base_url=None,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 pool_maxsize=DEFAULT_MAX_CONCURRENCY,
+                 timeout=30,
+                 codec=None):
+
+        if base_url is None:
+            self.base_url = DEFAULT_BASE_URL
+        else:
+            self.base_url = base_url.rstrip('/')
+
+        self._username = username or os.environ.get('PROVSTORE_USERNAME', None)
+        self._api_key = api_key or os.environ.get('PROVSTORE_API_KEY', None)
+
+        self._max_concurrency = max_concurrency
+        self._pool_maxsize = pool_maxsize
+        self._timeout = timeout
+        self.codec = codec if codec is not None else default_codec()
+
+        # Created on first use so that they are bound to the running event loop
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def __eq__(self, other):
+        if not isinstance(other, AsyncApi):
+            return False
+
+        return self.base_url == other.base_url
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def document(self):
+        return AsyncDocument(self)
+
+    @property
+    def headers(self):
+        headers = dict()
+
+        headers['Accept'] = 'application/json'
+
+        if self._username and self._api_key:
+            headers['Authorization'] = "ApiKey %s:%s" % (self._username, self._api_key)
+
+        return headers
+
+    async def close(self):
+        """
+        Close all pooled connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method, url, **kwargs):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._pool_maxsize),
+                timeout=aiohttp.ClientTimeout(total=self._timeout))
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async with self._semaphore:
+            try:
+                async with self._session.request(method, self.base_url + url, **kwargs) as r:
+                    status = r.status
+                    content = await r.read()
+            except asyncio.TimeoutError:
+                raise RequestTimeoutException()
+
+        if status in STATUS_EXCEPTIONS:
+            raise STATUS_EXCEPTIONS[status]()
+        elif status >= 400:
+            raise ProvStoreException()
+
+        return content
+
+    async def _deserialize(self, content):
+        # Parsing is CPU bound, keep it off the event loop
+        def deserialize():
+            prov_document = ProvDocument()
+            decode_json_document(self.codec.loads(content), prov_document)
+            return prov_document
+
+        return await asyncio.get_running_loop().run_in_executor(None, deserialize)
+
+    async def get_document_prov(self, document_id, prov_format=ProvDocument):
+        if prov_format == ProvDocument:
+            extension = 'json'
+        else:
+            extension = prov_format
+
+        content = await self._request('get', "/documents/%i.%s" % (document_id, extension),
+                                      headers=self.headers)
+
+        if prov_format == ProvDocument:
+            return await self._deserialize(content)
+        else:
+            return content
+
+    async def get_document_meta(self, document_id):
+        content = await self._request('get', "/documents/%i/" % document_id,
+                                      headers=self.headers)
+        return self.codec.loads(content)
+
+    async def post_document(self, prov_document, prov_format, name, public=False):
+        headers = self.headers
+        headers.update({'Content-type': self.FORMAT_MAP[prov_format]})
+
+        content = await self._request('post', '/documents/',
+                                      data=b''.join(_json_envelope(self.codec, prov_document, prov_format,
+                                                                   public=public,
+                                                                   rec_id=name)),
+                                      headers=headers)
+        return self.codec.loads(content)
+
+    async def add_bundle(self, document_id, prov_bundle, identifier):
+        headers = self.headers
+        headers.update({'Content-type': 'application/json'})
+
+        await self._request('post', "/documents/%i/bundles/" % document_id,
+                            data=b''.join(_json_envelope(self.codec, prov_bundle, rec_id=str(identifier))),
+                            headers=headers)
+
+        return True
+
+    async def get_bundles_page(self, document_id, offset=0, limit=DEFAULT_PAGE_SIZE):
+        content = await self._request('get', "/documents/%i/bundles/?%s" % (
+                                          document_id, urlencode([('limit', limit), ('offset', offset)])),
+                                      headers=self.headers)
+        return self.codec.loads(content)
+
+    async def get_bundles(self, document_id):
+        """
+        :return: Metadata of all of the document's bundles, following the listing's pages
+        :rtype: list
+        """
+        bundles = []
+        while True:
+            page = await self.get_bundles_page(document_id, offset=len(bundles))
+            bundles.extend(page['objects'])
+
+            if not page['meta'].get('next') or not page['objects']:
+                return bundles
+
+    async def get_bundle(self, document_id, bundle_id, prov_format=ProvDocument):
+        if prov_format == ProvDocument:
+            extension = 'json'
+        else:
+            extension = prov_format
+
+        content = await self._request('get', "/documents/%i/bundles/%i.%s" % (document_id, bundle_id, extension),
+                                      headers=self.headers)
+
+        if prov_format == ProvDocument:
+            return await self._deserialize(content)
+        else:
+            return content
+
+    async def delete_document(self, document_id):
+        await self._request('delete', "/documents/%i/" % document_id,
+                            headers=self.headers)
+        return True
+
+
+class AsyncDocument(object):
+    """
+    Asyncio counterpart of :py:class:`provstore.document.Document`.
+
+    Metadata properties cannot load themselves lazily, use :py:meth:`read_meta` (or :py:meth:`get`) before accessing
+    them. Accessed via :py:attr:`AsyncApi.document`.
+    """
+    def __init__(self, api):
+        self._api = api
+        self._id = None
+
+        self._name = None
+        self._public = None
+        self._owner = None
+        self._created_at = None
+        self._views = None
+
+        self._bundles = None
+
+        self._prov = None
+
+    def __eq__(self, other):
+        if not isinstance(other, AsyncDocument):
+            return False
+
+        return self._api == other._api and self.id == other.id
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        if self.abstract:
+            return "<Abstract AsyncDocument %s>" % self.__hash__()
+        else:
+            return "%s/documents/%i" % (self._api.base_url, self.id)
+
+    def _check_document_id(self, document_id):
+        if document_id:
+            if not self.abstract:
+                raise ImmutableDocumentException()
+            self._id = document_id
+
+        if self.abstract:
+            raise AbstractDocumentException()
+
+    # Abstract methods
+    async def create(self, prov_document, prov_format=None, refresh=False, **props):
+        """
+        Create a document on ProvStore.
+
+        :param prov_document: The document to be stored
+        :param prov_format: The format of the document provided
+        :param bool refresh: Whether or not to load back the document after saving
+        :param dict props: Properties for this document [**name** (required), **public** = False]
+        :return: This document itself but with a reference to the newly stored document
+        :rtype: :py:class:`provstore.aio.AsyncDocument`
+        """
+        if not self.abstract:
+            raise ImmutableDocumentException()
+
+        if isinstance(prov_document, ProvDocument):
+            self._prov = prov_document
+            prov_format = "json"
+
+        self._id = (await self._api.post_document(prov_document, prov_format, **props))['id']
+
+        if refresh:
+            await self.refresh()
+        else:
+            self._bundles = AsyncBundleManager(self._api, self)
+
+        return self
+
+    save = create
+
+    def set(self, document_id):
+        """
+        Associate this document with a ProvStore document without making any calls to the API.
+
+        :param int document_id: ID of the document on ProvStore
+        :return: self
+        """
+        if not self.abstract:
+            raise ImmutableDocumentException()
+        self._id = document_id
+        self._bundles = AsyncBundleManager(self._api, self)
+
+        return self
+
+    async def get(self, document_id):
+        """
+        Associate this model with a document on ProvStore and load its contents and metadata.
+
+        :param document_id: The document ID on ProvStore
+        :return: self
+        """
+        if not self.abstract:
+            raise ImmutableDocumentException()
+
+        return await self.read(document_id)
+
+    # Instance methods
+    async def read(self, document_id=None):
+        """
+        Load the document contents and metadata from the server, concurrently.
+
+        :param document_id: (optional) Set the document ID if this is an abstract document.
+        :return: self
+        """
+        self._check_document_id(document_id)
+
+        await asyncio.gather(self.read_prov(), self.read_meta())
+        return self
+
+    async def refresh(self):
+        """
+        Update information about the document from ProvStore.
+
+        :return: self
+        """
+        return await self.read()
+
+    async def read_prov(self, document_id=None):
+        """
+        Load the provenance of this document
+
+        :param document_id: (optional) set the document id if this is an :py:meth:`abstract` document
+        :return: :py:class:`prov.model.ProvDocument`
+        """
+        self._check_document_id(document_id)
+
+        self._prov = await self._api.get_document_prov(self.id)
+        return self._prov
+
+    async def read_meta(self, document_id=None):
+        """
+        Load metadata associated with the document
+
+        :param document_id: (optional) set the document id if this is an :py:meth:`abstract` document
+        :return: self
+        """
+        self._check_document_id(document_id)
+
+        metadata = await self._api.get_document_meta(self.id)
+
+        self._name = metadata['document_name']
+        self._public = metadata['public']
+        self._owner = metadata['owner']
+        self._created_at = parse_xsd_datetime(metadata['created_at'])
+        self._views = metadata['views_count']
+
+        self._bundles = AsyncBundleManager(self._api, self)
+
+        return self
+
+    async def add_bundle(self, prov_bundle, identifier):
+        """
+        Add a bundle to this document.
+
+        :param prov_bundle: The bundle to be added
+        :param str identifier: URI or QName for this bundle
+        :type prov_bundle: :py:class:`prov.model.ProvDocument`
+        """
+        if self.abstract:
+            raise AbstractDocumentException()
+
+        await self._api.add_bundle(self.id, prov_bundle, identifier)
+
+    @property
+    def bundles(self):
+        """
+        :return: This document's bundle manager
+        :rtype: :py:class:`provstore.aio.AsyncBundleManager`
+        """
+        if self.abstract:
+            raise AbstractDocumentException()
+
+        return self._bundles
+
+    async def delete(self):
+        """
+        Remove the document and all of its bundles from ProvStore.
+
+        .. warning::
+           Cannot be undone.
+        """
+        if self.abstract:
+            raise AbstractDocumentException()
+
+        await self._api.delete_document(self.id)
+        self._id = None
+
+        return True
+
+    @property
+    def id(self):
+        """
+        Unique ID of the document as defined by ProvStore.
+        """
+        return self._id
+
+    @property
+    def abstract(self):
+        """
+        True if this document doesn't reference a ProvStore document yet
+        """
+        return self.id is None
+
+    def _loaded(self, value):
+        if value is None:
+            raise EmptyDocumentException()
+        return value
+
+    @property
+    def name(self):
+        """
+        Name of document as seen on ProvStore
+        """
+        return self._loaded(self._name)
+
+    @property
+    def public(self):
+        """
+        Is this document visible to anyone?
+        """
+        return self._loaded(self._public)
+
+    @property
+    def owner(self):
+        """
+        Username of document creator
+        """
+        return self._loaded(self._owner)
+
+    @property
+    def created_at(self):
+        """
+        :return: When the document was created
+        :rtype: :py:class:`datetime.datetime`
+        """
+        return self._loaded(self._created_at)
+
+    @property
+    def views(self):
+        """
+        Number of views this document has received on ProvStore
+        """
+        return self._loaded(self._views)
+
+    @property
+    def prov(self):
+        """
+        Provenance loaded for this document as :py:class:`prov.model.ProvDocument`
+        """
+        return self._loaded(self._prov)
+
+
+class AsyncBundleManager(object):
+    """
+    Asyncio counterpart of :py:class:`provstore.bundle_manager.BundleManager`.
+
+    Iterate with ``async for``, bundle listings are loaded on first use:
+      >>> async for bundle in document.bundles:
+      ...     prov = await bundle.read_prov()
+    """
+    def __init__(self, api, document):
+        self._api = api
+        self._document = document
+        self._bundles = None
+
+    async def get(self, key):
+        """
+        :return: The bundle with the identifier given
+        :rtype: :py:class:`provstore.aio.AsyncBundle`
+        :raises NotFoundException: If the document has no such bundle
+        """
+        if self._bundles is None:
+            await self.refresh()
+
+        if key not in self._bundles:
+            raise NotFoundException()
+
+        return self._bundles[key]
+
+    async def set(self, key, prov_bundle):
+        await self._document.add_bundle(prov_bundle, key)
+
+    async def __aiter__(self):
+        if self._bundles is None:
+            await self.refresh()
+
+        for bundle in list(self._bundles.values()):
+            yield bundle
+
+    def __len__(self):
+        if self._bundles:
+            return len(self._bundles)
+        else:
+            return 0
+
+    async def refresh(self):
+        """
+        Reload list of bundles from the store
+
+        :return: self
+        """
+        bundles = await self._api.get_bundles(self._document.id)
+
+        self._bundles = {}
+        for bundle in bundles:
+            self._bundles[bundle['identifier']] = AsyncBundle(self._api, self._document, bundle)
+
+        return self
+
+
+class AsyncBundle(object):
+    """
+    Asyncio counterpart of :py:class:`provstore.bundle.Bundle`.
+    """
+    def __init__(self, api, document, bundle):
+        self._api = api
+
+        self._id = bundle['id']
+        self._created_at = parse_xsd_datetime(bundle['created_at'])
+        self._identifier = bundle['identifier']
+        self._document = document
+
+        self._prov = None
+
+    @property
+    def created_at(self):
+        """
+        :return: When the bundle was added
+        :rtype: :py:class:`datetime.datetime`
+        """
+        return self._created_at
+
+    @property
+    def identifier(self):
+        """
+        :return: Identifier of the bundle, used as index on :py:class:`provstore.aio.AsyncBundleManager`
+        :rtype: str
+        """
+        return self._identifier
+
+    async def read_prov(self):
+        """
+        Load this bundle's provenance
+
+        :rtype: :py:class:`prov.model.ProvDocument`
+        """
+        if self._prov is None:
+            self._prov = await self._api.get_bundle(self._document.id, self._id)
+
+        return self._prov
+
+    @property
+    def prov(self):
+        """
+        :return: This bundle's provenance, once loaded by :py:meth:`read_prov`
+        :rtype: :py:class:`prov.model.ProvDocument`
+        """
+        if self._prov is None:
+            raise EmptyDocumentException()
+
+        return self._prov
@@ -1,12 +1,52 @@
 import os
-import json
+import re
+import time
+import weakref
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+try:
+    from urllib.parse import urlencode
+except ImportError:  # pragma: no cover
+    from urllib import urlencode
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from copy import copy
 from prov.model import ProvDocument
+from prov.serializers.provjson import encode_json_document, decode_json_document
 from provstore.document import Document
+from provstore.batch import Batch, DEFAULT_CONCURRENCY
+from provstore.cache import CacheEntry
+from provstore.lazy import LazyProvDocument
+from provstore.codec import default_codec
+from provstore.compat import clock as _clock
+from provstore.dedup import DedupIndex, canonical_hash
+from provstore.ratelimit import RateLimiter, TokenBucket
+from provstore.singleflight import SingleFlight
+from provstore.stats import RequestEvent
+from provstore.uploader import Uploader
+from provstore.retry import RetryPolicy, DEFAULT_MAX_RETRIES as MAX_RETRIES
 
 
-MAX_RETRIES = 3
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
+
+# Seconds to wait for each request
+REQUEST_TIMEOUT = 30
+
+DEFAULT_BASE_URL = 'https://provenance.ecs.soton.ac.uk/store/api/v0'
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# Request bodies larger than this are streamed with chunked transfer encoding
+DEFAULT_STREAM_THRESHOLD = 1024 * 1024
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+# Number of documents requested per page of a listing
+DEFAULT_PAGE_SIZE = 100
 
 
 class ProvStoreException(Exception):
@@ -41,6 +81,103 @@ class DocumentInvalidException(ProvStoreException):
     pass
 
 
+class CircuitOpenException(ProvStoreException):
+    """
+    Raised without contacting the store when its endpoint's circuit is open, see :py:mod:`provstore.circuit`
+    """
+    pass
+
+
+class ConcurrencyLimitException(ProvStoreException):
+    """
+    Raised without contacting the store when no request slot freed up in time, see :py:mod:`provstore.circuit`
+    """
+    pass
+
+
+class RateLimitException(ProvStoreException):
+    """
+    Raised without contacting the store when a request would wait too long for its rate limit,
+    see :py:mod:`provstore.ratelimit`
+    """
+    pass
+
+
+def _iter_prov_json(codec, prov_document):
+    # Encodes PROV-JSON a record at a time so that the whole text never has to be held in memory
+    container = encode_json_document(prov_document)
+
+    yield b'{'
+    for i, (section, records) in enumerate(container.items()):
+        yield (b', ' if i else b'') + codec.dumps(section) + b': {'
+        for j, (identifier, record) in enumerate(records.items()):
+            yield (b', ' if j else b'') + codec.dumps(identifier) + b': ' + codec.dumps(record)
+        yield b'}'
+    yield b'}'
+
+
+def _json_envelope(codec, content, prov_format='json', **fields):
+    """
+    Encode a request body holding the given fields and document content as UTF-8 chunks.
+
+    PROV-JSON content is embedded as a JSON object rather than as an escaped string so that it is only encoded
+    once, :py:class:`prov.model.ProvDocument` content is encoded as it is read.
+    """
+    yield codec.dumps(fields)[:-1] + b', "content": '
+
+    if isinstance(content, LazyProvDocument) and not content.parsed:
+        # Downloaded and left untouched, forward it as is
+        yield content.raw
+    elif isinstance(content, ProvDocument):
+        for chunk in _iter_prov_json(codec, content):
+            yield chunk
+    elif prov_format != 'json':
+        yield codec.dumps(content.decode('utf-8') if isinstance(content, bytes) else content)
+    elif isinstance(content, bytes):
+        yield content
+    else:
+        yield content.encode('utf-8')
+
+    yield b'}'
+
+
+def _parse_prov_json(content, transform=None):
+    # Runs in the worker processes of Api.get_documents, only the result is sent back
+    prov_document = ProvDocument()
+    decode_json_document(default_codec().loads(content), prov_document)
+
+    if transform is not None:
+        return transform(prov_document)
+    return prov_document
+
+
+# Endpoints requests are grouped by for circuit breaking, matched against request paths in order
+ENDPOINTS = (
+    (re.compile(r'^/documents/-?\d+/bundles/'), 'bundles'),
+    (re.compile(r'^/documents/-?\d+/$'), 'metadata'),
+    (re.compile(r'^/documents/\?'), 'metadata'),
+)
+
+
+def _endpoint(url):
+    for pattern, endpoint in ENDPOINTS:
+        if pattern.match(url):
+            return endpoint
+    return 'documents'
+
+
+# Exceptions raised for error responses from the store
+STATUS_EXCEPTIONS = {
+    500: ProvStoreException,
+    422: UnprocessableException,
+    410: DocumentInvalidException,
+    404: NotFoundException,
+    403: ForbiddenException,
+    401: InvalidCredentialsException,
+    400: InvalidDataException,
+}
+
+
 class Api(object):
     """
     Main ProvStore API client object
@@ -57,18 +194,84 @@ class Api(object):
        **PROVSTORE_USERNAME** and **PROVSTORE_API_KEY** environment variables.
 
     To read public documents no credentials need be provided.
+
+    All requests made through the client (including those made by its Document, BundleManager and Bundle objects)
+    share a pool of keep-alive connections. The pool can be tuned on creation:
+      >>> api = Api(pool_connections=4, pool_maxsize=32)
+
+    :param int pool_connections: Number of hosts to keep connection pools for
+    :param int pool_maxsize: Maximum number of connections kept open to each host
+    :param bool pool_block: Whether to block when all of a host's connections are in use rather than open a new one
+    :param bool keep_alive: Whether to reuse connections between requests
+    :param cache: Cache for downloaded document and bundle content, see :py:mod:`provstore.cache`
+    :type cache: :py:class:`provstore.cache.Cache` or None
+    :param codec: JSON codec for request and response bodies, the fastest available by default
+    :type codec: :py:class:`provstore.codec.Codec`
+    :param retry: When to retry failed requests, by default idempotent requests are retried up to
+                  :py:data:`MAX_RETRIES` times with exponential backoff
+    :type retry: :py:class:`provstore.retry.RetryPolicy`
+    :param circuit_breaker: Stops calling failing endpoints of the store for a while
+    :type circuit_breaker: :py:class:`provstore.circuit.CircuitBreaker` or None
+    :param limiter: Bounds the number of requests in flight
+    :type limiter: :py:class:`provstore.circuit.AdaptiveLimiter` or None
+    :param rate_limiter: Spaces out requests to stay under the store's quota, a bucket limits all requests alike
+    :type rate_limiter: :py:class:`provstore.ratelimit.RateLimiter`, :py:class:`provstore.ratelimit.TokenBucket`
+                        or None
+    :param stats: Collects request, cache and parsing statistics, see :py:mod:`provstore.stats`
+    :type stats: :py:class:`provstore.stats.StatsCollector` or None
+    :param hooks: Functions called with a :py:class:`provstore.stats.RequestEvent` before and after every attempt at a
+                  request, as a dict of lists keyed by ``'before_request'`` and ``'after_request'``
+    :param float timeout: Seconds to wait for the store to respond to a request
+    :param int stream_threshold: Size in bytes above which uploads are streamed rather than sent in one piece
+    :param meta_ttl: Seconds before a document's loaded metadata is considered stale and reloaded on next access,
+                     None to keep it for the lifetime of the document object
+    :param bool identity_map: Whether :py:meth:`provstore.document.Document.set` and
+                              :py:meth:`provstore.document.Document.get` of an ID return the document object already
+                              in use for it, if any, with whatever it has loaded. Documents are forgotten once no
+                              longer referenced elsewhere.
+    :param single_flight: Whether concurrent reads of the same provenance share one request and one result, see
+                          :py:mod:`provstore.singleflight`
+    :type single_flight: bool or :py:class:`provstore.singleflight.SingleFlight`
+    :param dedup: Whether to refer to already stored documents and bundles rather than upload identical content again,
+                  True for an index kept in memory, see :py:mod:`provstore.dedup`
+    :type dedup: bool or :py:class:`provstore.dedup.DedupIndex`
+
+    The client can be used from several threads at once. Use :py:meth:`close` (or the client as a context manager)
+    to release pooled connections when done with it:
+      >>> with Api() as api:
+      ...     api.document.get(148)
     """
     FORMAT_MAP = {
         'json': 'application/json'
     }
 
+    HOOKS = ('before_request', 'after_request')
+
     def __init__(self,
                  username=None,
                  api_key=None,
-                 base_url=None):
+                 base_url=None,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False,
+                 keep_alive=True,
+                 cache=None,
+                 meta_ttl=None,
+                 stream_threshold=DEFAULT_STREAM_THRESHOLD,
+                 codec=None,
+                 retry=None,
+                 circuit_breaker=None,
+                 limiter=None,
+                 rate_limiter=None,
+                 stats=None,
+                 hooks=None,
+                 timeout=REQUEST_TIMEOUT,
+                 identity_map=False,
+                 single_flight=False,
+                 dedup=False):
 
         if base_url is None:
-            self.base_url = 'https://provenance.ecs.soton.ac.uk/store/api/v0'
+            self.base_url = DEFAULT_BASE_URL
         else:
             self.base_url = base_url.rstrip('/')
 
@@ -80,6 +283,58 @@ class Api(object):
         if not self._api_key:
             self._api_key = os.environ.get('PROVSTORE_API_KEY', None)
 
+        self._keep_alive = keep_alive
+        self._adapter = HTTPAdapter(pool_connections=pool_connections,
+                                    pool_maxsize=pool_maxsize,
+                                    pool_block=pool_block)
+        self._local = threading.local()
+
+        self._pool_maxsize = pool_maxsize
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        self.cache = cache
+        self.meta_ttl = meta_ttl
+        self.stream_threshold = stream_threshold
+        self.codec = codec if codec is not None else default_codec()
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.circuit_breaker = circuit_breaker
+        self.limiter = limiter
+        if isinstance(rate_limiter, TokenBucket):
+            rate_limiter = RateLimiter(default=rate_limiter)
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+
+        self.hooks = dict((event, []) for event in self.HOOKS)
+        for event, event_hooks in (hooks or {}).items():
+            for hook in event_hooks:
+                self.register_hook(event, hook)
+
+        self.stats = stats
+        if stats is not None:
+            self.register_hook('after_request', stats.after_request)
+
+        # Number of metadata requests made, see get_document_meta
+        self.meta_fetches = 0
+        self._counter_lock = threading.Lock()
+
+        self._documents = weakref.WeakValueDictionary() if identity_map else None
+
+        if single_flight is True:
+            single_flight = SingleFlight()
+        self.single_flight = single_flight or None
+
+        if dedup is True:
+            dedup = DedupIndex()
+        self.dedup = dedup or None
+        self._documents_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     def __eq__(self, other):
         if not isinstance(other, Api):
             return False
@@ -93,6 +348,24 @@ class Api(object):
     def document(self):
         return Document(self)
 
+    def _identify(self, document):
+        # The document in use for document.id, registering document if there is none (or no identity map)
+        if self._documents is None:
+            return document
+
+        with self._documents_lock:
+            existing = self._documents.get(document.id)
+            if existing is not None:
+                return existing
+
+            self._documents[document.id] = document
+            return document
+
+    def _forget(self, document_id):
+        if self._documents is not None:
+            with self._documents_lock:
+                self._documents.pop(document_id, None)
+
     @property
     def headers(self):
         headers = dict()
@@ -104,31 +377,171 @@ class Api(object):
 
         return headers
 
-    def _request(self, method, url, retries=0, *args, **kwargs):
-        url = self.base_url + url
+    @property
+    def session(self):
+        """
+        The calling thread's HTTP session.
+
+        Each thread gets its own :py:class:`requests.Session` but all sessions share this client's connection pool.
+
+        :rtype: :py:class:`requests.Session`
+        """
+        session = getattr(self._local, 'session', None)
+
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            if not self._keep_alive:
+                session.headers['Connection'] = 'close'
+
+            self._local.session = session
+
+        return session
+
+    @property
+    def executor(self):
+        """
+        Thread pool used to issue this client's own requests concurrently, such as a document's provenance and
+        metadata in :py:meth:`provstore.document.Document.read`. Sized to the connection pool.
+
+        :rtype: :py:class:`concurrent.futures.ThreadPoolExecutor`
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._pool_maxsize)
 
+            return self._executor
+
+    def close(self):
+        """
+        Close all pooled connections and stop the client's threads.
+
+        The client remains usable afterwards, new connections will be opened as needed.
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        self._adapter.close()
+
+    def register_hook(self, event, hook):
+        """
+        Call a function with a :py:class:`provstore.stats.RequestEvent` on every attempt at a request
+
+        :param str event: ``'before_request'`` or ``'after_request'``
+        """
+        if event not in self.hooks:
+            raise ValueError("Unknown hook event %r, expected one of %s" % (event, ', '.join(self.HOOKS)))
+        self.hooks[event].append(hook)
+
+    def deregister_hook(self, event, hook):
+        """
+        :return: Whether the hook was registered
+        :rtype: bool
+        """
         try:
-            kwargs.update({'timeout': 30})
-            r = requests.request(method, url, **kwargs)
-        except requests.exceptions.Timeout:
-            if retries < MAX_RETRIES:
-                return self._request(method, *args, retries=retries+1, **kwargs)
-            raise RequestTimeoutException()
-
-        if r.status_code == 500:
-            raise ProvStoreException()
-        elif r.status_code == 422:
-            raise UnprocessableException()
-        elif r.status_code == 410:
-            raise DocumentInvalidException()
-        elif r.status_code == 404:
-            raise NotFoundException()
-        elif r.status_code == 403:
-            raise ForbiddenException()
-        elif r.status_code == 401:
-            raise InvalidCredentialsException()
-        elif r.status_code == 400:
-            raise InvalidDataException()
+            self.hooks[event].remove(hook)
+            return True
+        except (KeyError, ValueError):
+            return False
+
+    @staticmethod
+    def _count_sent(chunks, event):
+        for chunk in chunks:
+            event.bytes_sent += len(chunk)
+            yield chunk
+
+    def _send(self, method, url, endpoint, attempt=0, **kwargs):
+        # A single attempt at a request, accounted for by the circuit breaker and limiters
+        limiter, circuit_breaker = self.limiter, self.circuit_breaker
+
+        # Wait for the rate limit before taking a slot, so as not to hold it while waiting
+        if self.rate_limiter is not None and not self.rate_limiter.acquire(method):
+            raise RateLimitException()
+        if limiter is not None and not limiter.acquire():
+            raise ConcurrencyLimitException()
+        if circuit_breaker is not None and not circuit_breaker.allow(endpoint):
+            if limiter is not None:
+                limiter.release()
+            raise CircuitOpenException()
+
+        event = RequestEvent(method, url, endpoint, attempt)
+        data = kwargs.get('data')
+        if isinstance(data, (bytes, text_type)):
+            event.bytes_sent = len(data)
+        elif data is not None:
+            kwargs['data'] = self._count_sent(data, event)
+
+        try:
+            for hook in self.hooks['before_request']:
+                hook(event)
+        except Exception:
+            # The request is not made, give back what was taken for it
+            if limiter is not None:
+                limiter.release()
+            if circuit_breaker is not None:
+                circuit_breaker.cancel(endpoint)
+            raise
+
+        started_at = _clock()
+        success = False
+        try:
+            r = event.response = self.session.request(method, url, **kwargs)
+            if not kwargs.get('stream'):
+                event.bytes_received = len(r.content)
+            # Being throttled is a sign of overload too
+            success = r.status_code < 500 and r.status_code != 429
+            return r
+        except Exception as e:
+            event.exception = e
+            raise
+        finally:
+            latency = event.elapsed = _clock() - started_at
+            for hook in self.hooks['after_request']:
+                hook(event)
+            if limiter is not None:
+                limiter.release(latency, success)
+            if circuit_breaker is not None:
+                circuit_breaker.record(endpoint, success, latency)
+
+    def _request(self, method, url, **kwargs):
+        endpoint = _endpoint(url)
+        url = self.base_url + url
+
+        # Generator bodies are consumed by the first attempt
+        replayable = isinstance(kwargs.get('data'), (bytes, text_type, type(None)))
+
+        started_at = _clock()
+        attempt = 0
+
+        while True:
+            timeout = self.timeout
+            remaining = self.retry.remaining(started_at)
+            if remaining is not None:
+                timeout = max(0.001, min(timeout, remaining))
+
+            try:
+                kwargs.update({'timeout': timeout})
+                r = self._send(method, url, endpoint, attempt, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                delay = self.retry.retry_delay(method, attempt, started_at, exception=e) if replayable else None
+                if delay is None:
+                    if isinstance(e, requests.exceptions.Timeout):
+                        raise RequestTimeoutException()
+                    raise
+            else:
+                delay = self.retry.retry_delay(method, attempt, started_at, response=r) if replayable else None
+                if delay is None:
+                    break
+                r.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+        if r.status_code in STATUS_EXCEPTIONS:
+            raise STATUS_EXCEPTIONS[r.status_code]()
         else:
             # Fallback, this should not happen!
             r.raise_for_status()
@@ -139,72 +552,492 @@ class Api(object):
     def _authorization_header(self):
         return "ApiKey %s:%s" % (self._username, self._api_key)
 
-    def get_document_prov(self, document_id, prov_format=ProvDocument):
-        if prov_format == ProvDocument:
-            extension = 'json'
-        else:
-            extension = prov_format
+    def _deserialize(self, content):
+        started_at = _clock()
 
-        r = self._request('get', "/documents/%i.%s" % (document_id, extension),
-                          headers=self.headers)
+        prov_document = ProvDocument()
+        decode_json_document(self.codec.loads(content), prov_document)
 
+        if self.stats is not None:
+            self.stats.record_parse(_clock() - started_at)
+        return prov_document
+
+    @staticmethod
+    def _extension(prov_format):
+        if prov_format in (ProvDocument, LazyProvDocument):
+            return 'json'
+        return prov_format
+
+    def _prov_result(self, content, prov_format):
         if prov_format == ProvDocument:
-            return ProvDocument.deserialize(content=r.content)
+            return self._deserialize(content)
+        elif prov_format == LazyProvDocument:
+            return LazyProvDocument(content, self._deserialize)
         else:
-            return r.content
+            return content
+
+    def _get_content(self, url, cache_key):
+        if self.cache is None:
+            return self._request('get', url, headers=self.headers).content
+
+        stats = self.stats
+        entry = self.cache.get(cache_key)
+        if entry is not None and not entry.validators:
+            # Nothing to revalidate with, stored content does not change
+            if stats is not None:
+                stats.record_cache(True)
+            return entry.content
+
+        headers = self.headers
+        if entry is not None:
+            headers.update(entry.validators)
+
+        r = self._request('get', url, headers=headers)
+        if r.status_code == 304 and entry is not None:
+            if stats is not None:
+                stats.record_cache(True)
+            return entry.content
+
+        if stats is not None:
+            stats.record_cache(False)
+        self.cache.set(cache_key, CacheEntry(r.content,
+                                             etag=r.headers.get('ETag'),
+                                             last_modified=r.headers.get('Last-Modified')))
+        return r.content
+
+    def _get_prov(self, url, cache_key, prov_format):
+        def get():
+            return self._prov_result(self._get_content(url, cache_key), prov_format)
+
+        if self.single_flight is None:
+            return get()
+
+        result, shared = self.single_flight.do((url, prov_format), get)
+        if shared and self.stats is not None:
+            self.stats.record_coalesced()
+        return result
+
+    def _stream_content(self, url, chunk_size):
+        # Request eagerly so that errors are raised by the call rather than on iteration
+        r = self._request('get', url, headers=self.headers, stream=True)
+        stats, endpoint = self.stats, _endpoint(url)
+
+        def iter_content():
+            try:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    if stats is not None:
+                        stats.record_received(endpoint, len(chunk))
+                    yield chunk
+            finally:
+                r.close()
+
+        return iter_content()
+
+    def get_document_prov(self, document_id, prov_format=ProvDocument, stream=False,
+                          chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :param prov_format: :py:class:`prov.model.ProvDocument` to get the parsed document,
+                            :py:class:`provstore.lazy.LazyProvDocument` to get it parsed on first use, or a format
+                            extension (e.g. ``'json'``) to get the raw content
+        :param bool stream: Return the raw content as an iterator of byte chunks read from the connection as they are
+                            consumed, instead of loading it into memory. Bypasses the cache.
+        :param int chunk_size: Size of streamed chunks
+        """
+        extension = self._extension(prov_format)
+
+        if stream:
+            if extension != prov_format:
+                raise ValueError("Only raw formats can be streamed")
+            return self._stream_content("/documents/%i.%s" % (document_id, extension), chunk_size)
+
+        return self._get_prov("/documents/%i.%s" % (document_id, extension),
+                              (self.base_url, document_id, None, extension), prov_format)
 
     def get_document_meta(self, document_id):
+        with self._counter_lock:
+            self.meta_fetches += 1
+
         r = self._request('get', "/documents/%i/" % document_id,
                           headers=self.headers)
-        return r.json()
+        return self.codec.loads(r.content)
+
+    def _body(self, chunks):
+        # Small bodies are sent in one piece, larger ones are streamed in blocks as they are encoded
+        chunks = iter(chunks)
+        buffered, size = [], 0
+
+        for chunk in chunks:
+            buffered.append(chunk)
+            size += len(chunk)
+
+            if size >= self.stream_threshold:
+                return self._iter_body(buffered, chunks)
+
+        return b''.join(buffered)
+
+    @staticmethod
+    def _iter_body(buffered, chunks):
+        yield b''.join(buffered)
+
+        block, size = [], 0
+        for chunk in chunks:
+            block.append(chunk)
+            size += len(chunk)
+
+            if size >= DEFAULT_CHUNK_SIZE:
+                yield b''.join(block)
+                block, size = [], 0
+
+        if block:
+            yield b''.join(block)
 
     def post_document(self, prov_document, prov_format, name, public=False):
+        """
+        :param prov_document: The document, serialized in prov_format unless a :py:class:`prov.model.ProvDocument`
+        """
         headers = copy(self.headers)
         headers.update({'Content-type': self.FORMAT_MAP[prov_format]})
 
         r = self._request('post', '/documents/',
-                          data=json.dumps({
-                              'content': prov_document,
-                              'public':  public,
-                              'rec_id':  name
-                          }),
+                          data=self._body(_json_envelope(self.codec, prov_document, prov_format,
+                                                         public=public,
+                                                         rec_id=name)),
                           headers=headers)
-        return r.json()
+        return self.codec.loads(r.content)
+
+    @property
+    def _dedup_scope(self):
+        return "%s %s" % (self.base_url, self._username)
+
+    def _hashed(self, prov_document, prov_format='json'):
+        # Encode a document once for both its hash and its upload
+        if isinstance(prov_document, ProvDocument) and not (isinstance(prov_document, LazyProvDocument) and
+                                                             not prov_document.parsed):
+            container = encode_json_document(prov_document)
+            return self.codec.dumps(container), 'json', canonical_hash(container)
+
+        return prov_document, prov_format, canonical_hash(prov_document, prov_format)
+
+    def _create_document(self, prov_document, prov_format, name, public=False):
+        # Store a document unless the dedup index knows of one with the same content, returning its ID
+        if self.dedup is None:
+            return self.post_document(prov_document, prov_format, name, public=public)['id']
+
+        prov_document, prov_format, content_hash = self._hashed(prov_document, prov_format)
+        document_id = self.dedup.document(self._dedup_scope, content_hash, public)
+        if document_id is None:
+            document_id = self.post_document(prov_document, prov_format, name, public=public)['id']
+            self.dedup.add_document(self._dedup_scope, content_hash, public, document_id)
+
+        return document_id
 
     def add_bundle(self, document_id, prov_bundle, identifier):
+        """
+        :param prov_bundle: The bundle as a :py:class:`prov.model.ProvDocument` or serialized to PROV-JSON
+        :return: The new bundle's metadata, None if the store did not return it or if the dedup index shows the bundle
+                 was already added
+        :rtype: dict or None
+        """
+        identifier = text_type(identifier)
+
+        content_hash = None
+        if self.dedup is not None:
+            prov_bundle, _, content_hash = self._hashed(prov_bundle)
+            if self.dedup.has_bundle(self._dedup_scope, document_id, identifier, content_hash):
+                return None
+
         headers = copy(self.headers)
         headers.update({'Content-type': 'application/json'})
 
-        self._request('post', "/documents/%i/bundles/" % document_id,
-                      data=json.dumps({
-                          'content': json.loads(prov_bundle),
-                          'rec_id':  unicode(identifier)
-                      }),
-                      headers=headers)
+        r = self._request('post', "/documents/%i/bundles/" % document_id,
+                          data=self._body(_json_envelope(self.codec, prov_bundle, rec_id=identifier)),
+                          headers=headers)
+
+        if self.cache is not None:
+            # The document's content includes its bundles
+            self.cache.invalidate(self.base_url, document_id)
+        if content_hash is not None:
+            self.dedup.add_bundle(self._dedup_scope, document_id, identifier, content_hash)
 
-        return True
+        return self.codec.loads(r.content) if r.content else None
 
-    def get_bundles(self, document_id):
-        r = self._request('get', "/documents/%i/bundles/" % document_id,
+    def get_documents_page(self, offset=0, limit=DEFAULT_PAGE_SIZE, owner=None, public=None):
+        """
+        :return: A page of the document listing, as a dict with the documents' metadata as ``objects`` and the
+                 listing's ``meta`` (``total_count``, ``next``...)
+        """
+        params = {'offset': offset, 'limit': limit}
+        if owner is not None:
+            params['owner'] = owner
+        if public is not None:
+            params['public'] = 'true' if public else 'false'
+
+        r = self._request('get', "/documents/?%s" % urlencode(sorted(params.items())),
                           headers=self.headers)
+        return self.codec.loads(r.content)
 
-        return r.json()['objects']
+    def documents(self, owner=None, public=None, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Iterate over the documents stored, a page at a time.
 
-    def get_bundle(self, document_id, bundle_id, prov_format=ProvDocument):
-        if prov_format == ProvDocument:
-            extension = 'json'
-        else:
-            extension = prov_format
+        Pages are fetched lazily, the next one while the current one is being iterated over, so that listing a large
+        store takes constant memory. Documents come with their metadata, their provenance is only downloaded if used:
+          >>> for document in api.documents(owner='username'):
+          ...     print(document.id, document.name, document.created_at)
+
+        :param str owner: Only list documents of this user
+        :param bool public: Only list public (True) or private (False) documents
+        :param int page_size: Number of documents requested at once
+        :return: Generator of :py:class:`provstore.document.Document`
+        """
+        def page(offset):
+            return self.get_documents_page(offset, page_size, owner=owner, public=public)
+
+        for metadata in self._iter_pages(page):
+            document = self.document.set(metadata['id'])
+            yield document._load_meta(metadata)
 
-        r = self._request('get', "/documents/%i/bundles/%i.%s" % (document_id, bundle_id, extension),
+    def _iter_pages(self, page):
+        # Objects of a paginated listing, page(offset) fetching the page at offset. The next page is fetched on the
+        # executor while the current one is consumed.
+        offset = 0
+        current = page(offset)
+        upcoming = None
+        try:
+            while True:
+                objects = current['objects']
+                offset += len(objects)
+
+                if current['meta'].get('next') and objects:
+                    upcoming = self.executor.submit(page, offset)
+
+                for obj in objects:
+                    yield obj
+
+                if upcoming is None:
+                    return
+                current, upcoming = upcoming.result(), None
+        finally:
+            if upcoming is not None:
+                upcoming.cancel()
+
+    def get_bundles_page(self, document_id, offset=0, limit=DEFAULT_PAGE_SIZE, identifier=None):
+        """
+        :param str identifier: Only list the bundle with this identifier
+        :return: A page of the document's bundle listing, as a dict with the bundles' metadata as ``objects`` and the
+                 listing's ``meta`` (``total_count``, ``next``...)
+        """
+        params = {'offset': offset, 'limit': limit}
+        if identifier is not None:
+            params['identifier'] = text_type(identifier)
+
+        r = self._request('get', "/documents/%i/bundles/?%s" % (document_id, urlencode(sorted(params.items()))),
                           headers=self.headers)
+        return self.codec.loads(r.content)
 
-        if prov_format == ProvDocument:
-            return ProvDocument.deserialize(content=r.content)
-        else:
-            return r.content
+    def get_bundles(self, document_id):
+        """
+        :return: Metadata of all of the document's bundles, following the listing's pages
+        :rtype: list
+        """
+        return list(self._iter_pages(lambda offset: self.get_bundles_page(document_id, offset)))
+
+    def get_bundle(self, document_id, bundle_id, prov_format=ProvDocument, stream=False,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :param prov_format: :py:class:`prov.model.ProvDocument` to get the parsed bundle,
+                            :py:class:`provstore.lazy.LazyProvDocument` to get it parsed on first use, or a format
+                            extension (e.g. ``'json'``) to get the raw content
+        :param bool stream: Return the raw content as an iterator of byte chunks, see :py:meth:`get_document_prov`
+        :param int chunk_size: Size of streamed chunks
+        """
+        extension = self._extension(prov_format)
+
+        if stream:
+            if extension != prov_format:
+                raise ValueError("Only raw formats can be streamed")
+            return self._stream_content("/documents/%i/bundles/%i.%s" % (document_id, bundle_id, extension),
+                                        chunk_size)
+
+        return self._get_prov("/documents/%i/bundles/%i.%s" % (document_id, bundle_id, extension),
+                              (self.base_url, document_id, bundle_id, extension), prov_format)
+
+    @staticmethod
+    def _write_chunks(chunks, destination):
+        if hasattr(destination, 'write'):
+            written = 0
+            for chunk in chunks:
+                destination.write(chunk)
+                written += len(chunk)
+            return written
+
+        with open(destination, 'wb') as f:
+            return Api._write_chunks(chunks, f)
+
+    def download_document(self, document_id, destination, prov_format='json', chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Stream a document's content to a file without holding it in memory.
+
+        :param destination: Path of the file to write to, or a binary file-like object
+        :param str prov_format: Format extension to download
+        :return: Number of bytes written
+        """
+        return self._write_chunks(self.get_document_prov(document_id, prov_format, stream=True,
+                                                         chunk_size=chunk_size),
+                                  destination)
+
+    def download_bundle(self, document_id, bundle_id, destination, prov_format='json',
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Stream a bundle's content to a file without holding it in memory.
+
+        :param destination: Path of the file to write to, or a binary file-like object
+        :param str prov_format: Format extension to download
+        :return: Number of bytes written
+        """
+        return self._write_chunks(self.get_bundle(document_id, bundle_id, prov_format, stream=True,
+                                                  chunk_size=chunk_size),
+                                  destination)
+
+    def create_many(self, documents, concurrency=DEFAULT_CONCURRENCY, **props):
+        """
+        Store many documents in parallel.
+
+        Documents are read from ``documents`` lazily, so it may be a generator, and are uploaded over the pooled
+        connections at most ``concurrency`` at a time. A failed upload does not stop the others.
+
+        Example:
+          >>> batch = api.create_many(((doc, {'name': doc_name}) for doc, doc_name in source), concurrency=16)
+          >>> for result in batch:
+          ...     if result.ok:
+          ...         result.value.id
+          >>> batch.throughput
+
+        :param documents: Iterable of documents, either :py:class:`prov.model.ProvDocument` or a
+                          ``(prov_document, props)`` tuple where ``props`` override the shared ones for that document
+        :param int concurrency: Maximum number of uploads in flight
+        :param dict props: Properties shared by all documents, as for :py:meth:`provstore.document.Document.create`
+        :return: A batch yielding a result per document, with the stored :py:class:`provstore.document.Document` as
+                 its value, in order of completion
+        :rtype: :py:class:`provstore.batch.Batch`
+        """
+        def create(item):
+            if isinstance(item, tuple):
+                prov_document, document_props = item
+                document_props = dict(props, **document_props)
+            else:
+                prov_document, document_props = item, props
+
+            return self.document.create(prov_document, **document_props)
+
+        return Batch(create, documents, concurrency=concurrency)
+
+    def uploader(self, journal=None, **options):
+        """
+        Upload documents and bundles in the background, keeping them in a journal on disk until they are stored.
+
+        Example:
+          >>> with api.uploader('/var/lib/provstore/journal.jsonl') as uploader:
+          ...     future = uploader.create(prov_document, name="name")
+          >>> api.document.get(future.result())
+
+        :param str journal: Path of the journal, entries left in it by a previous run are uploaded again
+        :param dict options: Options for :py:class:`provstore.uploader.Uploader`
+        :return: A running uploader, to be closed once done with
+        :rtype: :py:class:`provstore.uploader.Uploader`
+        """
+        return Uploader(self, journal, **options)
+
+    def get_documents(self, document_ids, concurrency=DEFAULT_CONCURRENCY, parse_workers=None, transform=None):
+        """
+        Read the provenance of many documents or bundles in parallel.
+
+        Content is downloaded over the pooled connections at most ``concurrency`` at a time. Parsing it is CPU bound
+        and, in threads, limited to one core by the GIL: with ``parse_workers`` it happens in a pool of that many
+        processes instead. Parsed documents have to be sent back from the workers, which costs about half as much as
+        parsing them. A ``transform`` applied in the workers, sending back only its result, avoids that:
+          >>> def count_records(prov_document):
+          ...     return len(prov_document.get_records())
+          >>> for result in api.get_documents(ids, parse_workers=4, transform=count_records):
+          ...     print(result.item, result.value)
+
+        .. note::
+           ``transform`` must be picklable, i.e. a function defined at module level. On platforms where new processes
+           are spawned rather than forked the calling script must be import safe, see :py:mod:`multiprocessing`.
+
+        :param document_ids: Iterable of document IDs, or of ``(document_id, bundle_id)`` pairs to read bundles
+        :param int concurrency: Maximum number of downloads in flight
+        :param int parse_workers: Number of processes to parse in, None to parse in the downloading threads
+        :param transform: Function applied to each :py:class:`prov.model.ProvDocument`, its return value becoming the
+                          result's value
+        :return: A batch yielding a result per ID, with the :py:class:`prov.model.ProvDocument` (or the value returned
+                 by ``transform``) as its value, in order of completion
+        :rtype: :py:class:`provstore.batch.Batch`
+        """
+        def fetch(document_id, prov_format):
+            if isinstance(document_id, tuple):
+                return self.get_bundle(document_id[0], document_id[1], prov_format)
+            return self.get_document_prov(document_id, prov_format)
+
+        if not parse_workers:
+            def read(document_id):
+                prov_document = fetch(document_id, ProvDocument)
+                return transform(prov_document) if transform is not None else prov_document
+
+            return Batch(read, document_ids, concurrency=concurrency)
+
+        # The pool only lives while the batch runs, so that a batch never iterated leaves no processes behind
+        pools = []
+
+        def start():
+            pool = ProcessPoolExecutor(max_workers=parse_workers)
+            pools.append(pool)
+            # Start the workers now rather than from the downloading threads
+            pool.submit(int).result()
+
+        def stop():
+            for pool in pools:
+                pool.shutdown()
+
+        def read(document_id):
+            return pools[0].submit(_parse_prov_json, fetch(document_id, 'json'), transform).result()
+
+        return Batch(read, document_ids, concurrency=concurrency, setup=start, cleanup=stop)
+
+    def get_metas(self, document_ids, concurrency=DEFAULT_CONCURRENCY):
+        """
+        Load the metadata of many documents in parallel.
+
+        Example:
+          >>> for result in api.get_metas(range(100, 200), concurrency=16):
+          ...     if result.ok:
+          ...         print(result.value.name)
+
+        With an identity map, documents whose metadata is already loaded are not fetched again and the documents
+        returned are those later returned by :py:meth:`provstore.document.Document.set` for the same IDs.
+
+        :param document_ids: Iterable of document IDs
+        :param int concurrency: Maximum number of requests in flight
+        :return: A batch yielding a result per ID, with a :py:class:`provstore.document.Document` whose metadata is
+                 loaded as its value, in order of completion
+        :rtype: :py:class:`provstore.batch.Batch`
+        """
+        def read_meta(document_id):
+            document = self.document.set(document_id)
+            if not document.meta_loaded:
+                document.read_meta()
+            return document
+
+        return Batch(read_meta, document_ids, concurrency=concurrency)
 
     def delete_document(self, document_id):
         self._request('delete', "/documents/%i/" % document_id,
                       headers=self.headers)
+
+        if self.cache is not None:
+            self.cache.invalidate(self.base_url, document_id)
+        if self.dedup is not None:
+            self.dedup.forget(self._dedup_scope, document_id)
+        self._forget(document_id)
+
         return True
@@ -0,0 +1,157 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+DEFAULT_CONCURRENCY = 8
+
+
+class BatchResult(object):
+    """
+    Outcome of one item of a :py:class:`Batch`.
+    """
+    def __init__(self, index, item, value=None, exception=None):
+        self.index = index
+        self.item = item
+        self.value = value
+        self.exception = exception
+
+    def __repr__(self):
+        if self.ok:
+            return "<BatchResult %i: %r>" % (self.index, self.value)
+        else:
+            return "<BatchResult %i failed: %r>" % (self.index, self.exception)
+
+    @property
+    def ok(self):
+        """
+        True if the item was processed without raising an exception
+        """
+        return self.exception is None
+
+
+class Batch(object):
+    """
+    Applies a function to every item of an iterable with bounded parallelism.
+
+    Items are pulled from the iterable lazily, so generators are never materialized, and no more than ``concurrency``
+    items are in progress at once. Iterating over the batch runs it and yields a :py:class:`BatchResult` per item in
+    order of completion. An exception raised for one item is recorded on its result and does not abort the batch.
+
+    Once iterated, the batch reports aggregate figures:
+      >>> batch = api.create_many(documents, name="name")
+      >>> failed = [result for result in batch if not result.ok]
+      >>> batch.succeeded, batch.failed, batch.throughput
+      (998, 2, 41.3)
+
+    :param fn: Function called with each item, its return value becomes the result's value
+    :param items: Iterable of items
+    :param int concurrency: Maximum number of items processed at once
+    :param setup: Function called once the batch starts running, before any item is processed
+    :param cleanup: Function called once the batch has finished running, or has been abandoned
+    """
+    def __init__(self, fn, items, concurrency=DEFAULT_CONCURRENCY, setup=None, cleanup=None):
+        self._fn = fn
+        self._items = items
+        self._concurrency = concurrency
+        self._setup = setup
+        self._cleanup = cleanup
+
+        self._lock = threading.Lock()
+        self._started = False
+
+        self.succeeded = 0
+        self.failed = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def __repr__(self):
+        return "<Batch %i succeeded, %i failed, %.1f items/s>" % (self.succeeded, self.failed, self.throughput)
+
+    def __iter__(self):
+        with self._lock:
+            if self._started:
+                raise RuntimeError("A batch can only be iterated once")
+            self._started = True
+
+        return self._run()
+
+    def results(self):
+        """
+        Run the batch to completion
+
+        :return: Results ordered as the items were
+        :rtype: list of :py:class:`BatchResult`
+        """
+        return sorted(self, key=lambda result: result.index)
+
+    @property
+    def completed(self):
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self):
+        """
+        Seconds spent running the batch so far
+        """
+        if self.started_at is None:
+            return 0.0
+
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def throughput(self):
+        """
+        Items completed per second
+        """
+        elapsed = self.elapsed
+        if not elapsed:
+            return 0.0
+
+        return self.completed / elapsed
+
+    def _call(self, index, item):
+        try:
+            return BatchResult(index, item, value=self._fn(item))
+        except Exception as e:
+            return BatchResult(index, item, exception=e)
+
+    def _run(self):
+        items = enumerate(self._items)
+        pending = set()
+
+        self.started_at = time.time()
+        executor = ThreadPoolExecutor(max_workers=self._concurrency)
+        try:
+            if self._setup is not None:
+                self._setup()
+
+            for index, item in items:
+                pending.add(executor.submit(self._call, index, item))
+                if len(pending) >= self._concurrency:
+                    break
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                # Refill before handing results back so the workers stay busy while the caller processes them
+                for index, item in items:
+                    pending.add(executor.submit(self._call, index, item))
+                    if len(pending) >= self._concurrency:
+                        break
+
+                for future in done:
+                    result = future.result()
+                    if result.ok:
+                        self.succeeded += 1
+                    else:
+                        self.failed += 1
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            self.finished_at = time.time()
+
+            if self._cleanup is not None:
+                self._cleanup()
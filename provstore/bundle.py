@@ -1,4 +1,5 @@
 from prov.model import parse_xsd_datetime
+from provstore.lazy import LazyProvDocument
 
 
 class Bundle(object):
@@ -28,13 +29,52 @@ class Bundle(object):
         """
         return self._identifier
 
+    @property
+    def loaded(self):
+        """
+        :return: Whether this bundle's provenance has been downloaded
+        :rtype: bool
+        """
+        return self._prov is not None
+
+    def read_prov(self):
+        """
+        Load this bundle's provenance from the store
+
+        :return: self
+        """
+        self._prov = self._api.get_bundle(self._document.id, self._id, LazyProvDocument)
+        return self
+
+    def raw(self, prov_format='json'):
+        """
+        Get the bundle's content without parsing it
+
+        :param str prov_format: Format to get the content in
+        :rtype: bytes
+        """
+        if prov_format == 'json' and isinstance(self._prov, LazyProvDocument) and not self._prov.parsed:
+            return self._prov.raw
+
+        return self._api.get_bundle(self._document.id, self._id, prov_format)
+
     @property
     def prov(self):
         """
-        :return: This bundle's provenance
-        :rtype: :py:class:`prov.model.ProvDocument`
+        :return: This bundle's provenance, parsed on first use
+        :rtype: :py:class:`provstore.lazy.LazyProvDocument`
         """
-        if not self._prov:
-            self._prov = self._api.get_bundle(self._document.id, self._id)
+        if not self.loaded:
+            self.read_prov()
 
         return self._prov
+
+    def download(self, destination, prov_format='json'):
+        """
+        Stream the bundle's content straight to a file, without loading or parsing it.
+
+        :param destination: Path of the file to write to, or a binary file-like object
+        :param str prov_format: Format to download the bundle in
+        :return: Number of bytes written
+        """
+        return self._api.download_bundle(self._document.id, self._id, destination, prov_format)
@@ -1,4 +1,18 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from provstore.bundle import Bundle
+from provstore.batch import DEFAULT_CONCURRENCY
+
+
+def _parsed(bundle):
+    return bundle.loaded and bundle.prov.parsed
+
+
+def _parse_prov(bundle):
+    # Downloaded and parsed in the worker, as parsing is the costly part of reading a bundle
+    bundle.prov.wrapped
+    return bundle
 
 
 class BundleManager(object):
@@ -7,8 +21,13 @@ class BundleManager(object):
 
     This is an iterable and will iterate through all of a document's bundles.
 
+    The store's listing of bundles is read a page at a time while iterating, the number of bundles is that reported by
+    the store and looking up a bundle by identifier only lists that bundle. Bundles seen are kept so that later
+    lookups and iterations make no further requests, until :py:meth:`refresh`.
+
     .. note::
-       Iteration is expensive, consider using :py:class:`provstore.document.Document.prov.bundles` instead!
+       Iteration is expensive, consider using :py:class:`provstore.document.Document.prov.bundles` instead! When
+       every bundle's provenance is needed, :py:meth:`iter_prov` downloads them in parallel.
 
     Example getting and adding bundles:
       >>> api = Api()
@@ -19,48 +38,170 @@ class BundleManager(object):
       A Bundle with the identifier given (if exists)
       >>> api.bundles['ex:new_bundle'] = prov_bundle
       Saves a new bundle with the identifier specified
+      >>> api.bundles.update({'ex:bundle-1': prov_bundle_1, 'ex:bundle-2': prov_bundle_2}, concurrency=16)
+      Saves several bundles in parallel
 
+
+    :param int page_size: Number of bundles listed per request
     """
-    def __init__(self, api, document):
+    def __init__(self, api, document, page_size=None):
+        from provstore.api import DEFAULT_PAGE_SIZE
+
         self._api = api
         self._document = document
-        self._bundles = None
+        self._page_size = page_size or DEFAULT_PAGE_SIZE
+
+        # Bundles seen so far by identifier, whether they are all of the document's and how many the store has
+        self._bundles = {}
+        self._complete = False
+        self._total = None
+        self._lock = threading.Lock()
 
     def __getitem__(self, key):
-        if not self._bundles:
-            self.refresh()
+        bundle = self._bundles.get(key)
+        if bundle is not None:
+            return bundle
 
-        if key not in self._bundles:
-            from provstore.api import NotFoundException
+        from provstore.api import NotFoundException
+
+        if self._complete:
             raise NotFoundException()
 
-        return self._bundles[key]
+        objects = self._page(0, identifier=key)['objects']
+        for metadata in objects:
+            if metadata['identifier'] == key:
+                return self._bundle(metadata)
+
+        if any(metadata['identifier'] != key for metadata in objects):
+            # The store ignored the filter, look through the whole listing instead
+            for bundle in self._iter_listing():
+                if bundle.identifier == key:
+                    return bundle
+
+        raise NotFoundException()
 
     def __setitem__(self, key, prov_bundle):
         self._document.add_bundle(prov_bundle, key)
 
+    def __contains__(self, key):
+        from provstore.api import NotFoundException
+
+        try:
+            self[key]
+            return True
+        except NotFoundException:
+            return False
+
     def __iter__(self):
-        if not self._bundles:
-            self.refresh()
+        if self._complete:
+            return iter(list(self._bundles.values()))
 
-        return self._bundles.itervalues()
+        return self._iter_listing()
 
     def __len__(self):
-        if self._bundles:
-            return len(self._bundles)
-        else:
-            return 0
+        if self._total is None:
+            self._page(0, limit=1)
+
+        return self._total
+
+    def _page(self, offset, limit=None, identifier=None):
+        page = self._api.get_bundles_page(self._document.id, offset, limit or self._page_size, identifier=identifier)
+        if identifier is None:
+            self._total = page['meta']['total_count']
+        return page
+
+    def _bundle(self, metadata):
+        bundle = self._bundles.get(metadata['identifier'])
+        if bundle is None:
+            bundle = self._bundles[metadata['identifier']] = Bundle(self._api, self._document, metadata)
+        return bundle
+
+    def _iter_listing(self):
+        for metadata in self._api._iter_pages(self._page):
+            yield self._bundle(metadata)
+
+        self._complete = True
+
+    def _changed(self):
+        # Bundles were added, the listing has to be read again
+        self._complete = False
+        self._total = None
+
+    def _added(self, metadata):
+        # A bundle was added, known from the store's response without listing again
+        if metadata is None:
+            self._changed()
+            return None
+
+        with self._lock:
+            if self._total is not None:
+                self._total += 1
+            return self._bundle(metadata)
+
+    def update(self, bundles, concurrency=DEFAULT_CONCURRENCY):
+        """
+        Add many bundles in parallel, see :py:meth:`provstore.document.Document.add_bundles`.
+
+        Example:
+          >>> results = document.bundles.update({'ex:bundle-1': prov_bundle_1, 'ex:bundle-2': prov_bundle_2})
+          >>> [result.exception for result in results if not result.ok]
+          []
+
+        :param bundles: Dict of bundles by identifier or iterable of ``(identifier, prov_bundle)`` tuples
+        :param int concurrency: Maximum number of uploads in flight
+        :return: Results ordered as the bundles were, those that failed holding their exception
+        :rtype: list of :py:class:`provstore.batch.BatchResult`
+        """
+        return self._document.add_bundles(bundles, concurrency=concurrency).results()
 
     def refresh(self):
         """
-        Reload list of bundles from the store
+        Forget the bundles listed so far, they are listed again from the store on next use
 
         :return: self
         """
         self._bundles = {}
+        self._changed()
+
+        return self
+
+    def iter_prov(self, concurrency=DEFAULT_CONCURRENCY):
+        """
+        Download and parse the provenance of all bundles in parallel, yielding each bundle as soon as its provenance is
+        loaded.
+
+        Example:
+          >>> for bundle in document.bundles.iter_prov(concurrency=16):
+          ...     bundle.prov
+
+        :param int concurrency: Number of bundles to download at once
+        :return: Generator of :py:class:`provstore.bundle.Bundle` in order of completion
+        """
+        bundles = list(self)
+
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        futures = [executor.submit(_parse_prov, bundle) for bundle in bundles if not _parsed(bundle)]
+        try:
+            for bundle in bundles:
+                if _parsed(bundle):
+                    yield bundle
+
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def prefetch(self, workers=DEFAULT_CONCURRENCY):
+        """
+        Load and parse the provenance of all bundles in parallel so that using :py:attr:`provstore.bundle.Bundle.prov`
+        on them makes no further requests.
+
+        :param int workers: Number of bundles to download at once
+        :return: self
+        """
+        for _ in self.iter_prov(concurrency=workers):
+            pass
 
-        bundles = self._api.get_bundles(self._document.id)
-        for bundle in bundles:
-            self._bundles[bundle['identifier']] = Bundle(self._api, self._document, bundle)
-        
         return self
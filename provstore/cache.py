@@ -0,0 +1,216 @@
+"""
+Caches for document and bundle content downloaded from ProvStore.
+
+Stored content changes rarely so :py:class:`provstore.api.Api` can keep what it downloads and skip the transfer next
+time. Entries are keyed by ``(base_url, document_id, bundle_id, format)``, ``bundle_id`` being None for a document's
+own content. Pass a cache when creating the client:
+  >>> from provstore.cache import MemoryCache, DiskCache, TieredCache
+  >>> api = Api(cache=TieredCache(MemoryCache(max_bytes=256 * 1024 * 1024), DiskCache('/var/cache/provstore')))
+
+Entries carrying an ETag or Last-Modified validator are revalidated with the store on every read, otherwise the cached
+content is used as is.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Atomic overwrite, os.replace is not available on Python 2
+_replace = getattr(os, 'replace', os.rename)
+
+
+class CacheEntry(object):
+    """
+    Cached response body and the validators the store sent with it.
+    """
+    def __init__(self, content, etag=None, last_modified=None):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    @property
+    def validators(self):
+        """
+        Conditional request headers to revalidate this entry with
+        """
+        headers = dict()
+
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        return headers
+
+
+class Cache(object):
+    """
+    Interface of content caches used by :py:class:`provstore.api.Api`.
+    """
+    def get(self, key):
+        """
+        :return: The entry stored for key or None
+        :rtype: :py:class:`CacheEntry`
+        """
+        raise NotImplementedError
+
+    def set(self, key, entry):
+        """
+        Store an entry for key, replacing any previous one
+        """
+        raise NotImplementedError
+
+    def invalidate(self, base_url, document_id):
+        """
+        Remove all entries of a document, including those of its bundles
+        """
+        raise NotImplementedError
+
+
+class MemoryCache(Cache):
+    """
+    Least recently used cache holding entries in memory up to a total content size.
+
+    :param int max_bytes: Content size budget, least recently used entries are dropped to stay within it
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                # Re-insert to mark as most recently used
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove(key)
+
+            self._entries[key] = entry
+            self.size += entry.size
+
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, base_url, document_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[:2] == (base_url, document_id)]:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+
+class DiskCache(Cache):
+    """
+    Cache storing each entry as a file in a directory, persisting across processes.
+
+    Entries are laid out as ``<directory>/<store>/<document_id>/<bundle_id or "document">.<format>``, each file
+    holding the entry's validators as a line of JSON followed by the content.
+
+    :param str directory: Directory to store entries in, created if needed
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _document_path(self, base_url, document_id):
+        store = hashlib.sha1(base_url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, store, str(document_id))
+
+    def _path(self, key):
+        base_url, document_id, bundle_id, prov_format = key
+        name = 'document' if bundle_id is None else str(bundle_id)
+
+        return os.path.join(self._document_path(base_url, document_id), "%s.%s" % (name, prov_format))
+
+    def get(self, key):
+        path = self._path(key)
+
+        try:
+            with open(path, 'rb') as f:
+                validators = json.loads(f.readline().decode('utf-8'))
+                content = f.read()
+        except (IOError, OSError, ValueError):
+            return None
+
+        return CacheEntry(content, **validators)
+
+    def set(self, key, entry):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Created concurrently
+                if not os.path.isdir(directory):
+                    raise
+
+        validators = json.dumps({'etag': entry.etag, 'last_modified': entry.last_modified})
+
+        # Written to a temporary file first so that readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(validators.encode('utf-8') + b'\n')
+                f.write(entry.content)
+            _replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def invalidate(self, base_url, document_id):
+        shutil.rmtree(self._document_path(base_url, document_id), ignore_errors=True)
+
+
+class TieredCache(Cache):
+    """
+    Combines caches, typically a fast :py:class:`MemoryCache` in front of a :py:class:`DiskCache`.
+
+    Reads try each cache in order and copy hits into the faster caches before it, writes go to all of them.
+    """
+    def __init__(self, *caches):
+        self.caches = caches
+
+    def get(self, key):
+        for i, cache in enumerate(self.caches):
+            entry = cache.get(key)
+            if entry is not None:
+                for faster_cache in self.caches[:i]:
+                    faster_cache.set(key, entry)
+                return entry
+
+        return None
+
+    def set(self, key, entry):
+        for cache in self.caches:
+            cache.set(key, entry)
+
+    def invalidate(self, base_url, document_id):
+        for cache in self.caches:
+            cache.invalidate(base_url, document_id)
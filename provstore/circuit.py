@@ -0,0 +1,226 @@
+"""
+Client side load shedding for :py:class:`provstore.api.Api`.
+
+A :py:class:`CircuitBreaker` stops calling an endpoint of the store (documents, bundles or metadata) once too many
+calls to it fail, failing fast with :py:class:`provstore.api.CircuitOpenException` until a trial call succeeds. An
+:py:class:`AdaptiveLimiter` bounds the number of requests in flight, growing the bound while the store responds
+quickly and halving it when responses slow down or fail.
+
+  >>> api = Api(circuit_breaker=CircuitBreaker(), limiter=AdaptiveLimiter(max_wait=5))
+"""
+import threading
+from collections import deque
+
+from provstore.compat import clock as _clock
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class _Circuit(object):
+    def __init__(self, window):
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = None
+        self.probing = False
+
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.total_latency = 0.0
+
+    @property
+    def failure_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return float(self.outcomes.count(False)) / len(self.outcomes)
+
+
+class CircuitBreaker(object):
+    """
+    Tracks the outcome of recent calls to each endpoint and opens its circuit when too many fail.
+
+    :param float failure_rate: Proportion of failed calls among the last ``window`` that opens the circuit
+    :param int window: Number of recent calls the failure rate is computed over
+    :param int min_calls: Calls needed before the failure rate is considered
+    :param float reset_timeout: Seconds an open circuit rejects calls before letting a trial call through
+    :param float slow_call_duration: Seconds after which a successful call is counted as failed, or None
+    """
+    def __init__(self, failure_rate=0.5, window=20, min_calls=10, reset_timeout=30, slow_call_duration=None):
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.slow_call_duration = slow_call_duration
+
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _circuit(self, endpoint):
+        circuit = self._circuits.get(endpoint)
+        if circuit is None:
+            circuit = self._circuits[endpoint] = _Circuit(self.window)
+        return circuit
+
+    def state(self, endpoint):
+        """
+        :return: ``'closed'``, ``'open'`` or ``'half-open'``
+        """
+        with self._lock:
+            return self._circuit(endpoint).state
+
+    def allow(self, endpoint):
+        """
+        :return: Whether a call to the endpoint may be made now
+        :rtype: bool
+        """
+        with self._lock:
+            circuit = self._circuit(endpoint)
+
+            if circuit.state == OPEN and _clock() - circuit.opened_at >= self.reset_timeout:
+                circuit.state = HALF_OPEN
+
+            # A single trial call at a time decides whether a half-open circuit closes again
+            if circuit.state == CLOSED or (circuit.state == HALF_OPEN and not circuit.probing):
+                circuit.probing = circuit.state == HALF_OPEN
+                return True
+
+            circuit.rejected += 1
+            return False
+
+    def cancel(self, endpoint):
+        """
+        Give back a call allowed by :py:meth:`allow` that was not made, without recording an outcome
+        """
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit.state == HALF_OPEN:
+                circuit.probing = False
+
+    def record(self, endpoint, success, latency):
+        """
+        Record the outcome of a call allowed by :py:meth:`allow`.
+
+        :param bool success: Whether the store answered without a server error
+        :param float latency: Seconds the call took
+        """
+        if success and self.slow_call_duration is not None and latency > self.slow_call_duration:
+            success = False
+
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            circuit.calls += 1
+            circuit.total_latency += latency
+            if not success:
+                circuit.failures += 1
+
+            if circuit.state == HALF_OPEN:
+                circuit.probing = False
+                if success:
+                    circuit.state = CLOSED
+                    circuit.outcomes.clear()
+                else:
+                    circuit.state = OPEN
+                    circuit.opened_at = _clock()
+                return
+
+            circuit.outcomes.append(success)
+            if (circuit.state == CLOSED and len(circuit.outcomes) >= self.min_calls and
+                    circuit.failure_rate >= self.failure_rate):
+                circuit.state = OPEN
+                circuit.opened_at = _clock()
+
+    def stats(self):
+        """
+        :return: State, failure rate and mean latency of each endpoint called so far
+        :rtype: dict
+        """
+        with self._lock:
+            return dict((endpoint, {
+                'state': circuit.state,
+                'calls': circuit.calls,
+                'failures': circuit.failures,
+                'rejected': circuit.rejected,
+                'failure_rate': circuit.failure_rate,
+                'mean_latency': circuit.total_latency / circuit.calls if circuit.calls else 0.0,
+            }) for endpoint, circuit in self._circuits.items())
+
+
+class AdaptiveLimiter(object):
+    """
+    Bounds concurrent requests, adjusting the bound additively up and multiplicatively down (AIMD).
+
+    Each request completed in time without a server error raises the limit by ``1 / limit``, so by about one per
+    round of requests. A failed request, or one slower than ``tolerance`` times the lowest recent latency, multiplies
+    the limit by ``backoff``.
+
+    :param int initial_limit: Requests allowed in flight to begin with
+    :param int min_limit: Lowest the limit can go
+    :param int max_limit: Highest the limit can go
+    :param float backoff: Factor the limit is multiplied by on congestion
+    :param float tolerance: How many times slower than the baseline latency a request can be before it signals
+                            congestion
+    :param float latency_floor: Latency, in seconds, below which a request never signals congestion
+    :param float max_wait: Seconds to wait for a free slot before giving up, None to wait indefinitely
+    """
+    def __init__(self, initial_limit=10, min_limit=1, max_limit=100, backoff=0.5, tolerance=2.0, latency_floor=0.1,
+                 max_wait=None):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.latency_floor = latency_floor
+        self.max_wait = max_wait
+
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.rejected = 0
+        self.baseline_latency = None
+
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait for a free slot
+
+        :return: Whether a slot was acquired, False if ``max_wait`` elapsed first
+        :rtype: bool
+        """
+        deadline = None if self.max_wait is None else _clock() + self.max_wait
+
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - _clock()
+                if remaining is not None and remaining <= 0:
+                    self.rejected += 1
+                    return False
+                self._condition.wait(remaining)
+
+            self.in_flight += 1
+            return True
+
+    def release(self, latency=None, success=True):
+        """
+        Free a slot acquired by :py:meth:`acquire`, adjusting the limit to the request's outcome.
+
+        :param float latency: Seconds the request took, None if it was not made
+        :param bool success: Whether the store answered without a server error
+        """
+        with self._condition:
+            self.in_flight -= 1
+
+            if latency is not None:
+                if self.baseline_latency is None or latency < self.baseline_latency:
+                    self.baseline_latency = latency
+                else:
+                    # Drift up slowly so that the baseline follows lasting changes
+                    self.baseline_latency += (latency - self.baseline_latency) * 0.01
+
+                if success and latency <= max(self.latency_floor, self.baseline_latency * self.tolerance):
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                else:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+
+            self._condition.notify_all()
@@ -0,0 +1,100 @@
+"""
+JSON codecs used by :py:class:`provstore.api.Api` for request and response bodies.
+
+The fastest codec installed is used by default, in order of preference
+`orjson <https://github.com/ijl/orjson>`_, `ujson <https://github.com/ultrajson/ultrajson>`_ and finally the standard
+library's :py:mod:`json`. A codec can also be chosen explicitly:
+  >>> from provstore.codec import StdlibCodec
+  >>> api = Api(codec=StdlibCodec())
+"""
+import json
+
+
+class Codec(object):
+    """
+    Encodes objects to UTF-8 JSON and decodes JSON from bytes or text.
+    """
+    name = None
+
+    def __repr__(self):
+        return "<%s>" % self.__class__.__name__
+
+    def dumps(self, obj):
+        """
+        :rtype: bytes
+        """
+        raise NotImplementedError
+
+    def loads(self, content):
+        """
+        :param content: JSON as bytes or text
+        """
+        raise NotImplementedError
+
+
+class StdlibCodec(Codec):
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj).encode('utf-8')
+
+    def loads(self, content):
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        return json.loads(content)
+
+
+class OrjsonCodec(Codec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj)
+
+    def loads(self, content):
+        return self._orjson.loads(content)
+
+
+class UjsonCodec(Codec):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj):
+        return self._ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def loads(self, content):
+        return self._ujson.loads(content)
+
+
+# In order of preference
+CODECS = (OrjsonCodec, UjsonCodec, StdlibCodec)
+
+
+def available_codecs():
+    """
+    :return: An instance of every codec whose library is installed, fastest first
+    :rtype: list of :py:class:`Codec`
+    """
+    codecs = []
+
+    for codec in CODECS:
+        try:
+            codecs.append(codec())
+        except ImportError:
+            pass
+
+    return codecs
+
+
+def default_codec():
+    """
+    :return: The fastest codec available
+    :rtype: :py:class:`Codec`
+    """
+    return available_codecs()[0]
@@ -0,0 +1,8 @@
+"""
+Python 2 and 3 compatibility helpers shared by the client's modules.
+"""
+import time
+
+
+# Clock for measuring intervals and deadlines, time.monotonic is not available on Python 2
+clock = getattr(time, 'monotonic', time.time)
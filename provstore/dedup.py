@@ -0,0 +1,173 @@
+"""
+Deduplication of uploads for :py:class:`provstore.api.Api`.
+
+Pipelines that re-submit identical provenance, on retries or when reprocessing, would otherwise store a new copy of it
+each time. With a :py:class:`DedupIndex` the client hashes what it is asked to store and, if the same content was
+stored before, refers to the existing document instead of uploading it again:
+  >>> api = Api(dedup=DedupIndex('/var/lib/provstore/dedup.sqlite'))
+  >>> api.document.create(prov_document, name="run 1").id
+  1042
+  >>> api.document.create(prov_document, name="run 2").id
+  1042
+
+Bundles added with the same identifier and content to the same document are likewise only uploaded once.
+
+The hash is computed over a canonical form of the PROV-JSON, see :py:func:`canonical_hash`, so that it does not
+depend on the order of namespaces, records or attribute values.
+
+.. note::
+   The index only knows about what was stored through clients using it. Documents deleted through such a client are
+   removed from it, documents deleted by other means are not and should be removed with :py:meth:`DedupIndex.forget`.
+"""
+import json
+import hashlib
+import sqlite3
+import threading
+
+from prov.model import ProvDocument
+from prov.serializers.provjson import encode_json_document
+from provstore.lazy import LazyProvDocument
+
+
+def _dumps(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def _canonical_value(value):
+    # Several values of an attribute are encoded as a list in no particular order
+    if isinstance(value, list):
+        return sorted((_canonical_value(item) for item in value), key=_dumps)
+    return value
+
+
+def _canonical_record(record):
+    return dict((attribute, _canonical_value(value)) for attribute, value in record.items())
+
+
+def _canonical_container(container):
+    canonical = {}
+
+    for section, records in container.items():
+        if section == 'prefix':
+            canonical[section] = records
+            continue
+        if section == 'bundle':
+            canonical[section] = dict((identifier, _canonical_container(bundle))
+                                      for identifier, bundle in records.items())
+            continue
+
+        named, anonymous = {}, []
+        for identifier, record in records.items():
+            instances = [_canonical_record(instance)
+                         for instance in (record if isinstance(record, list) else [record])]
+
+            if identifier.startswith('_:'):
+                # Identifiers of anonymous records are numbered in the order the records were added
+                anonymous.extend(instances)
+            else:
+                named[identifier] = sorted(instances, key=_dumps)
+
+        canonical[section] = [named, sorted(anonymous, key=_dumps)]
+
+    return canonical
+
+
+def canonical_hash(prov_document, prov_format='json'):
+    """
+    Hash a document's content independently of how it happens to be ordered.
+
+    Records are hashed by identifier and content, anonymous ones by content only. Content that is neither a
+    :py:class:`prov.model.ProvDocument` nor PROV-JSON is hashed as is.
+
+    :param prov_document: The document, serialized in prov_format unless a :py:class:`prov.model.ProvDocument` or
+                          already encoded as a PROV-JSON dict
+    :param str prov_format: The format of the document provided
+    :return: SHA-256 hex digest
+    :rtype: str
+    """
+    if isinstance(prov_document, LazyProvDocument) and not prov_document.parsed:
+        prov_document, prov_format = prov_document.raw, 'json'
+
+    if isinstance(prov_document, dict):
+        container = prov_document
+    elif isinstance(prov_document, ProvDocument):
+        container = encode_json_document(prov_document)
+    elif prov_format in (None, 'json'):
+        if isinstance(prov_document, bytes):
+            prov_document = prov_document.decode('utf-8')
+        container = json.loads(prov_document)
+    else:
+        if not isinstance(prov_document, bytes):
+            prov_document = prov_document.encode('utf-8')
+        return hashlib.sha256(prov_format.encode('utf-8') + b'\n' + prov_document).hexdigest()
+
+    return hashlib.sha256(_dumps(_canonical_container(container)).encode('utf-8')).hexdigest()
+
+
+class DedupIndex(object):
+    """
+    Persistent index of stored content by hash, kept in SQLite.
+
+    Entries are scoped by store and user, documents are only reused by the user that stored them and with the same
+    visibility.
+
+    :param str path: Path of the SQLite database, created if missing, ``':memory:'`` for an index lasting as long as
+                     the object
+    """
+    def __init__(self, path=':memory:'):
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS documents ("
+                                     "scope TEXT, hash TEXT, public INTEGER, document_id INTEGER, "
+                                     "PRIMARY KEY (scope, hash, public))")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS bundles ("
+                                     "scope TEXT, document_id INTEGER, identifier TEXT, hash TEXT, "
+                                     "PRIMARY KEY (scope, document_id, identifier, hash))")
+
+    def __repr__(self):
+        return "<DedupIndex %s>" % self.path
+
+    def _execute(self, sql, parameters=()):
+        with self._lock:
+            with self._connection:
+                return self._connection.execute(sql, parameters).fetchall()
+
+    def document(self, scope, content_hash, public=False):
+        """
+        :return: ID of the document stored with this content, None if there is none
+        :rtype: int or None
+        """
+        rows = self._execute("SELECT document_id FROM documents WHERE scope = ? AND hash = ? AND public = ?",
+                             (scope, content_hash, int(bool(public))))
+        return rows[0][0] if rows else None
+
+    def add_document(self, scope, content_hash, public, document_id):
+        self._execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)",
+                      (scope, content_hash, int(bool(public)), document_id))
+
+    def has_bundle(self, scope, document_id, identifier, content_hash):
+        """
+        :return: Whether a bundle with this identifier and content was added to the document
+        :rtype: bool
+        """
+        return bool(self._execute("SELECT 1 FROM bundles "
+                                  "WHERE scope = ? AND document_id = ? AND identifier = ? AND hash = ?",
+                                  (scope, document_id, identifier, content_hash)))
+
+    def add_bundle(self, scope, document_id, identifier, content_hash):
+        self._execute("INSERT OR IGNORE INTO bundles VALUES (?, ?, ?, ?)",
+                      (scope, document_id, identifier, content_hash))
+
+    def forget(self, scope, document_id):
+        """
+        Remove a document and its bundles from the index, e.g. once deleted
+        """
+        self._execute("DELETE FROM documents WHERE scope = ? AND document_id = ?", (scope, document_id))
+        self._execute("DELETE FROM bundles WHERE scope = ? AND document_id = ?", (scope, document_id))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,5 +1,12 @@
+from concurrent.futures import wait
+
 from prov.model import ProvDocument, parse_xsd_datetime
+from provstore.batch import Batch, DEFAULT_CONCURRENCY
 from provstore.bundle_manager import BundleManager
+from provstore.compat import clock as _clock
+from provstore.dedup import canonical_hash
+from provstore.lazy import LazyProvDocument
+from provstore.partition import Partition
 
 
 # Document exceptions
@@ -22,6 +29,14 @@ class ImmutableDocumentException(DocumentException):
         self.message = "Cannot change document instance reference"
 
 
+class IncompleteUploadException(DocumentException):
+    def __init__(self, document, failures):
+        self.message = "%i parts of the document could not be uploaded" % len(failures)
+        # The stored skeleton, and the results of the bundles that failed, holding them as (identifier, bundle) items
+        self.document = document
+        self.failures = failures
+
+
 # API Document model
 class Document(object):
     """
@@ -45,6 +60,7 @@ class Document(object):
         self._owner = None
         self._created_at = None
         self._views = None
+        self._meta_loaded_at = None
 
         self._bundles = None
 
@@ -66,30 +82,47 @@ class Document(object):
             return "%s/documents/%i" % (self._api.base_url, self.id)
 
     # Abstract methods
-    def create(self, prov_document, prov_format=None, refresh=False, **props):
+    def create(self, prov_document, prov_format=None, refresh=False, chunk_size=None,
+               concurrency=DEFAULT_CONCURRENCY, **props):
         """
         Create a document on ProvStore.
 
+        Large documents can be uploaded in parts by giving a ``chunk_size``: a skeleton document is stored first and
+        the records are then added to it as bundles of at most ``chunk_size`` records, uploaded in parallel. See
+        :py:mod:`provstore.partition`.
+
         :param prov_document: The document to be stored
         :param prov_format: The format of the document provided
         :param bool refresh: Whether or not to load back the document after saving
+        :param int chunk_size: Most records uploaded per request, None to upload the document in one request
+        :param int concurrency: Maximum number of bundles uploaded at once when uploading in parts
         :param dict props: Properties for this document [**name** (required), **public** = False]
-        :return: This document itself but with a reference to the newly stored document
+        :return: This document itself but with a reference to the newly stored document, or to the one already stored
+                 with the same content if the API deduplicates uploads
         :type prov_document: :py:class:`prov.model.ProvDocument` or :py:class:`str`
         :type prov_format: :py:class:`str` or None
         :rtype: :py:class:`provstore.document.Document`
         :raises ImmutableDocumentException: If this instance already refers to another document
+        :raises IncompleteUploadException: If some of the parts could not be uploaded
         """
         if not self.abstract:
             raise ImmutableDocumentException()
 
+        if chunk_size is not None:
+            if not isinstance(prov_document, ProvDocument):
+                prov_document = ProvDocument.deserialize(content=prov_document, format=prov_format or 'json')
+            prov_format = "json"
+
+            partition = Partition(prov_document, chunk_size)
+            if len(partition) > 1 or prov_document.bundles:
+                return self._create_partitioned(prov_document, partition, refresh, concurrency, **props)
+
         if isinstance(prov_document, ProvDocument):
             self._prov = prov_document
-
             prov_format = "json"
-            prov_document = prov_document.serialize()
 
-        self._id = self._api.post_document(prov_document, prov_format, **props)['id']
+        self._id = self._api._create_document(prov_document, prov_format, **props)
+        self._api._identify(self)
 
         if refresh:
             self.refresh()
@@ -98,11 +131,44 @@ class Document(object):
 
         return self
 
+    def _create_partitioned(self, prov_document, partition, refresh, concurrency, name, public=False):
+        api = self._api
+
+        # Deduplicated as the whole document, skeletons of different documents can be identical
+        content_hash = document_id = None
+        if api.dedup is not None:
+            content_hash = canonical_hash(prov_document)
+            document_id = api.dedup.document(api._dedup_scope, content_hash, public)
+
+        if document_id is not None:
+            self._id = document_id
+        else:
+            self._id = api.post_document(partition.skeleton, "json", name, public=public)['id']
+        api._identify(self)
+        self._bundles = BundleManager(api, self)
+
+        if document_id is None:
+            failures = [result for result in self.add_bundles(partition.bundles(), concurrency=concurrency)
+                        if not result.ok]
+            if failures:
+                raise IncompleteUploadException(self, failures)
+
+            if content_hash is not None:
+                api.dedup.add_document(api._dedup_scope, content_hash, public, self._id)
+
+        if refresh:
+            self.refresh()
+
+        return self
+
     save = create
 
     def set(self, document_id):
         """
         Associate this document with a ProvStore document without making any calls to the API.
+
+        If the API has an identity map, the document already in use for this ID is returned instead when there is one.
+
         :param int document_id: ID of the document on ProvStore
         :return: self
         """
@@ -110,9 +176,9 @@ class Document(object):
             raise ImmutableDocumentException()
         self._id = document_id
 
-        return self
+        return self._api._identify(self)
 
-    def get(self, document_id):
+    def get(self, document_id, prov=True, meta=True):
         """
         Associate this model with a document on ProvStore.
 
@@ -126,30 +192,65 @@ class Document(object):
           ex:bundles1-sep
 
         :param document_id: The document ID on ProvStore
-        :return: self
+        :param bool prov: Whether to load the document's provenance
+        :param bool meta: Whether to load the document's metadata
+        :return: self, or the document already in use for this ID if the API has an identity map, in which case only
+                 what it has not loaded yet is read
         """
         if not self.abstract:
             raise ImmutableDocumentException()
 
-        return self.read(document_id)
+        document = self.set(document_id)
+        if document is not self:
+            prov = prov and document._prov is None
+            meta = meta and not document.meta_loaded
+
+        return document.read(prov=prov, meta=meta)
 
     # Instance methods
-    def read(self, document_id=None):
+    def read(self, document_id=None, prov=True, meta=True):
         """
         Load the document contents and metadata from the server.
 
+        Both are requested concurrently. Either can be skipped, anything not loaded is still loaded on first access:
+          >>> api.document.get(148, prov=False).name
+
         The following are equivalent::
           >>> api = Api()
           >>> api.set(148).read()
           >>> api.get(148)
 
         :param document_id: (optional) Set the document ID if this is an abstract document.
+        :param bool prov: Whether to load the document's provenance
+        :param bool meta: Whether to load the document's metadata
         :return: self
         """
-        self.read_prov(document_id)
-        self.read_meta()
+        self._set_id(document_id)
+
+        if prov and meta:
+            future = self._api.executor.submit(self.read_prov)
+            try:
+                self.read_meta()
+            finally:
+                # Waited for without raising, so as not to mask a metadata error
+                wait([future])
+            future.result()
+        elif prov:
+            self.read_prov()
+        elif meta:
+            self.read_meta()
+
         return self
 
+    def _set_id(self, document_id):
+        if document_id:
+            if not self.abstract:
+                raise ImmutableDocumentException()
+            self._id = document_id
+
+        if self.abstract:
+            raise AbstractDocumentException()
+
     def refresh(self):
         """
         Update information about the document from ProvStore.
@@ -169,18 +270,33 @@ class Document(object):
            this method is unusual.
 
         :param document_id: (optional) set the document id if this is an :py:meth:`abstract` document
-        :return: :py:class:`prov.model.ProvDocument
+        :return: The document's provenance, parsed on first use
+        :rtype: :py:class:`provstore.lazy.LazyProvDocument`
         """
-        if document_id:
-            if not self.abstract:
-                raise ImmutableDocumentException()
-            self._id = document_id
+        self._set_id(document_id)
+
+        self._prov = self._api.get_document_prov(self.id, LazyProvDocument)
+        return self._prov
+
+    def raw(self, prov_format='json'):
+        """
+        Get the document's content without parsing it, e.g. to store or forward it elsewhere.
+
+        Example:
+          >>> api.document.set(148).raw('json')
+          b'{"prefix": ...'
 
+        :param str prov_format: Format to get the content in
+        :return: The document's content, as downloaded
+        :rtype: bytes
+        """
         if self.abstract:
             raise AbstractDocumentException()
 
-        self._prov = self._api.get_document_prov(self.id)
-        return self._prov
+        if prov_format == 'json' and isinstance(self._prov, LazyProvDocument) and not self._prov.parsed:
+            return self._prov.raw
+
+        return self._api.get_document_prov(self.id, prov_format)
 
     def read_meta(self, document_id=None):
         """
@@ -193,21 +309,18 @@ class Document(object):
         :param document_id: (optional) set the document id if this is an :py:meth:`abstract` document
         :return: self
         """
-        if document_id:
-            if not self.abstract:
-                raise ImmutableDocumentException()
-            self._id = document_id
-
-        if self.abstract:
-            raise AbstractDocumentException()
+        self._set_id(document_id)
 
-        metadata = self._api.get_document_meta(self.id)
+        return self._load_meta(self._api.get_document_meta(self.id))
 
+    def _load_meta(self, metadata):
+        # Populate from a document's metadata as returned by the store
         self._name = metadata['document_name']
         self._public = metadata['public']
         self._owner = metadata['owner']
         self._created_at = parse_xsd_datetime(metadata['created_at'])
         self._views = metadata['views_count']
+        self._meta_loaded_at = _clock()
 
         self._bundles = BundleManager(self._api, self)
 
@@ -225,11 +338,61 @@ class Document(object):
         :param prov_bundle: The bundle to be added
         :param str identifier: URI or QName for this bundle
         :type prov_bundle: :py:class:`prov.model.ProvDocument` or :py:class:`str`
+        :return: The new bundle, None if the store did not describe it
+        :rtype: :py:class:`provstore.bundle.Bundle` or None
         """
         if self.abstract:
             raise AbstractDocumentException()
 
-        self._api.add_bundle(self.id, prov_bundle.serialize(), identifier)
+        metadata = self._api.add_bundle(self.id, prov_bundle, identifier)
+
+        if self._bundles is not None:
+            return self._bundles._added(metadata)
+
+    def add_bundles(self, bundles, concurrency=DEFAULT_CONCURRENCY):
+        """
+        Add many bundles in parallel.
+
+        Bundles are read from ``bundles`` lazily, so it may be a generator, and are uploaded over the pooled
+        connections at most ``concurrency`` at a time. A failed upload does not stop the others.
+
+        Example:
+          >>> batch = document.add_bundles((identifier, prov_bundle) for identifier, prov_bundle in source)
+          >>> failed = [result for result in batch if not result.ok]
+
+        :param bundles: Dict of bundles by identifier or iterable of ``(identifier, prov_bundle)`` tuples
+        :param int concurrency: Maximum number of uploads in flight
+        :return: A batch yielding a result per bundle, with the new :py:class:`provstore.bundle.Bundle` as its value,
+                 in order of completion
+        :rtype: :py:class:`provstore.batch.Batch`
+        """
+        if self.abstract:
+            raise AbstractDocumentException()
+
+        if hasattr(bundles, 'items'):
+            bundles = bundles.items()
+
+        def add(item):
+            identifier, prov_bundle = item
+            return self.add_bundle(prov_bundle, identifier)
+
+        return Batch(add, bundles, concurrency=concurrency)
+
+    def download(self, destination, prov_format='json'):
+        """
+        Stream the document's content straight to a file, without loading or parsing it.
+
+        Example:
+          >>> api.document.set(148).download('/tmp/148.json')
+
+        :param destination: Path of the file to write to, or a binary file-like object
+        :param str prov_format: Format to download the document in
+        :return: Number of bytes written
+        """
+        if self.abstract:
+            raise AbstractDocumentException()
+
+        return self._api.download_document(self.id, destination, prov_format)
 
     @property
     def bundles(self):
@@ -240,6 +403,10 @@ class Document(object):
         if self.abstract:
             raise AbstractDocumentException()
 
+        # Documents only set, or read without their metadata, have none yet
+        if self._bundles is None:
+            self._bundles = BundleManager(self._api, self)
+
         return self._bundles
 
     def delete(self):
@@ -272,40 +439,45 @@ class Document(object):
         return self.id is None
 
     @property
-    def name(self):
+    def meta_loaded(self):
         """
-        Name of document as seen on ProvStore
+        True if metadata has been loaded and has not expired according to the API's ``meta_ttl``
         """
-        if self._name:
-            return self._name
+        if self._meta_loaded_at is None:
+            return False
+
+        ttl = self._api.meta_ttl
+        return ttl is None or _clock() - self._meta_loaded_at < ttl
+
+    def _meta(self, attribute):
+        # Metadata kept after the document is deleted is still returned, it cannot be reloaded
+        if self.meta_loaded or (self._meta_loaded_at is not None and self.abstract):
+            return getattr(self, attribute)
         elif not self.abstract:
-            return self.read_meta()._name
+            return getattr(self.read_meta(), attribute)
 
         raise EmptyDocumentException()
 
+    @property
+    def name(self):
+        """
+        Name of document as seen on ProvStore
+        """
+        return self._meta('_name')
+
     @property
     def public(self):
         """
         Is this document visible to anyone?
         """
-        if self._public:
-            return self._public
-        elif not self.abstract:
-            return self.read_meta()._public
-
-        raise EmptyDocumentException()
+        return self._meta('_public')
 
     @property
     def owner(self):
         """
         Username of document creator
         """
-        if self._owner:
-            return self._owner
-        elif not self.abstract:
-            return self.read_meta()._owner
-
-        raise EmptyDocumentException()
+        return self._meta('_owner')
 
     @property
     def created_at(self):
@@ -313,24 +485,14 @@ class Document(object):
         :return: When the document was created
         :rtype: :py:class:`datetime.datetime`
         """
-        if self._created_at:
-            return self._created_at
-        elif not self.abstract:
-            return self.read_meta()._created_at
-
-        raise EmptyDocumentException()
+        return self._meta('_created_at')
 
     @property
     def views(self):
         """
         Number of views this document has received on ProvStore
         """
-        if self._views:
-            return self._views
-        elif not self.abstract:
-            return self.read_meta()._views
-
-        raise EmptyDocumentException()
+        return self._meta('_views')
 
     @property
     def url(self):
@@ -347,9 +509,10 @@ class Document(object):
     @property
     def prov(self):
         """
-        Provenance stored for this document as :py:class:`prov.model.ProvDocument`
+        Provenance stored for this document as :py:class:`prov.model.ProvDocument`, downloaded on first access and
+        parsed on first use, see :py:mod:`provstore.lazy`
         """
-        if self._prov:
+        if self._prov is not None:
             return self._prov
         elif not self.abstract:
             return self.read_prov()
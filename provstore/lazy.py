@@ -0,0 +1,104 @@
+"""
+Deferred parsing of provenance downloaded from the store.
+
+Deserializing PROV-JSON into a :py:class:`prov.model.ProvDocument` is the most expensive step of reading a large
+document. :py:attr:`provstore.document.Document.prov` and :py:attr:`provstore.bundle.Bundle.prov` therefore return a
+:py:class:`LazyProvDocument` holding the downloaded content, which is only parsed when the document is first used:
+  >>> prov = api.document.get(148).prov
+  >>> prov.raw                    # The PROV-JSON as downloaded, not parsed
+  >>> isinstance(prov, ProvDocument)
+  True
+  >>> prov.get_records()          # Parsed now
+"""
+import threading
+
+from prov.model import ProvDocument
+
+
+class LazyProvDocument(object):
+    """
+    Stands in for a :py:class:`prov.model.ProvDocument`, parsing its content on first use.
+
+    Attribute access, comparison and :py:func:`str` are all forwarded to the parsed document. :py:func:`isinstance`
+    checks against :py:class:`prov.model.ProvDocument` succeed without parsing.
+
+    :param bytes raw: The document's PROV-JSON
+    :param parse: Function parsing ``raw`` into a :py:class:`prov.model.ProvDocument`
+    """
+    __slots__ = ('_raw', '_parse', '_document', '_lock')
+
+    def __init__(self, raw, parse):
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_parse', parse)
+        object.__setattr__(self, '_document', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _load(self):
+        if self._document is None:
+            with self._lock:
+                if self._document is None:
+                    object.__setattr__(self, '_document', self._parse(self._raw))
+        return self._document
+
+    @property
+    def raw(self):
+        """
+        :return: The document's PROV-JSON, as downloaded
+        :rtype: bytes
+        """
+        return self._raw
+
+    @property
+    def parsed(self):
+        """
+        :return: Whether the content has been parsed yet
+        :rtype: bool
+        """
+        return self._document is not None
+
+    @property
+    def wrapped(self):
+        """
+        :return: The parsed document, parsing it if needed
+        :rtype: :py:class:`prov.model.ProvDocument`
+        """
+        return self._load()
+
+    # Claim to be a ProvDocument, which the content always parses to, without parsing it
+    @property
+    def __class__(self):
+        return ProvDocument
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._load(), name)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyProvDocument):
+            other = other.wrapped
+        return self._load() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __str__(self):
+        return str(self._load())
+
+    def __repr__(self):
+        if self.parsed:
+            return repr(self._document)
+        return "<LazyProvDocument: %i bytes, not parsed>" % len(self._raw)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __reduce_ex__(self, protocol):
+        # Pickle as the parsed document
+        return self._load().__reduce_ex__(protocol)
@@ -0,0 +1,135 @@
+"""
+Splitting of large documents into bundles for upload.
+
+Posting a document with millions of records as a single request takes longer than the store allows and holds the
+whole encoded body in memory. :py:meth:`provstore.document.Document.create` can instead store a small skeleton
+document and upload the records as bundles of bounded size, in parallel:
+  >>> api.document.create(prov_document, name="large", chunk_size=10000, concurrency=8)
+
+The skeleton declares each bundle as an entity of type ``prov:Bundle``, so the stored document records where its
+records went. Each bundle carries all of the document's namespaces. Relations are placed in the same bundle as the
+first element they refer to, unless that element has more relations than fit in a bundle.
+
+With :py:mod:`provstore.dedup`, a document uploaded in parts is indexed by the hash of the whole document once all of
+its parts are stored, never by its skeleton's.
+"""
+from prov.model import ProvDocument, Namespace, PROV_BUNDLE, PROV_TYPE
+
+
+# Records per bundle
+DEFAULT_CHUNK_SIZE = 10000
+
+# Identifiers of the bundles records are split into, only unique within a document
+CHUNK_NAMESPACE = Namespace('chunk', 'urn:provstore:chunk:')
+
+
+def _with_namespaces(prov_document):
+    # An empty document declaring the same namespaces as prov_document
+    document = ProvDocument()
+    for namespace in prov_document.namespaces:
+        document.add_namespace(namespace)
+
+    default = prov_document.get_default_namespace()
+    if default is not None:
+        document.set_default_namespace(default.uri)
+
+    return document
+
+
+def _assign(records, chunk_size):
+    # Indices of the records in each chunk: each element is grouped with the relations about it, that is those
+    # referring to it first, and the groups are packed into chunks in order
+    groups, group_of = [], {}
+
+    for i, record in enumerate(records):
+        if record.is_relation():
+            continue
+
+        if record.identifier in group_of:
+            groups[group_of[record.identifier]].append(i)
+        else:
+            if record.identifier is not None:
+                group_of[record.identifier] = len(groups)
+            groups.append([i])
+
+    for i, record in enumerate(records):
+        if not record.is_relation():
+            continue
+
+        for _, value in record.formal_attributes:
+            if value in group_of:
+                groups[group_of[value]].append(i)
+                break
+        else:
+            groups.append([i])
+
+    chunks = []
+    for group in groups:
+        # Groups larger than a chunk are split, others are kept whole
+        if not chunks or len(chunks[-1]) + min(len(group), chunk_size) > chunk_size:
+            chunks.append([])
+        for i in group:
+            if len(chunks[-1]) >= chunk_size:
+                chunks.append([])
+            chunks[-1].append(i)
+
+    return chunks
+
+
+class Partition(object):
+    """
+    A document split into a skeleton and bundles of at most ``chunk_size`` records.
+
+    Bundles are built as they are iterated over, so that only those being uploaded are held in memory on top of the
+    original document.
+
+    :param prov_document: The document to split
+    :type prov_document: :py:class:`prov.model.ProvDocument`
+    :param int chunk_size: Most records in a bundle
+    """
+    def __init__(self, prov_document, chunk_size=DEFAULT_CHUNK_SIZE):
+        if chunk_size < 1:
+            raise ValueError("Bundles need room for at least one record")
+
+        self._document = prov_document
+        self._records = prov_document.get_records()
+        self._chunks = _assign(self._records, chunk_size)
+
+        #: Identifiers of the bundles the records are split into, in order
+        self.identifiers = [CHUNK_NAMESPACE[str(i + 1)] for i in range(len(self._chunks))]
+
+    def __len__(self):
+        return len(self._chunks) + len(self._document.bundles)
+
+    @property
+    def skeleton(self):
+        """
+        :return: The document to store first, declaring the bundles the records are split into
+        :rtype: :py:class:`prov.model.ProvDocument`
+        """
+        skeleton = _with_namespaces(self._document)
+        skeleton.add_namespace(CHUNK_NAMESPACE)
+
+        for identifier in self.identifiers:
+            skeleton.entity(identifier, {PROV_TYPE: PROV_BUNDLE})
+
+        return skeleton
+
+    def bundles(self):
+        """
+        Generate the bundles to add to the skeleton: the document's records split up, then the document's own bundles
+        unchanged.
+
+        :return: Generator of ``(identifier, prov_bundle)`` tuples
+        """
+        for identifier, indices in zip(self.identifiers, self._chunks):
+            chunk = _with_namespaces(self._document)
+            for i in indices:
+                chunk.add_record(self._records[i])
+            yield identifier, chunk
+
+        for bundle in self._document.bundles:
+            chunk = _with_namespaces(bundle)
+            for record in bundle.get_records():
+                chunk.add_record(record)
+            yield bundle.identifier, chunk
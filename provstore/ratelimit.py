@@ -0,0 +1,173 @@
+"""
+Client side rate limiting for :py:class:`provstore.api.Api`.
+
+Requests take a token from a bucket refilled at a steady rate, waiting when it is empty, so that the rate of requests
+stays under the store's quota however many threads share the client. A :py:class:`FileTokenBucket` keeps its state
+in a file so that worker processes on one host can share a quota too:
+  >>> from provstore.ratelimit import RateLimiter, TokenBucket, FileTokenBucket
+  >>> api = Api(rate_limiter=RateLimiter(default=TokenBucket(rate=10, burst=20),
+  ...                                    post=FileTokenBucket('/tmp/provstore-post.bucket', rate=2)))
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from provstore.compat import clock as _clock
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket.
+
+    Waiting callers reserve their tokens up front and are served in the order they arrived.
+
+    :param float rate: Tokens added per second
+    :param float burst: Most tokens the bucket holds, defaults to one second's worth
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+
+        self._tokens = None
+        self._updated_at = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<%s rate=%g burst=%g>" % (self.__class__.__name__, self.rate, self.burst)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            yield
+
+    def _now(self):
+        return _clock()
+
+    def _load(self):
+        return self._tokens, self._updated_at
+
+    def _store(self, tokens, updated_at):
+        self._tokens, self._updated_at = tokens, updated_at
+
+    def acquire(self, tokens=1, max_wait=None):
+        """
+        Take tokens from the bucket, waiting for them to be added if needed.
+
+        :param tokens: Number of tokens to take
+        :param float max_wait: Seconds the caller is prepared to wait, None for as long as needed
+        :return: Whether the tokens were taken, False if that would have meant waiting longer than ``max_wait``
+        :rtype: bool
+        """
+        with self._locked():
+            now = self._now()
+            available, updated_at = self._load()
+
+            if available is None:
+                available = self.burst
+            else:
+                available = min(self.burst, available + max(0.0, now - updated_at) * self.rate)
+
+            wait = max(0.0, (tokens - available) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return False
+
+            # Tokens can go negative, reserving those that later callers will have to wait for
+            self._store(available - tokens, now)
+
+        if wait:
+            time.sleep(wait)
+        return True
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket stored in a file, shared by all processes on a host using the same path.
+
+    Access is serialized with an exclusive ``flock`` so it is only available on POSIX systems.
+
+    :param str path: File holding the bucket's state, created if needed
+    :param float rate: Tokens added per second
+    :param float burst: Most tokens the bucket holds, defaults to one second's worth
+    """
+    def __init__(self, path, rate, burst=None):
+        if fcntl is None:  # pragma: no cover
+            raise NotImplementedError("FileTokenBucket requires fcntl")
+
+        super(FileTokenBucket, self).__init__(rate, burst)
+        self.path = path
+
+        # Several threads may be waiting on the lock at once, each with its own open file
+        self._local = threading.local()
+
+    @contextmanager
+    def _locked(self):
+        # Separate open files exclude each other so this also serializes threads of this process
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, 'r+') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                self._local.file = f
+                yield
+            finally:
+                self._local.file = None
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _now(self):
+        # Shared between processes so wall clock time
+        return time.time()
+
+    def _load(self):
+        f = self._local.file
+        f.seek(0)
+        try:
+            tokens, updated_at = f.read().split()
+            return float(tokens), float(updated_at)
+        except ValueError:
+            return None, None
+
+    def _store(self, tokens, updated_at):
+        f = self._local.file
+        f.seek(0)
+        f.truncate()
+        f.write("%r %r" % (tokens, updated_at))
+        f.flush()
+
+
+class RateLimiter(object):
+    """
+    Applies token buckets to requests by HTTP method.
+
+    Example limiting uploads more strictly than reads:
+      >>> RateLimiter(default=TokenBucket(rate=20), post=TokenBucket(rate=2))
+
+    :param default: Bucket for methods without their own, None to not limit them
+    :param float max_wait: Seconds a request may wait for a token before
+                           :py:class:`provstore.api.RateLimitException` is raised, None for as long as needed
+    :param buckets: Bucket for each method, by lowercase method name
+    """
+    def __init__(self, default=None, max_wait=None, **buckets):
+        self.default = default
+        self.max_wait = max_wait
+        self.buckets = dict((method.lower(), bucket) for method, bucket in buckets.items())
+
+    def bucket(self, method):
+        return self.buckets.get(method.lower(), self.default)
+
+    def acquire(self, method):
+        """
+        Wait for a token to make a request
+
+        :return: Whether a token was taken, False if that would have meant waiting longer than ``max_wait``
+        :rtype: bool
+        """
+        bucket = self.bucket(method)
+        if bucket is None:
+            return True
+
+        return bucket.acquire(max_wait=self.max_wait)
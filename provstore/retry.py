@@ -0,0 +1,145 @@
+import time
+import random
+import calendar
+from email.utils import parsedate_tz, mktime_tz
+
+import requests
+from provstore.compat import clock as _clock
+
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_MAX_BACKOFF = 30
+
+# Statuses signalling a transient failure of the store
+DEFAULT_RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# Methods that can be repeated without changing the outcome
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when :py:class:`provstore.api.Api` retries a failed request.
+
+    Timeouts, connection errors and transient error statuses are retried with exponential backoff and full jitter:
+    before retry ``n`` (from 0) the client sleeps a random time between 0 and ``backoff_factor * 2 ** n`` seconds,
+    capped to ``max_backoff``. A ``Retry-After`` header sent by the store is honoured.
+
+    Only idempotent requests (GET, DELETE...) are retried unless ``retry_post`` is set, as a POST that failed may still
+    have created a document. Requests that never reached the store (connection timeouts) are always safe to retry.
+    Streamed uploads are never retried since their body cannot be replayed.
+
+    Example:
+      >>> api = Api(retry=RetryPolicy(max_retries=5, deadline=60))
+
+    :param int max_retries: Maximum number of retries of one request
+    :param float backoff_factor: Base of the exponential backoff, in seconds
+    :param float max_backoff: Upper bound of the backoff between two attempts, in seconds
+    :param bool jitter: Whether to randomise backoff, spreading out retries of many clients
+    :param retry_statuses: Response statuses to retry
+    :param bool retry_post: Whether non-idempotent requests are retried too
+    :param bool respect_retry_after: Whether to wait as long as the store's ``Retry-After`` header asks
+    :param float deadline: Seconds after which a call gives up, across all of its attempts, or None
+    """
+    def __init__(self,
+                 max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 max_backoff=DEFAULT_MAX_BACKOFF,
+                 jitter=True,
+                 retry_statuses=DEFAULT_RETRY_STATUSES,
+                 retry_post=False,
+                 respect_retry_after=True,
+                 deadline=None):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_post = retry_post
+        self.respect_retry_after = respect_retry_after
+        self.deadline = deadline
+
+    def __repr__(self):
+        return "<RetryPolicy max_retries=%i deadline=%r>" % (self.max_retries, self.deadline)
+
+    def is_retryable_method(self, method):
+        return self.retry_post or method.upper() in IDEMPOTENT_METHODS
+
+    def backoff(self, attempt):
+        """
+        :param int attempt: Number of retries made so far
+        :return: Seconds to wait before the next attempt
+        """
+        cap = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+
+        if self.jitter:
+            return random.uniform(0, cap)
+        return cap
+
+    @staticmethod
+    def retry_after(response):
+        """
+        :return: Seconds the store asked to wait for in its ``Retry-After`` header, or None
+        """
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0.0, mktime_tz(date) - calendar.timegm(time.gmtime()))
+
+    def remaining(self, started_at):
+        """
+        :param float started_at: When the call started, per :py:func:`provstore.compat.clock`
+        :return: Seconds left before the deadline, or None if there is no deadline
+        """
+        if self.deadline is None:
+            return None
+
+        return self.deadline - (_clock() - started_at)
+
+    def retry_delay(self, method, attempt, started_at, response=None, exception=None):
+        """
+        Decide whether a failed attempt should be retried.
+
+        :param str method: HTTP method of the request
+        :param int attempt: Number of retries made so far
+        :param float started_at: When the call started, per :py:func:`provstore.compat.clock`
+        :param response: The response received, if any
+        :param exception: The exception raised instead of a response, if any
+        :return: Seconds to wait before retrying, or None not to retry
+        """
+        if attempt >= self.max_retries:
+            return None
+
+        if exception is not None:
+            # Connecting timed out so the request was never sent
+            if not isinstance(exception, requests.exceptions.ConnectTimeout) and not self.is_retryable_method(method):
+                return None
+            if not isinstance(exception, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+                return None
+        elif response is not None:
+            if response.status_code not in self.retry_statuses or not self.is_retryable_method(method):
+                return None
+        else:
+            return None
+
+        delay = self.backoff(attempt)
+        if response is not None and self.respect_retry_after:
+            retry_after = self.retry_after(response)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        remaining = self.remaining(started_at)
+        if remaining is not None and delay >= remaining:
+            return None
+
+        return delay
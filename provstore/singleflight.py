@@ -0,0 +1,78 @@
+"""
+Coalescing of concurrent identical reads for :py:class:`provstore.api.Api`.
+
+When several threads read the same document or bundle at the same moment, only the first one makes the request. The
+others wait for it and share its result, parsed provenance included:
+  >>> api = Api(single_flight=True)
+  >>> api.single_flight.stats()
+  {'calls': 1, 'coalesced': 15}
+
+.. note::
+   Coalesced callers receive the same object, which should be treated as read-only.
+"""
+import threading
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """
+    Runs at most one call per key at a time, callers arriving while it is in flight share its outcome.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Call ``fn`` unless a call for ``key`` is already in flight, in which case wait for that one.
+
+        :param key: Hashable identifying equivalent calls
+        :param fn: Function taking no arguments
+        :return: The value returned by the call, and whether it was shared with an earlier caller
+        :rtype: tuple
+        :raises: The exception raised by the call, if it failed
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.value, True
+
+        try:
+            call.value = fn()
+            return call.value, False
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            # Later callers make a call of their own
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """
+        :return: Number of calls made and of calls that shared another's outcome
+        :rtype: dict
+        """
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced}
@@ -0,0 +1,253 @@
+"""
+Instrumentation of :py:class:`provstore.api.Api`.
+
+Every attempt at a request is described by a :py:class:`RequestEvent` passed to the client's ``before_request`` and
+``after_request`` hooks:
+  >>> def log_slow(event):
+  ...     if event.elapsed > 1:
+  ...         print("%s %s took %.1fs" % (event.method, event.url, event.elapsed))
+  >>> api.register_hook('after_request', log_slow)
+
+A :py:class:`StatsCollector` aggregates them together with cache and parsing statistics:
+  >>> api = Api(stats=StatsCollector())
+  >>> document = api.document.get(148)
+  >>> api.stats.as_dict()['endpoints']['metadata']['requests']
+  1
+  >>> print(api.stats.to_prometheus())
+"""
+import threading
+
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class RequestEvent(object):
+    """
+    A single attempt at a request to the store.
+
+    ``response``, ``exception``, ``elapsed`` and ``bytes_received`` are only set once the attempt is over. Bytes
+    received are those of the response body, None when it is streamed, and so counted as it is consumed instead.
+    """
+    def __init__(self, method, url, endpoint, attempt=0, bytes_sent=0):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint
+        #: Number of retries that preceded this attempt
+        self.attempt = attempt
+        self.bytes_sent = bytes_sent
+
+        self.response = None
+        self.exception = None
+        self.elapsed = None
+        self.bytes_received = None
+
+    def __repr__(self):
+        return "<RequestEvent %s %s attempt=%i>" % (self.method.upper(), self.url, self.attempt)
+
+    @property
+    def status(self):
+        """
+        :return: The response status, or the name of the exception raised instead
+        """
+        if self.response is not None:
+            return self.response.status_code
+        if self.exception is not None:
+            return self.exception.__class__.__name__
+        return None
+
+
+class _Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class _EndpointStats(object):
+    def __init__(self, buckets):
+        self.latency = _Histogram(buckets)
+        self.statuses = {}
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+class StatsCollector(object):
+    """
+    Aggregates statistics of the requests made by a client, by endpoint of the store (documents, bundles or metadata).
+
+    Wire time is the time spent waiting for and reading responses, parse time the time spent deserializing their
+    content to :py:class:`prov.model.ProvDocument`.
+
+    :param buckets: Upper bounds of the latency histogram buckets, in seconds, the last being infinity
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+
+        self._endpoints = {}
+        self._cache = {'hits': 0, 'misses': 0}
+        self._parsing = {'count': 0, 'seconds': 0.0}
+        self._coalesced = 0
+        self._lock = threading.Lock()
+
+    def _endpoint(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = _EndpointStats(self.buckets)
+        return stats
+
+    def after_request(self, event):
+        """
+        Record an attempt at a request, used as an ``after_request`` hook.
+
+        :param event: The attempt
+        :type event: :py:class:`RequestEvent`
+        """
+        with self._lock:
+            stats = self._endpoint(event.endpoint)
+            stats.latency.observe(event.elapsed)
+            stats.statuses[event.status] = stats.statuses.get(event.status, 0) + 1
+            stats.bytes_sent += event.bytes_sent
+            if event.bytes_received is not None:
+                stats.bytes_received += event.bytes_received
+            if event.attempt:
+                stats.retries += 1
+
+    def record_received(self, endpoint, size):
+        """
+        Record bytes of a streamed response as they are consumed
+        """
+        with self._lock:
+            self._endpoint(endpoint).bytes_received += size
+
+    def record_cache(self, hit):
+        """
+        :param bool hit: Whether content was served from the cache, possibly after revalidating it with the store
+        """
+        with self._lock:
+            self._cache['hits' if hit else 'misses'] += 1
+
+    def record_parse(self, seconds):
+        with self._lock:
+            self._parsing['count'] += 1
+            self._parsing['seconds'] += seconds
+
+    def record_coalesced(self):
+        """
+        Record a read that shared the result of an identical one in flight, see :py:mod:`provstore.singleflight`
+        """
+        with self._lock:
+            self._coalesced += 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._cache = {'hits': 0, 'misses': 0}
+            self._parsing = {'count': 0, 'seconds': 0.0}
+            self._coalesced = 0
+
+    def as_dict(self):
+        """
+        :return: A snapshot of the statistics, for example::
+
+            {'endpoints': {'documents': {'requests': 2, 'retries': 0, 'statuses': {200: 2},
+                                         'bytes_sent': 0, 'bytes_received': 1024, 'seconds': 0.05,
+                                         'latency': [(0.005, 0), (0.01, 1), ..., (inf, 2)]}},
+             'cache': {'hits': 0, 'misses': 1},
+             'parsing': {'count': 1, 'seconds': 0.01},
+             'coalesced': 0,
+             'wire_seconds': 0.05}
+
+            where latency holds the number of requests that took at most each bucket's bound
+        :rtype: dict
+        """
+        with self._lock:
+            endpoints = dict((endpoint, {
+                'requests': stats.latency.count,
+                'retries': stats.retries,
+                'statuses': dict(stats.statuses),
+                'bytes_sent': stats.bytes_sent,
+                'bytes_received': stats.bytes_received,
+                'seconds': stats.latency.sum,
+                'latency': list(stats.latency.cumulative()),
+            }) for endpoint, stats in self._endpoints.items())
+
+            return {
+                'endpoints': endpoints,
+                'cache': dict(self._cache),
+                'parsing': dict(self._parsing),
+                'coalesced': self._coalesced,
+                'wire_seconds': sum(stats['seconds'] for stats in endpoints.values()),
+            }
+
+    def to_prometheus(self, prefix='provstore'):
+        """
+        :return: The statistics in the Prometheus text exposition format
+        :rtype: str
+        """
+        stats = self.as_dict()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, description))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for suffix, labels, value in samples:
+                label_text = ','.join('%s="%s"' % label for label in labels)
+                lines.append('%s_%s%s%s %s' % (prefix, name, suffix, '{%s}' % label_text if labels else '',
+                                                 repr(value)))
+
+        endpoints = sorted(stats['endpoints'].items())
+
+        samples = []
+        for endpoint, endpoint_stats in endpoints:
+            labels = [('endpoint', endpoint)]
+            for bound, count in endpoint_stats['latency']:
+                samples.append(('_bucket', labels + [('le', _format_bound(bound))], count))
+            samples.append(('_sum', labels, endpoint_stats['seconds']))
+            samples.append(('_count', labels, endpoint_stats['requests']))
+        metric('request_duration_seconds', 'histogram', 'Time taken by requests to the store.', samples)
+
+        metric('requests_total', 'counter', 'Requests to the store by response status.',
+               [('', [('endpoint', endpoint), ('status', status)], count)
+                for endpoint, endpoint_stats in endpoints
+                for status, count in sorted(endpoint_stats['statuses'].items(), key=lambda item: str(item[0]))])
+        metric('retries_total', 'counter', 'Retried requests to the store.',
+               [('', [('endpoint', endpoint)], endpoint_stats['retries']) for endpoint, endpoint_stats in endpoints])
+        metric('sent_bytes_total', 'counter', 'Bytes of request bodies sent to the store.',
+               [('', [('endpoint', endpoint)], endpoint_stats['bytes_sent'])
+                for endpoint, endpoint_stats in endpoints])
+        metric('received_bytes_total', 'counter', 'Bytes of response bodies received from the store.',
+               [('', [('endpoint', endpoint)], endpoint_stats['bytes_received'])
+                for endpoint, endpoint_stats in endpoints])
+
+        metric('cache_hits_total', 'counter', 'Content served from the cache.', [('', [], stats['cache']['hits'])])
+        metric('cache_misses_total', 'counter', 'Content fetched from the store.',
+               [('', [], stats['cache']['misses'])])
+        metric('parse_seconds_total', 'counter', 'Time spent deserializing provenance.',
+               [('', [], stats['parsing']['seconds'])])
+        metric('parses_total', 'counter', 'Provenance documents and bundles deserialized.',
+               [('', [], stats['parsing']['count'])])
+        metric('coalesced_total', 'counter', 'Reads that shared the result of an identical read in flight.',
+               [('', [], stats['coalesced'])])
+
+        return '\n'.join(lines) + '\n'
@@ -1 +1,21 @@
 __author__ = 'sam'
+
+import os
+import sys
+import unittest
+
+
+# Test modules using async syntax, left out of the suite on interpreters that cannot import them
+ASYNC_MODULES = ('test_aio',)
+
+
+def suite():
+    """
+    The suite run by ``setup.py test``: all test modules in this package, without those written for newer Pythons
+    """
+    names = sorted(name[:-3] for name in os.listdir(os.path.dirname(os.path.abspath(__file__)))
+                   if name.startswith('test') and name.endswith('.py'))
+    if sys.version_info < (3, 7):
+        names = [name for name in names if name not in ASYNC_MODULES]
+
+    return unittest.TestLoader().loadTestsFromNames(['%s.%s' % (__name__, name) for name in names])
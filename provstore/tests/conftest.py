@@ -0,0 +1,4 @@
+import sys
+
+# Async syntax, see provstore.tests.ASYNC_MODULES
+collect_ignore = ['test_aio.py'] if sys.version_info < (3, 7) else []
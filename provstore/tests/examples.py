@@ -8,3 +8,19 @@ def flat_document():
     document.entity(ns['entity-1'])
 
     return document
+
+
+def large_document(records=1000):
+    document = prov.ProvDocument()
+
+    ns = document.add_namespace('ex', 'http://example.com/')
+
+    # Chains of entities derived from each other, alternating elements and relations
+    previous = None
+    for i in range(records // 2):
+        entity = document.entity(ns['entity-%i' % i], {'ex:index': i})
+        if previous is not None:
+            document.wasDerivedFrom(entity, previous)
+        previous = entity
+
+    return document
@@ -0,0 +1,505 @@
+"""
+A local, in-memory stand-in for the ProvStore API.
+
+Implements the subset of endpoints used by :py:class:`provstore.api.Api` so that the client can be exercised and
+benchmarked without network access:
+
+  >>> from provstore.tests.server import FakeProvStoreServer
+  >>> server = FakeProvStoreServer().start()
+  >>> api = Api(base_url=server.base_url)
+  >>> ...
+  >>> server.stop()
+
+Latency and failures can be injected to exercise the client under adverse conditions:
+
+  >>> store = FakeProvStore(latency=(0.01, 0.05), failure_rate=0.1, seed=42)
+  >>> server = FakeProvStoreServer(store).start()
+"""
+import re
+import json
+import time
+import random
+import hashlib
+import datetime
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlencode
+except ImportError:  # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+    from urllib import urlencode
+
+
+API_PREFIX = '/store/api/v0'
+
+DOCUMENTS_RE = re.compile(r'^/documents/$')
+DOCUMENT_RE = re.compile(r'^/documents/(?P<document_id>-?\d+)/$')
+DOCUMENT_PROV_RE = re.compile(r'^/documents/(?P<document_id>-?\d+)\.(?P<format>\w+)$')
+BUNDLES_RE = re.compile(r'^/documents/(?P<document_id>-?\d+)/bundles/$')
+BUNDLE_PROV_RE = re.compile(r'^/documents/(?P<document_id>-?\d+)/bundles/(?P<bundle_id>\d+)\.(?P<format>\w+)$')
+
+AUTHORIZATION_RE = re.compile(r'^ApiKey (?P<username>[^:]+):(?P<api_key>.+)$')
+
+
+def _now():
+    return datetime.datetime.utcnow().isoformat()
+
+
+def _content_text(content):
+    # The client may send PROV-JSON either as an embedded object or as an encoded string
+    if isinstance(content, dict):
+        return json.dumps(content)
+    return content
+
+
+class FakeProvStore(object):
+    """
+    In-memory document and bundle storage backing :py:class:`FakeProvStoreServer`.
+
+    :param str owner: Owner of documents created anonymously or added directly
+    :param latency: Seconds to wait before answering each request, or a ``(min, max)`` range to draw it from
+    :param float failure_rate: Probability of answering a request with ``failure_status`` instead of handling it
+    :param int failure_status: Status of injected failures
+    :param int page_size: Default number of bundles per page of a listing, None not to paginate
+    :param dict api_keys: API key of each user, None to not check credentials. When set, invalid credentials are
+                          refused with 401, changes require credentials and private documents can only be read by
+                          their owner (403).
+    :param seed: Seed of the random latency and failures, for reproducible runs
+    """
+    def __init__(self, owner='provstore-api-test', latency=0.0, failure_rate=0.0, failure_status=503,
+                 page_size=None, api_keys=None, seed=None):
+        self.owner = owner
+        self.documents = {}
+        # Whether to send ETags with provenance and answer conditional requests
+        self.etags = True
+
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.page_size = page_size
+        self.api_keys = api_keys
+        self._random = random.Random(seed)
+
+        self.requests = 0
+        self.connections = 0
+        self.not_modified = 0
+        self.chunked_uploads = 0
+
+        # Scripted error responses, returned in order before handling requests normally
+        self.failures = []
+
+        self._lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._next_document_id = 1
+        self._next_bundle_id = 1
+
+    def count(self, counter):
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def fail(self, status, times=1, headers=None):
+        """
+        Answer the next requests with an error status instead of handling them
+        """
+        with self._lock:
+            self.failures.extend([(status, headers or {})] * times)
+
+    def next_failure(self):
+        with self._lock:
+            if self.failures:
+                return self.failures.pop(0)
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                return self.failure_status, {}
+
+    def delay(self):
+        """
+        :return: Seconds to wait before answering a request
+        """
+        if isinstance(self.latency, (tuple, list)):
+            with self._lock:
+                return self._random.uniform(*self.latency)
+        return self.latency
+
+    def add_document(self, content, name, public=False, document_id=None, owner=None):
+        with self._lock:
+            if document_id is None:
+                document_id = self._next_document_id
+            self._next_document_id = max(self._next_document_id, document_id + 1)
+
+            self.documents[document_id] = {
+                'id': document_id,
+                'document_name': name,
+                'public': public,
+                'owner': owner or self.owner,
+                'created_at': _now(),
+                'views_count': 0,
+                'content': _content_text(content),
+                'bundles': [],
+            }
+        return document_id
+
+    def add_bundle(self, document_id, content, identifier):
+        with self._lock:
+            bundle = {
+                'id': self._next_bundle_id,
+                'identifier': identifier,
+                'created_at': _now(),
+                'content': _content_text(content),
+            }
+            self._next_bundle_id += 1
+            self.documents[document_id]['bundles'].append(bundle)
+        return bundle
+
+    @staticmethod
+    def document_meta(document):
+        return dict((key, value) for key, value in document.items() if key not in ('content', 'bundles'))
+
+    @staticmethod
+    def bundle_meta(bundle):
+        return dict((key, value) for key, value in bundle.items() if key != 'content')
+
+
+class FakeProvStoreHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive between requests
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, avoid delayed ACK stalls on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # One handler instance serves one client connection
+        self.server.store.count('connections')
+        BaseHTTPRequestHandler.setup(self)
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def store(self):
+        return self.server.store
+
+    def _send(self, status, body=b'', content_type='application/json', headers=None):
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, obj):
+        self._send(status, json.dumps(obj))
+
+    def _send_prov(self, content):
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+
+        if not self.store.etags:
+            return self._send(200, content)
+
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.store.count('not_modified')
+            return self._send(304, headers={'ETag': etag})
+        self._send(200, content, headers={'ETag': etag})
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            self.store.count('chunked_uploads')
+
+            body = []
+            while True:
+                size = int(self.rfile.readline().split(b';', 1)[0].strip(), 16)
+                if not size:
+                    # Trailing CRLF after the last, empty, chunk
+                    self.rfile.readline()
+                    return b''.join(body)
+                body.append(self.rfile.read(size))
+                self.rfile.readline()
+
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length)
+
+    def _authenticate(self):
+        # The user making the request, None if anonymous, False if the credentials are invalid
+        match = AUTHORIZATION_RE.match(self.headers.get('Authorization', ''))
+        if match is None:
+            return None
+
+        username, api_key = match.group('username'), match.group('api_key')
+        if self.store.api_keys is not None and self.store.api_keys.get(username) != api_key:
+            return False
+        return username
+
+    def _authorize(self, document, write=False):
+        # Send an error and return False if the user may not access the document
+        if self.store.api_keys is None:
+            return True
+
+        if self.user is None and write:
+            self._send(401)
+            return False
+        if self.user != document['owner'] and (write or not document['public']):
+            self._send(403)
+            return False
+        return True
+
+    def _route(self, method):
+        self.store.count('requests')
+
+        delay = self.store.delay()
+        if delay:
+            time.sleep(delay)
+
+        failure = self.store.next_failure()
+        if failure is not None:
+            # Consume the body so the connection can be reused
+            self._read_body()
+            return self._send(failure[0], headers=failure[1])
+
+        path, _, query = self.path.partition('?')
+        if not path.startswith(API_PREFIX):
+            return self._send(404)
+        path = path[len(API_PREFIX):]
+        self.query = dict((key, values[-1]) for key, values in parse_qs(query).items())
+
+        self.user = self._authenticate()
+        if self.user is False:
+            self._read_body()
+            return self._send(401)
+
+        for pattern, name in ((DOCUMENTS_RE, 'documents'),
+                              (DOCUMENT_RE, 'document'),
+                              (DOCUMENT_PROV_RE, 'document_prov'),
+                              (BUNDLES_RE, 'bundles'),
+                              (BUNDLE_PROV_RE, 'bundle_prov')):
+            match = pattern.match(path)
+            if match:
+                handler = getattr(self, '%s_%s' % (method, name), None)
+                if handler is None:
+                    return self._send(405)
+                return handler(**match.groupdict())
+
+        self._send(404)
+
+    def _document(self, document_id, write=False):
+        # The document if it exists and may be accessed, otherwise None once an error has been sent
+        document = self.store.documents.get(int(document_id))
+        if document is None:
+            self._send(404)
+            return None
+        if not self._authorize(document, write):
+            return None
+        return document
+
+    def do_GET(self):
+        self._route('get')
+
+    def do_POST(self):
+        self._route('post')
+
+    def do_DELETE(self):
+        self._route('delete')
+
+    # Endpoints
+    def get_documents(self):
+        with self.store._lock:
+            documents = sorted(self.store.documents.values(), key=lambda document: document['id'])
+
+        if self.store.api_keys is not None:
+            documents = [document for document in documents
+                         if document['public'] or document['owner'] == self.user]
+        if 'owner' in self.query:
+            documents = [document for document in documents if document['owner'] == self.query['owner']]
+        if 'public' in self.query:
+            public = self.query['public'].lower() == 'true'
+            documents = [document for document in documents if document['public'] == public]
+
+        self._page('/documents/', [self.store.document_meta(document) for document in documents])
+
+    def post_documents(self):
+        body = self._read_body()
+        if self.store.api_keys is not None and self.user is None:
+            return self._send(401)
+
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return self._send(400)
+
+        if not data.get('rec_id') or 'content' not in data:
+            return self._send(400)
+
+        document_id = self.store.add_document(data['content'], data['rec_id'], data.get('public', False),
+                                              owner=self.user)
+        self._send_json(201, self.store.document_meta(self.store.documents[document_id]))
+
+    def get_document(self, document_id):
+        document = self._document(document_id)
+        if document is None:
+            return
+        self._send_json(200, self.store.document_meta(document))
+
+    def delete_document(self, document_id):
+        if self._document(document_id, write=True) is None:
+            return
+        self.store.documents.pop(int(document_id), None)
+        self._send(204)
+
+    def get_document_prov(self, document_id, format):
+        document = self._document(document_id)
+        if document is None:
+            return
+        if format != 'json':
+            return self._send(404)
+
+        # Merge the bundles into the document's content as ProvStore does
+        content = json.loads(document['content'])
+        if document['bundles']:
+            content.setdefault('bundle', {})
+            for bundle in document['bundles']:
+                content['bundle'][bundle['identifier']] = json.loads(bundle['content'])
+        self._send_prov(json.dumps(content))
+
+    def _page(self, path, objects):
+        # Tastypie style listing, a limit of 0 meaning all objects
+        try:
+            limit = int(self.query.get('limit', self.store.page_size or 0))
+            offset = int(self.query.get('offset', 0))
+        except ValueError:
+            return self._send(400)
+
+        total_count = len(objects)
+        if limit:
+            objects = objects[offset:offset + limit]
+        else:
+            objects = objects[offset:]
+
+        def link(page_offset):
+            query = dict(self.query, limit=limit, offset=page_offset)
+            return '%s%s?%s' % (API_PREFIX, path, urlencode(sorted(query.items())))
+
+        self._send_json(200, {
+            'meta': {
+                'limit': limit,
+                'offset': offset,
+                'total_count': total_count,
+                'next': link(offset + limit) if limit and offset + limit < total_count else None,
+                'previous': link(max(0, offset - limit)) if limit and offset else None,
+            },
+            'objects': objects
+        })
+
+    def get_bundles(self, document_id):
+        document = self._document(document_id)
+        if document is None:
+            return
+
+        bundles = document['bundles']
+        if 'identifier' in self.query:
+            bundles = [bundle for bundle in bundles if bundle['identifier'] == self.query['identifier']]
+
+        self._page('/documents/%s/bundles/' % document_id, [self.store.bundle_meta(bundle) for bundle in bundles])
+
+    def post_bundles(self, document_id):
+        body = self._read_body()
+        document = self._document(document_id, write=True)
+        if document is None:
+            return
+
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return self._send(400)
+
+        if not data.get('rec_id') or 'content' not in data:
+            return self._send(400)
+
+        bundle = self.store.add_bundle(document['id'], data['content'], data['rec_id'])
+        self._send_json(201, self.store.bundle_meta(bundle))
+
+    def get_bundle_prov(self, document_id, bundle_id, format):
+        document = self._document(document_id)
+        if document is None:
+            return
+        if format != 'json':
+            return self._send(404)
+
+        for bundle in document['bundles']:
+            if bundle['id'] == int(bundle_id):
+                return self._send_prov(bundle['content'])
+        self._send(404)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Room for many clients connecting at once, a full backlog stalls connections for a second
+    request_queue_size = 128
+
+
+class FakeProvStoreServer(object):
+    """
+    Serves a :py:class:`FakeProvStore` over HTTP on a background thread.
+
+    Can be used as a context manager, in which case the server is started on entry and stopped on exit.
+    """
+    def __init__(self, store=None, host='127.0.0.1', port=0):
+        self.store = store if store is not None else FakeProvStore()
+
+        self._httpd = _ThreadingHTTPServer((host, port), FakeProvStoreHandler)
+        self._httpd.store = self.store
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%i%s' % (host, port, API_PREFIX)
+
+    def start(self):
+        # Poll often so that stopping the server is quick
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class FakeProvStoreTestMixin(object):
+    """
+    Runs a :py:class:`FakeProvStoreServer` for the duration of a test case and exposes an :py:class:`Api` for it as
+    ``self.api``.
+    """
+    api_options = {}
+
+    def setUp(self):
+        from provstore.api import Api
+
+        super(FakeProvStoreTestMixin, self).setUp()
+        self.server = FakeProvStoreServer().start()
+        self.store = self.server.store
+        self.api = Api(username='provstore-api-test', api_key='secret', base_url=self.server.base_url,
+                       **self.api_options)
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+        super(FakeProvStoreTestMixin, self).tearDown()
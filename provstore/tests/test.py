@@ -4,17 +4,42 @@ import datetime
 
 from provstore.api import Api, NotFoundException, InvalidCredentialsException, InvalidDataException, ForbiddenException
 from provstore.document import AbstractDocumentException, ImmutableDocumentException, EmptyDocumentException
+from provstore.tests.server import FakeProvStore, FakeProvStoreServer
 import provstore.tests.examples as examples
 
 
 PROVSTORE_USERNAME = os.environ.get('PROVSTORE_USERNAME', 'provstore-api-test')
 PROVSTORE_API_KEY = os.environ.get('PROVSTORE_API_KEY', '56f7db0b9f1651d2cb0dd9b11c53b5fdc2dcacf4')
 
+# Tests run against a local stand-in of ProvStore unless PROVSTORE_LIVE is set
+PROVSTORE_LIVE = bool(os.environ.get('PROVSTORE_LIVE'))
+BASE_URL = None
+
+_server = None
+
+
+def setUpModule():
+    global BASE_URL, _server
+
+    if PROVSTORE_LIVE:
+        return
+
+    store = FakeProvStore(owner=PROVSTORE_USERNAME, api_keys={PROVSTORE_USERNAME: PROVSTORE_API_KEY})
+    store.add_document(examples.flat_document().serialize(), "public", public=True, document_id=148)
+
+    _server = FakeProvStoreServer(store).start()
+    BASE_URL = _server.base_url
+
+
+def tearDownModule():
+    if _server is not None:
+        _server.stop()
+
 
 class LoggedInAPITestMixin(object):
     @classmethod
     def setUpClass(cls):
-        cls.api = Api(username=PROVSTORE_USERNAME, api_key=PROVSTORE_API_KEY)
+        cls.api = Api(username=PROVSTORE_USERNAME, api_key=PROVSTORE_API_KEY, base_url=BASE_URL)
         return super(LoggedInAPITestMixin, cls).setUpClass()
 
 
@@ -36,7 +61,7 @@ class ProvStoreAPITests(LoggedInAPITestMixin, unittest.TestCase):
         stored_document = self.api.document.create(prov_document,
                                                    name="test_basic_storage")
 
-        public_api = Api()
+        public_api = Api(base_url=BASE_URL)
 
         with self.assertRaises(ForbiddenException):
             public_api.document.get(stored_document.id)
@@ -81,7 +106,8 @@ class ProvStoreAPITests(LoggedInAPITestMixin, unittest.TestCase):
         stored_document.add_bundle(prov_document, identifier="ex:bundle-1")
         stored_document.bundles['ex:bundle-2'] = prov_document
 
-        self.assertEqual(len(stored_document.bundles), 0)
+        # Counted by the store, without listing the bundles
+        self.assertEqual(len(stored_document.bundles), 2)
         self.assertEqual({u'ex:bundle-1', u'ex:bundle-2'},
                          set([bundle.identifier for bundle in stored_document.bundles]))
         self.assertEqual(len(stored_document.bundles.refresh()), 2)
@@ -210,10 +236,10 @@ class ProvStoreAPITests(LoggedInAPITestMixin, unittest.TestCase):
 class ProvStoreConfigAPITests(unittest.TestCase):
     def test_invalid_credentials(self):
         with self.assertRaises(InvalidCredentialsException):
-            api = Api(username="millar", api_key="bad")
+            api = Api(username="millar", api_key="bad", base_url=BASE_URL)
             api.document.get(148)
 
     def test_public_access(self):
-        api = Api()
+        api = Api(base_url=BASE_URL)
         stored_document = api.document.get(148)
         self.assertEqual(stored_document.id, 148)
\ No newline at end of file
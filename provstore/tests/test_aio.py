@@ -0,0 +1,110 @@
+import unittest
+import asyncio
+import datetime
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from provstore.api import NotFoundException, InvalidDataException
+from provstore.document import EmptyDocumentException
+from provstore.tests.server import FakeProvStoreServer
+import provstore.tests.examples as examples
+
+
+@unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+class AsyncApiTests(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeProvStoreServer().start()
+        self.store = self.server.store
+
+    def tearDown(self):
+        self.server.stop()
+
+    def run_with_api(self, coroutine_function, **options):
+        from provstore.aio import AsyncApi
+
+        async def main():
+            async with AsyncApi(username='provstore-api-test', api_key='secret',
+                                base_url=self.server.base_url, **options) as api:
+                return await coroutine_function(api)
+
+        return asyncio.run(main())
+
+    def test_document_lifecycle(self):
+        prov_document = examples.flat_document()
+
+        async def lifecycle(api):
+            stored_document = await api.document.create(prov_document, name="test_document_lifecycle")
+            document = await api.document.get(stored_document.id)
+
+            self.assertEqual(document, stored_document)
+            self.assertEqual(document.prov, prov_document)
+            self.assertEqual(document.name, "test_document_lifecycle")
+            self.assertFalse(document.public)
+            self.assertTrue(isinstance(document.created_at, datetime.datetime))
+
+            await document.delete()
+            with self.assertRaises(NotFoundException):
+                await api.document.get(stored_document.id)
+
+        self.run_with_api(lifecycle)
+
+    def test_bundles(self):
+        prov_document = examples.flat_document()
+
+        async def bundles(api):
+            document = await api.document.create(prov_document, name="test_bundles")
+            await document.add_bundle(prov_document, 'ex:bundle-1')
+            await document.bundles.set('ex:bundle-2', prov_document)
+
+            identifiers = set()
+            async for bundle in document.bundles:
+                identifiers.add(bundle.identifier)
+                self.assertEqual(await bundle.read_prov(), prov_document)
+            self.assertEqual(identifiers, {'ex:bundle-1', 'ex:bundle-2'})
+
+            bundle = await document.bundles.get('ex:bundle-2')
+            self.assertEqual(bundle.identifier, 'ex:bundle-2')
+            with self.assertRaises(NotFoundException):
+                await document.bundles.get('ex:not-there')
+
+        self.run_with_api(bundles)
+
+    def test_bundles_paginated(self):
+        content = examples.flat_document().serialize()
+        document_id = self.store.add_document(content, "test_bundles_paginated")
+        for i in range(105):
+            self.store.add_bundle(document_id, content, "ex:bundle-%i" % i)
+
+        async def bundles(api):
+            return await api.get_bundles(document_id)
+
+        self.assertEqual([bundle['identifier'] for bundle in self.run_with_api(bundles)],
+                         ["ex:bundle-%i" % i for i in range(105)])
+
+    def test_concurrent_uploads(self):
+        prov_document = examples.flat_document()
+
+        async def uploads(api):
+            documents = await asyncio.gather(*[
+                api.document.create(prov_document, name="test_concurrent_uploads_%i" % i) for i in range(50)
+            ])
+            return documents
+
+        documents = self.run_with_api(uploads, max_concurrency=8)
+
+        self.assertEqual(len(set(document.id for document in documents)), 50)
+        self.assertEqual(len(self.store.documents), 50)
+
+    def test_exceptions(self):
+        async def exceptions(api):
+            with self.assertRaises(InvalidDataException):
+                await api.document.create(examples.flat_document(), name="")
+
+            document = api.document.set(1)
+            with self.assertRaises(EmptyDocumentException):
+                document.name
+
+        self.run_with_api(exceptions)
@@ -0,0 +1,62 @@
+import json
+import unittest
+
+from prov.model import ProvDocument
+
+from provstore.api import _json_envelope
+from provstore.codec import available_codecs, StdlibCodec
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+class UploadTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def test_envelope_encodes_content_once(self):
+        prov_document = examples.large_document(100)
+        serialized = prov_document.serialize()
+
+        for codec in available_codecs():
+            body = b''.join(_json_envelope(codec, prov_document, public=True, rec_id="name"))
+            body = json.loads(body.decode('utf-8'))
+
+            self.assertEqual(body['public'], True)
+            self.assertEqual(body['rec_id'], "name")
+            self.assertEqual(body['content'], json.loads(serialized))
+
+            body = json.loads(b''.join(_json_envelope(codec, serialized, rec_id="name")).decode('utf-8'))
+            self.assertEqual(body['content'], json.loads(serialized))
+
+    def test_streamed_upload(self):
+        self.api.stream_threshold = 1024
+        prov_document = examples.large_document(100)
+
+        document = self.api.document.create(prov_document, name="test_streamed_upload")
+        document.add_bundle(prov_document, 'ex:bundle')
+
+        self.assertEqual(self.store.chunked_uploads, 2)
+        self.assertEqual(document.bundles['ex:bundle'].prov, prov_document)
+        self.assertEqual(ProvDocument.deserialize(content=self.store.documents[document.id]['content']),
+                         prov_document)
+
+    def test_small_upload_not_streamed(self):
+        document = self.api.document.create(examples.flat_document(), name="test_small_upload")
+        document.add_bundle(examples.flat_document().serialize(), 'ex:bundle')
+
+        self.assertEqual(self.store.chunked_uploads, 0)
+        self.assertEqual(document.bundles['ex:bundle'].prov, examples.flat_document())
+
+
+class CodecTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def test_codecs(self):
+        prov_document = examples.large_document(10)
+
+        for codec in available_codecs():
+            self.api.codec = codec
+
+            document = self.api.document.create(prov_document, name=u"test_codecs \u2713")
+            document.add_bundle(prov_document, 'ex:bundle')
+
+            self.assertEqual(self.api.document.get(document.id).name, u"test_codecs \u2713")
+            self.assertEqual(document.bundles['ex:bundle'].prov, prov_document)
+
+    def test_stdlib_fallback(self):
+        self.assertEqual(available_codecs()[-1].name, StdlibCodec.name)
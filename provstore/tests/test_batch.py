@@ -0,0 +1,129 @@
+import time
+import unittest
+import threading
+import multiprocessing
+
+from provstore.api import InvalidDataException, NotFoundException
+from provstore.batch import Batch
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+def count_records(prov_document):
+    return len(prov_document.get_records())
+
+
+class BatchTests(unittest.TestCase):
+    def test_bounded_and_lazy(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0, 'pulled': 0}
+
+        def items():
+            for i in range(20):
+                state['pulled'] += 1
+                yield i
+
+        def work(item):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+            return item * 2
+
+        batch = Batch(work, items(), concurrency=3)
+        results = iter(batch)
+        next(results)
+        self.assertLessEqual(state['pulled'], 6)
+
+        for _ in range(19):
+            next(results)
+        self.assertEqual(state['peak'], 3)
+        self.assertEqual(batch.succeeded, 20)
+        self.assertTrue(batch.throughput > 0)
+
+    def test_failures_do_not_abort(self):
+        def work(item):
+            if item % 2:
+                raise ValueError(item)
+            return item
+
+        batch = Batch(work, range(10), concurrency=4)
+        results = batch.results()
+
+        self.assertEqual([result.index for result in results], list(range(10)))
+        self.assertEqual(batch.succeeded, 5)
+        self.assertEqual(batch.failed, 5)
+        self.assertTrue(all(isinstance(result.exception, ValueError) for result in results if not result.ok))
+
+        with self.assertRaises(RuntimeError):
+            list(batch)
+
+
+class CreateManyTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def test_create_many(self):
+        prov_document = examples.flat_document()
+
+        def documents():
+            for i in range(20):
+                yield prov_document, {'name': "test_create_many_%i" % i}
+            yield prov_document, {'name': ""}
+
+        batch = self.api.create_many(documents(), concurrency=4, public=True)
+        results = batch.results()
+
+        self.assertEqual(batch.succeeded, 20)
+        self.assertEqual(batch.failed, 1)
+        self.assertTrue(isinstance(results[-1].exception, InvalidDataException))
+
+        for i, result in enumerate(results[:-1]):
+            document = self.store.documents[result.value.id]
+            self.assertEqual(document['document_name'], "test_create_many_%i" % i)
+            self.assertTrue(document['public'])
+
+    def test_shared_props(self):
+        batch = self.api.create_many([examples.flat_document()] * 3, name="test_shared_props")
+
+        self.assertEqual(len(self.store.documents), 0)
+        self.assertTrue(all(result.ok for result in batch))
+        self.assertEqual(len(self.store.documents), 3)
+
+
+class GetDocumentsTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(GetDocumentsTests, self).setUp()
+        self.document_ids = [self.store.add_document(examples.large_document(10 * (i + 1)).serialize(), "docs")
+                             for i in range(4)]
+
+    def test_threads(self):
+        results = self.api.get_documents(self.document_ids + [-1], concurrency=2).results()
+
+        for i, result in enumerate(results[:-1]):
+            self.assertEqual(result.item, self.document_ids[i])
+            self.assertEqual(result.value, examples.large_document(10 * (i + 1)))
+        self.assertTrue(isinstance(results[-1].exception, NotFoundException))
+
+    def test_process_pool(self):
+        batch = self.api.get_documents(self.document_ids, parse_workers=2)
+        results = batch.results()
+
+        self.assertEqual(batch.succeeded, 4)
+        self.assertEqual([result.value for result in results],
+                         [examples.large_document(10 * (i + 1)) for i in range(4)])
+
+    def test_process_pool_lifetime(self):
+        before = len(multiprocessing.active_children())
+        batch = self.api.get_documents(self.document_ids, parse_workers=2)
+        self.assertEqual(len(multiprocessing.active_children()), before)
+
+        self.assertEqual(batch.results()[0].value, examples.large_document(10))
+        self.assertEqual(len(multiprocessing.active_children()), before)
+
+    def test_transform_and_bundles(self):
+        bundle = self.store.add_bundle(self.document_ids[0], examples.large_document(5).serialize(), 'ex:bundle')
+
+        results = self.api.get_documents([(self.document_ids[0], bundle['id']), self.document_ids[1]],
+                                         parse_workers=2, transform=count_records).results()
+        self.assertEqual([result.value for result in results],
+                         [count_records(examples.large_document(5)), count_records(examples.large_document(20))])
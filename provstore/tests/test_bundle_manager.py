@@ -0,0 +1,149 @@
+import time
+import unittest
+
+from provstore.api import InvalidDataException
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+class BundlePrefetchTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(BundlePrefetchTests, self).setUp()
+
+        self.prov_document = examples.flat_document()
+        self.document = self.api.document.create(self.prov_document, name="test_bundle_prefetch")
+        for i in range(10):
+            self.document.add_bundle(self.prov_document, "ex:bundle-%i" % i)
+
+    def slow_get_bundle(self, delay):
+        get_bundle = self.api.get_bundle
+
+        def wrapper(*args, **kwargs):
+            time.sleep(delay)
+            return get_bundle(*args, **kwargs)
+
+        self.api.get_bundle = wrapper
+
+    def test_iter_prov(self):
+        self.slow_get_bundle(0.2)
+
+        start = time.time()
+        bundles = list(self.document.bundles.iter_prov(concurrency=10))
+        self.assertLess(time.time() - start, 1)
+
+        self.assertEqual(set(bundle.identifier for bundle in bundles),
+                         set("ex:bundle-%i" % i for i in range(10)))
+        for bundle in bundles:
+            self.assertTrue(bundle.loaded)
+            self.assertTrue(bundle.prov.parsed)
+            self.assertEqual(bundle.prov, self.prov_document)
+
+    def test_prefetch(self):
+        bundles = self.document.bundles.prefetch(workers=4)
+        requests = self.store.requests
+
+        for bundle in bundles:
+            self.assertTrue(bundle.prov.parsed)
+            self.assertEqual(bundle.prov, self.prov_document)
+        self.assertEqual(self.store.requests, requests)
+
+        # Already loaded bundles are not fetched again
+        list(bundles.iter_prov())
+        self.assertEqual(self.store.requests, requests)
+
+
+class BundleListingTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(BundleListingTests, self).setUp()
+
+        content = examples.flat_document().serialize()
+        self.document_id = self.store.add_document(content, "test_bundle_listing")
+        for i in range(25):
+            self.store.add_bundle(self.document_id, content, "ex:bundle-%i" % i)
+
+        self.bundles = self.api.document.get(self.document_id, prov=False).bundles
+        self.bundles._page_size = 10
+        self.requests = self.store.requests
+
+    def test_pages_read_while_iterating(self):
+        bundles = iter(self.bundles)
+        next(bundles)
+        time.sleep(0.05)
+        # The first page and the next one, prefetched
+        self.assertEqual(self.store.requests - self.requests, 2)
+
+        identifiers = [bundle.identifier for bundle in bundles]
+        self.assertEqual(len(identifiers), 24)
+        self.assertEqual(self.store.requests - self.requests, 3)
+
+        # Listed once
+        self.assertEqual(len(list(self.bundles)), 25)
+        self.assertEqual(self.store.requests - self.requests, 3)
+
+    def test_len_from_total(self):
+        self.assertEqual(len(self.bundles), 25)
+        self.assertEqual(self.store.requests - self.requests, 1)
+
+        self.bundles['ex:bundle-25'] = examples.flat_document()
+        self.assertEqual(len(self.bundles), 26)
+
+    def test_lookup_filtered(self):
+        self.assertEqual(self.bundles['ex:bundle-20'].identifier, 'ex:bundle-20')
+        self.assertTrue('ex:bundle-3' in self.bundles)
+        self.assertFalse('ex:bundle-99' in self.bundles)
+        self.assertEqual(self.store.requests - self.requests, 3)
+
+        # Already seen
+        self.bundles['ex:bundle-20']
+        self.assertEqual(self.store.requests - self.requests, 3)
+
+    def test_lookup_unfiltered(self):
+        get_bundles_page = self.api.get_bundles_page
+
+        def unfiltered(document_id, offset=0, limit=None, identifier=None):
+            return get_bundles_page(document_id, offset, limit)
+
+        # A store ignoring the filter answers with pages of all bundles
+        self.api.get_bundles_page = unfiltered
+        self.assertEqual(self.bundles['ex:bundle-3'].identifier, 'ex:bundle-3')
+        self.assertEqual(len(self.bundles._bundles), 1)
+
+        self.assertTrue('ex:bundle-20' in self.bundles)
+        self.assertEqual(self.bundles['ex:bundle-24'].identifier, 'ex:bundle-24')
+        self.assertFalse('ex:bundle-99' in self.bundles)
+
+    def test_get_bundles_follows_pages(self):
+        self.assertEqual(len(self.api.get_bundles(self.document_id)), 25)
+
+
+class BundleUpdateTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(BundleUpdateTests, self).setUp()
+        self.document = self.api.document.create(examples.flat_document(), name="test_bundle_update")
+
+    def test_update(self):
+        bundles = self.document.bundles
+        self.assertEqual(len(bundles), 0)
+
+        results = bundles.update([("ex:bundle-%i" % i, examples.large_document(10)) for i in range(20)] +
+                                 [("", examples.flat_document())], concurrency=4)
+
+        self.assertTrue(all(result.ok for result in results[:-1]))
+        self.assertTrue(isinstance(results[-1].exception, InvalidDataException))
+        self.assertEqual([result.value.identifier for result in results[:-1]],
+                         ["ex:bundle-%i" % i for i in range(20)])
+        self.assertEqual(len(self.store.documents[self.document.id]['bundles']), 20)
+
+        # Known from the responses, nothing is listed again
+        requests = self.store.requests
+        self.assertEqual(len(bundles), 20)
+        self.assertEqual(bundles['ex:bundle-7'], results[7].value)
+        self.assertEqual(self.store.requests, requests)
+
+    def test_add_bundles_lazy(self):
+        batch = self.document.add_bundles({'ex:bundle-1': examples.flat_document(),
+                                           'ex:bundle-2': examples.flat_document().serialize()})
+        self.assertEqual(len(self.store.documents[self.document.id]['bundles']), 0)
+
+        self.assertEqual(set(result.value.identifier for result in batch), set(['ex:bundle-1', 'ex:bundle-2']))
+        self.assertEqual(batch.succeeded, 2)
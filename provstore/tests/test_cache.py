@@ -0,0 +1,105 @@
+import shutil
+import tempfile
+import unittest
+
+from provstore.cache import CacheEntry, MemoryCache, DiskCache, TieredCache
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+BASE_URL = 'http://example.com/store/api/v0'
+
+
+class MemoryCacheTests(unittest.TestCase):
+    def test_lru_byte_budget(self):
+        cache = MemoryCache(max_bytes=10)
+
+        cache.set((BASE_URL, 1, None, 'json'), CacheEntry(b'1234'))
+        cache.set((BASE_URL, 2, None, 'json'), CacheEntry(b'1234'))
+        cache.get((BASE_URL, 1, None, 'json'))
+        cache.set((BASE_URL, 3, None, 'json'), CacheEntry(b'1234'))
+
+        self.assertEqual(cache.size, 8)
+        self.assertIsNone(cache.get((BASE_URL, 2, None, 'json')))
+        self.assertEqual(cache.get((BASE_URL, 1, None, 'json')).content, b'1234')
+
+        # Too large to ever fit
+        cache.set((BASE_URL, 4, None, 'json'), CacheEntry(b'12345678901'))
+        self.assertIsNone(cache.get((BASE_URL, 4, None, 'json')))
+
+    def test_invalidate(self):
+        cache = MemoryCache()
+        cache.set((BASE_URL, 1, None, 'json'), CacheEntry(b'document'))
+        cache.set((BASE_URL, 1, 5, 'json'), CacheEntry(b'bundle'))
+        cache.set((BASE_URL, 2, None, 'json'), CacheEntry(b'other'))
+
+        cache.invalidate(BASE_URL, 1)
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, 5)
+
+
+class DiskCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        cache = DiskCache(self.directory)
+        cache.set((BASE_URL, 1, None, 'json'), CacheEntry(b'{"a": 1}\n{}', etag='"abc"'))
+
+        entry = DiskCache(self.directory).get((BASE_URL, 1, None, 'json'))
+        self.assertEqual(entry.content, b'{"a": 1}\n{}')
+        self.assertEqual(entry.validators, {'If-None-Match': '"abc"'})
+
+        cache.invalidate(BASE_URL, 1)
+        self.assertIsNone(cache.get((BASE_URL, 1, None, 'json')))
+
+    def test_tiered(self):
+        memory, disk = MemoryCache(), DiskCache(self.directory)
+        disk.set((BASE_URL, 1, 2, 'json'), CacheEntry(b'bundle'))
+
+        cache = TieredCache(memory, disk)
+        self.assertEqual(cache.get((BASE_URL, 1, 2, 'json')).content, b'bundle')
+        self.assertEqual(memory.get((BASE_URL, 1, 2, 'json')).content, b'bundle')
+
+
+class ApiCacheTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(ApiCacheTests, self).setUp()
+        self.api.cache = MemoryCache()
+
+        self.prov_document = examples.flat_document()
+        self.document = self.api.document.create(self.prov_document, name="test_cache")
+
+    def test_revalidation(self):
+        self.assertEqual(self.api.get_document_prov(self.document.id), self.prov_document)
+        self.assertEqual(self.api.get_document_prov(self.document.id), self.prov_document)
+
+        self.assertEqual(self.store.not_modified, 1)
+
+    def test_immutable_without_validators(self):
+        self.store.etags = False
+        self.document.add_bundle(self.prov_document, 'ex:bundle')
+        bundle = self.api.get_bundles(self.document.id)[0]
+
+        self.api.get_bundle(self.document.id, bundle['id'])
+        requests = self.store.requests
+        self.assertEqual(self.api.get_bundle(self.document.id, bundle['id']), self.prov_document)
+        self.assertEqual(self.store.requests, requests)
+
+    def test_add_bundle_invalidates(self):
+        self.store.etags = False
+        self.api.get_document_prov(self.document.id)
+
+        self.document.add_bundle(self.prov_document, 'ex:bundle')
+        self.assertNotEqual(self.api.get_document_prov(self.document.id), self.prov_document)
+
+    def test_delete_evicts(self):
+        self.api.get_document_prov(self.document.id)
+        self.assertEqual(len(self.api.cache), 1)
+
+        self.document.delete()
+        self.assertEqual(len(self.api.cache), 0)
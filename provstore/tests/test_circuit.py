@@ -0,0 +1,161 @@
+import time
+import unittest
+import threading
+
+from provstore.api import CircuitOpenException, ConcurrencyLimitException, ProvStoreException, _endpoint
+from provstore.circuit import CircuitBreaker, AdaptiveLimiter
+from provstore.retry import RetryPolicy
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_opens_and_recovers(self):
+        breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=4, reset_timeout=0.05)
+
+        for success in (True, False, False, True):
+            self.assertTrue(breaker.allow('documents'))
+            breaker.record('documents', success, 0.01)
+        self.assertEqual(breaker.state('documents'), 'open')
+        self.assertFalse(breaker.allow('documents'))
+
+        # Other endpoints are unaffected
+        self.assertTrue(breaker.allow('bundles'))
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow('documents'))
+        # Only one trial call at a time
+        self.assertFalse(breaker.allow('documents'))
+        breaker.record('documents', True, 0.01)
+        self.assertEqual(breaker.state('documents'), 'closed')
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(window=2, min_calls=2, reset_timeout=0.05)
+        for _ in range(2):
+            breaker.allow('metadata')
+            breaker.record('metadata', False, 0.01)
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow('metadata'))
+        breaker.record('metadata', False, 0.01)
+        self.assertEqual(breaker.state('metadata'), 'open')
+        self.assertEqual(breaker.stats()['metadata']['failures'], 3)
+
+    def test_slow_calls_fail(self):
+        breaker = CircuitBreaker(window=2, min_calls=2, slow_call_duration=1)
+        for _ in range(2):
+            breaker.allow('documents')
+            breaker.record('documents', True, 2)
+        self.assertEqual(breaker.state('documents'), 'open')
+
+    def test_endpoints(self):
+        self.assertEqual(_endpoint('/documents/'), 'documents')
+        self.assertEqual(_endpoint('/documents/12.json'), 'documents')
+        self.assertEqual(_endpoint('/documents/12/'), 'metadata')
+        self.assertEqual(_endpoint('/documents/12/bundles/'), 'bundles')
+        self.assertEqual(_endpoint('/documents/12/bundles/3.json'), 'bundles')
+
+
+class AdaptiveLimiterTests(unittest.TestCase):
+    def test_aimd(self):
+        limiter = AdaptiveLimiter(initial_limit=4, max_limit=5, latency_floor=0)
+
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(0.1, True)
+        self.assertEqual(limiter.limit, 5)
+
+        limiter.acquire()
+        limiter.release(0.1, False)
+        self.assertEqual(limiter.limit, 2.5)
+
+        # Much slower than the baseline
+        limiter.acquire()
+        limiter.release(1, True)
+        self.assertEqual(limiter.limit, 1.25)
+
+    def test_bounds_concurrency(self):
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=2)
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def work():
+            limiter.acquire()
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+            limiter.release(0.02, True)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(state['peak'], 2)
+
+    def test_max_wait(self):
+        limiter = AdaptiveLimiter(initial_limit=1, max_wait=0.01)
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+        self.assertEqual(limiter.rejected, 1)
+
+
+class ApiCircuitTests(FakeProvStoreTestMixin, unittest.TestCase):
+    api_options = {'retry': RetryPolicy(max_retries=0)}
+
+    def test_fails_fast(self):
+        self.api.circuit_breaker = CircuitBreaker(window=3, min_calls=3)
+        document_id = self.store.add_document(examples.flat_document().serialize(), "test_fails_fast")
+
+        self.store.fail(500, times=3)
+        for _ in range(3):
+            with self.assertRaises(ProvStoreException):
+                self.api.get_document_meta(document_id)
+
+        requests = self.store.requests
+        with self.assertRaises(CircuitOpenException):
+            self.api.get_document_meta(document_id)
+        self.assertEqual(self.store.requests, requests)
+
+        # Only the metadata endpoint is open
+        self.api.get_document_prov(document_id)
+
+    def test_limiter(self):
+        self.api.limiter = AdaptiveLimiter(initial_limit=1, max_wait=0)
+        self.api.limiter.acquire()
+
+        with self.assertRaises(ConcurrencyLimitException):
+            self.api.get_document_meta(1)
+
+        self.api.limiter.release()
+        with self.assertRaises(ProvStoreException):
+            self.api.get_document_meta(1)
+        self.assertEqual(self.api.limiter.in_flight, 0)
+
+    def test_failing_hook_gives_back(self):
+        self.api.limiter = AdaptiveLimiter(initial_limit=2, max_wait=0.2)
+        self.api.circuit_breaker = CircuitBreaker(window=1, min_calls=1, reset_timeout=0)
+        document_id = self.store.add_document(examples.flat_document().serialize(), "test_failing_hook_gives_back")
+
+        # Opened by a failure, half-open for the next call
+        self.store.fail(500)
+        with self.assertRaises(ProvStoreException):
+            self.api.get_document_meta(document_id)
+
+        def hook(event):
+            raise ValueError()
+
+        self.api.register_hook('before_request', hook)
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.api.get_document_meta(document_id)
+        self.assertEqual(self.api.limiter.in_flight, 0)
+        self.assertEqual(self.api.circuit_breaker.state('metadata'), 'half-open')
+
+        self.api.deregister_hook('before_request', hook)
+        self.api.get_document_meta(document_id)
+        self.assertEqual(self.api.circuit_breaker.state('metadata'), 'closed')
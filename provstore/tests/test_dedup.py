@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import prov.model as prov
+
+from provstore.dedup import DedupIndex, canonical_hash
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+def shuffled_document(order):
+    document = prov.ProvDocument()
+    for prefix in order:
+        document.add_namespace(prefix, 'http://%s.example.com/' % prefix)
+
+    for prefix in order:
+        document.entity('%s:entity' % prefix, {'ex:value': prefix})
+    for prefix in order:
+        # Anonymous relations, numbered in the order they are added
+        document.wasDerivedFrom('%s:entity' % prefix, 'ex:entity')
+
+    return document
+
+
+class CanonicalHashTests(unittest.TestCase):
+    def test_order_independent(self):
+        first = canonical_hash(shuffled_document(['ex', 'a', 'b']))
+        self.assertEqual(first, canonical_hash(shuffled_document(['b', 'ex', 'a'])))
+        self.assertEqual(first, canonical_hash(shuffled_document(['ex', 'a', 'b']).serialize(), 'json'))
+
+        self.assertNotEqual(first, canonical_hash(shuffled_document(['ex', 'a'])))
+        self.assertNotEqual(canonical_hash(examples.large_document(10)), canonical_hash(examples.large_document(12)))
+
+
+class DedupTests(FakeProvStoreTestMixin, unittest.TestCase):
+    api_options = {'dedup': True}
+
+    def test_create(self):
+        document = self.api.document.create(shuffled_document(['ex', 'a']), name="test_create")
+        duplicate = self.api.document.create(shuffled_document(['a', 'ex']).serialize(), 'json', name="test_create_2")
+
+        self.assertEqual(duplicate.id, document.id)
+        self.assertEqual(len(self.store.documents), 1)
+
+        # Only reused with the same visibility
+        public = self.api.document.create(shuffled_document(['ex', 'a']), name="test_create", public=True)
+        self.assertNotEqual(public.id, document.id)
+
+    def test_add_bundle(self):
+        document = self.api.document.create(examples.flat_document(), name="test_add_bundle")
+
+        for _ in range(2):
+            document.add_bundle(examples.large_document(10), 'ex:bundle')
+        document.add_bundle(examples.large_document(10), 'ex:other')
+
+        self.assertEqual([bundle['identifier'] for bundle in self.store.documents[document.id]['bundles']],
+                         ['ex:bundle', 'ex:other'])
+
+    def test_delete_forgets(self):
+        document = self.api.document.create(examples.flat_document(), name="test_delete_forgets")
+        document_id = document.id
+        document.delete()
+
+        self.assertNotEqual(self.api.document.create(examples.flat_document(), name="test_delete_forgets").id,
+                            document_id)
+        self.assertEqual(len(self.store.documents), 1)
+
+    def test_persistent(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'dedup.sqlite')
+        try:
+            self.api.dedup = DedupIndex(path)
+            document_id = self.api.document.create(examples.flat_document(), name="test_persistent").id
+            self.api.dedup.close()
+
+            self.api.dedup = DedupIndex(path)
+            self.assertEqual(self.api.document.create(examples.flat_document(), name="test_persistent").id,
+                             document_id)
+            self.api.dedup.close()
+        finally:
+            shutil.rmtree(directory)
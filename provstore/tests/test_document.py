@@ -0,0 +1,249 @@
+import gc
+import io
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from prov.model import ProvDocument
+
+from provstore.api import NotFoundException
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+class DocumentMetadataTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(DocumentMetadataTests, self).setUp()
+        self.document_id = self.api.document.create(examples.flat_document(), name="test_metadata").id
+
+    def test_falsy_metadata_loaded_once(self):
+        document = self.api.document.set(self.document_id)
+
+        for _ in range(5):
+            self.assertEqual(document.views, 0)
+            self.assertFalse(document.public)
+            self.assertEqual(document.name, "test_metadata")
+
+        self.assertEqual(self.api.meta_fetches, 1)
+
+    def test_meta_ttl(self):
+        self.api.meta_ttl = 0.05
+        document = self.api.document.set(self.document_id)
+
+        document.views
+        document.views
+        self.assertTrue(document.meta_loaded)
+        self.assertEqual(self.api.meta_fetches, 1)
+
+        time.sleep(0.1)
+        self.assertFalse(document.meta_loaded)
+        document.views
+        self.assertEqual(self.api.meta_fetches, 2)
+
+    def test_metadata_kept_after_delete(self):
+        document = self.api.document.set(self.document_id).read_meta()
+        document.delete()
+
+        self.assertEqual(document.name, "test_metadata")
+        self.assertEqual(self.api.meta_fetches, 1)
+
+
+class DocumentReadTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(DocumentReadTests, self).setUp()
+        self.prov_document = examples.flat_document()
+        self.document_id = self.api.document.create(self.prov_document, name="test_read").id
+
+    def slow(self, method, delay):
+        original = getattr(self.api, method)
+
+        def wrapper(*args, **kwargs):
+            time.sleep(delay)
+            return original(*args, **kwargs)
+
+        setattr(self.api, method, wrapper)
+
+    def test_concurrent_read(self):
+        self.slow('get_document_prov', 0.2)
+        self.slow('get_document_meta', 0.2)
+
+        start = time.time()
+        document = self.api.document.get(self.document_id)
+        self.assertLess(time.time() - start, 0.35)
+
+        requests = self.store.requests
+        self.assertEqual(document.prov, self.prov_document)
+        self.assertEqual(document.name, "test_read")
+        self.assertEqual(self.store.requests, requests)
+
+    def test_partial_read(self):
+        document = self.api.document.get(self.document_id, prov=False)
+        self.assertEqual(self.store.requests, 2)
+        self.assertEqual(document.name, "test_read")
+
+        document = self.api.document.get(self.document_id, meta=False)
+        self.assertEqual(self.store.requests, 3)
+        self.assertEqual(self.api.meta_fetches, 1)
+
+    def test_bundles_without_metadata(self):
+        self.store.add_bundle(self.document_id, examples.flat_document().serialize(), 'ex:bundle')
+
+        self.assertEqual(self.api.document.get(self.document_id, meta=False).bundles['ex:bundle'].identifier,
+                         'ex:bundle')
+        self.assertEqual(len(self.api.document.set(self.document_id).bundles), 1)
+
+    def test_read_errors(self):
+        with self.assertRaises(NotFoundException):
+            self.api.document.get(-1)
+
+    def test_read_reports_metadata_error(self):
+        def failing_meta(document_id):
+            raise ValueError()
+
+        def failing_prov(*args, **kwargs):
+            time.sleep(0.1)
+            raise NotFoundException()
+
+        self.api.get_document_meta = failing_meta
+        self.api.get_document_prov = failing_prov
+
+        # Both fail, the metadata's error is not replaced by the provenance's
+        with self.assertRaises(ValueError):
+            self.api.document.get(self.document_id)
+
+
+class DocumentDownloadTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(DocumentDownloadTests, self).setUp()
+        self.prov_document = examples.flat_document()
+        self.document = self.api.document.create(self.prov_document, name="test_download")
+        self.document.add_bundle(self.prov_document, 'ex:bundle')
+
+    def test_stream(self):
+        chunks = list(self.api.get_document_prov(self.document.id, 'json', stream=True, chunk_size=16))
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(b''.join(chunks), self.api.get_document_prov(self.document.id, 'json'))
+
+        with self.assertRaises(ValueError):
+            self.api.get_document_prov(self.document.id, stream=True)
+
+    def test_stream_errors_raised_on_call(self):
+        with self.assertRaises(NotFoundException):
+            self.api.get_document_prov(-1, 'json', stream=True)
+
+    def test_download(self):
+        destination = io.BytesIO()
+        written = self.document.download(destination)
+
+        self.assertEqual(written, len(destination.getvalue()))
+        self.assertEqual(len(list(ProvDocument.deserialize(content=destination.getvalue()).bundles)), 1)
+
+    def test_download_bundle_to_path(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'bundle.json')
+        try:
+            self.document.bundles['ex:bundle'].download(path)
+            self.assertEqual(ProvDocument.deserialize(path), self.prov_document)
+        finally:
+            shutil.rmtree(directory)
+
+
+class IdentityMapTests(FakeProvStoreTestMixin, unittest.TestCase):
+    api_options = {'identity_map': True}
+
+    def setUp(self):
+        super(IdentityMapTests, self).setUp()
+        self.document_ids = [self.store.add_document(examples.flat_document().serialize(), "map %i" % i)
+                             for i in range(3)]
+
+    def test_set_and_get_reuse_documents(self):
+        document = self.api.document.get(self.document_ids[0])
+        requests = self.store.requests
+
+        self.assertIs(self.api.document.set(self.document_ids[0]), document)
+        self.assertIs(self.api.document.get(self.document_ids[0]), document)
+        self.assertEqual(self.api.document.set(self.document_ids[0]).name, "map 0")
+        self.assertEqual(self.store.requests, requests)
+
+        self.assertIsNot(self.api.document.set(self.document_ids[1]), document)
+
+    def test_get_loads_what_is_missing(self):
+        document = self.api.document.set(self.document_ids[0])
+        self.api.document.get(self.document_ids[0], prov=False)
+        self.assertTrue(document.meta_loaded)
+        self.assertEqual(self.api.meta_fetches, 1)
+
+        self.api.document.get(self.document_ids[0])
+        self.assertEqual(self.api.meta_fetches, 1)
+        self.assertIsNotNone(document._prov)
+
+    def test_eviction(self):
+        self.api.document.get(self.document_ids[0], prov=False)
+        gc.collect()
+
+        self.api.document.get(self.document_ids[0], prov=False)
+        self.assertEqual(self.api.meta_fetches, 2)
+
+    def test_delete_forgets(self):
+        document = self.api.document.create(examples.flat_document(), name="deleted")
+        document_id = document.id
+        self.assertIs(self.api.document.set(document_id), document)
+
+        document.delete()
+        self.assertIsNot(self.api.document.set(document_id), document)
+
+    def test_get_metas(self):
+        loaded = self.api.document.get(self.document_ids[0], prov=False)
+
+        batch = self.api.get_metas(self.document_ids + [-1], concurrency=2)
+        results = batch.results()
+
+        self.assertEqual([result.value.name for result in results[:-1]], ["map 0", "map 1", "map 2"])
+        self.assertTrue(isinstance(results[-1].exception, NotFoundException))
+        self.assertIs(results[0].value, loaded)
+        self.assertIs(self.api.document.set(self.document_ids[1]), results[1].value)
+        # The loaded document was not fetched again
+        self.assertEqual(self.api.meta_fetches, 4)
+
+
+class DocumentListingTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(DocumentListingTests, self).setUp()
+        content = examples.flat_document().serialize()
+        for i in range(7):
+            self.store.add_document(content, "listed %i" % i, public=bool(i % 2),
+                                    owner='other' if i == 6 else None)
+
+    def test_pages(self):
+        documents = self.api.documents(page_size=3)
+        self.assertEqual(self.store.requests, 0)
+
+        first = next(documents)
+        self.assertEqual(first.name, "listed 0")
+        # The first page and the next one, prefetched
+        time.sleep(0.05)
+        self.assertEqual(self.store.requests, 2)
+
+        names = [first.name] + [document.name for document in documents]
+        self.assertEqual(names, ["listed %i" % i for i in range(7)])
+        self.assertEqual(self.store.requests, 3)
+        self.assertEqual(self.api.meta_fetches, 0)
+        self.assertEqual(first._prov, None)
+
+    def test_filters(self):
+        self.assertEqual([document.name for document in self.api.documents(public=True)],
+                         ["listed 1", "listed 3", "listed 5"])
+        self.assertEqual([document.name for document in self.api.documents(owner='other', page_size=1)],
+                         ["listed 6"])
+        self.assertEqual(list(self.api.documents(owner='nobody')), [])
+
+    def test_closed_early(self):
+        documents = self.api.documents(page_size=2)
+        next(documents)
+        documents.close()
+
+        time.sleep(0.05)
+        self.assertLessEqual(self.store.requests, 2)
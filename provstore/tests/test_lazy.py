@@ -0,0 +1,77 @@
+import pickle
+import unittest
+
+from prov.model import ProvDocument
+
+from provstore.lazy import LazyProvDocument
+from provstore.stats import StatsCollector
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+class LazyProvDocumentTests(unittest.TestCase):
+    def setUp(self):
+        self.document = examples.flat_document()
+        self.parses = 0
+
+        def parse(raw):
+            self.parses += 1
+            return ProvDocument.deserialize(content=raw.decode('utf-8'))
+
+        self.lazy = LazyProvDocument(self.document.serialize().encode('utf-8'), parse)
+
+    def test_parsed_on_first_use(self):
+        self.assertTrue(isinstance(self.lazy, ProvDocument))
+        self.assertFalse(self.lazy.parsed)
+        self.assertIn(b'"prefix"', self.lazy.raw)
+        self.assertEqual(self.parses, 0)
+
+        self.assertEqual(len(self.lazy.get_records()), len(self.document.get_records()))
+        self.assertEqual(self.lazy, self.document)
+        self.assertEqual(self.document, self.lazy)
+        self.assertTrue(self.lazy.parsed)
+        self.assertEqual(self.parses, 1)
+
+    def test_pickle(self):
+        self.assertEqual(pickle.loads(pickle.dumps(self.lazy)), self.document)
+
+
+class ApiLazyTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(ApiLazyTests, self).setUp()
+        self.api.stats = StatsCollector()
+        self.document_id = self.store.add_document(examples.flat_document().serialize(), "lazy")
+
+    def test_document_prov(self):
+        prov = self.api.document.get(self.document_id).prov
+        self.assertEqual(self.api.stats.as_dict()['parsing']['count'], 0)
+
+        self.assertEqual(prov, examples.flat_document())
+        self.assertEqual(self.api.stats.as_dict()['parsing']['count'], 1)
+
+    def test_raw(self):
+        document = self.api.document.get(self.document_id)
+        requests = self.store.requests
+
+        # Already downloaded
+        self.assertEqual(ProvDocument.deserialize(content=document.raw().decode('utf-8')), examples.flat_document())
+        self.assertEqual(self.store.requests, requests)
+
+        self.assertEqual(self.api.document.set(self.document_id).raw(), document.raw())
+        self.assertEqual(self.api.stats.as_dict()['parsing']['count'], 0)
+
+    def test_forwarded_unparsed(self):
+        prov = self.api.document.get(self.document_id).prov
+        copy = self.api.document.create(prov, name="copy")
+
+        self.assertFalse(prov.parsed)
+        self.assertEqual(self.api.document.get(copy.id).prov, examples.flat_document())
+
+    def test_bundle_prov(self):
+        document = self.api.document.get(self.document_id)
+        document.add_bundle(examples.flat_document(), 'ex:bundle')
+
+        bundle = document.bundles.refresh()['ex:bundle']
+        self.assertFalse(bundle.prov.parsed)
+        self.assertEqual(bundle.raw(), bundle.prov.raw)
+        self.assertEqual(bundle.prov, examples.flat_document())
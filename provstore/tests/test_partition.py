@@ -0,0 +1,111 @@
+import unittest
+
+from prov.model import ProvDocument
+
+from provstore.api import InvalidDataException
+from provstore.document import IncompleteUploadException
+from provstore.partition import Partition
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+def merged(bundles):
+    # The records of all bundles, as a single document
+    document = ProvDocument()
+    for _, bundle in bundles:
+        for record in bundle.get_records():
+            document.add_record(record)
+    return document
+
+
+class PartitionTests(unittest.TestCase):
+    def test_bounded_and_complete(self):
+        prov_document = examples.large_document(100)
+        partition = Partition(prov_document, chunk_size=15)
+        bundles = list(partition.bundles())
+
+        self.assertEqual(len(partition), 7)
+        self.assertTrue(all(len(bundle.get_records()) <= 15 for _, bundle in bundles))
+        self.assertEqual(merged(bundles), prov_document)
+
+        # Every bundle is declared in the skeleton
+        self.assertEqual(set(record.identifier for record in partition.skeleton.get_records()),
+                         set(identifier for identifier, _ in bundles))
+
+    def test_relations_follow_elements(self):
+        prov_document = ProvDocument()
+        prov_document.add_namespace('ex', 'http://example.com/')
+        entities = [prov_document.entity('ex:entity-%i' % i) for i in range(6)]
+        for i in range(6):
+            prov_document.wasDerivedFrom(entities[i], entities[(i + 1) % 6])
+
+        bundles = list(Partition(prov_document, chunk_size=4).bundles())
+        for _, bundle in bundles:
+            identifiers = set(record.identifier for record in bundle.get_records() if record.is_element())
+            for record in bundle.get_records():
+                if record.is_relation():
+                    self.assertTrue(record.formal_attributes[0][1] in identifiers)
+
+        self.assertEqual([list(bundle.namespaces)[0].uri for _, bundle in bundles], ['http://example.com/'] * 3)
+
+    def test_named_bundles_kept(self):
+        prov_document = examples.large_document(10)
+        prov_document.bundle('ex:bundle').entity('ex:in-bundle')
+
+        identifiers = [str(identifier) for identifier, _ in Partition(prov_document, chunk_size=4).bundles()]
+        self.assertEqual(identifiers, ['chunk:1', 'chunk:2', 'chunk:3', 'ex:bundle'])
+
+
+class ChunkedCreateTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def test_create(self):
+        prov_document = examples.large_document(100)
+        document = self.api.document.create(prov_document, name="test_chunked_create", chunk_size=30, concurrency=4)
+
+        stored = self.store.documents[document.id]
+        self.assertEqual(len(stored['bundles']), 4)
+        self.assertEqual(len(document.bundles), 4)
+
+        bundles = [(bundle.identifier, bundle.prov) for bundle in document.bundles.iter_prov()]
+        self.assertEqual(merged(bundles), prov_document)
+
+    def test_small_documents_in_one_request(self):
+        document = self.api.document.create(examples.flat_document(), name="test_small", chunk_size=30)
+        self.assertEqual(self.store.documents[document.id]['bundles'], [])
+
+    def test_incomplete(self):
+        add_bundle = self.api.add_bundle
+
+        def failing_add_bundle(document_id, prov_bundle, identifier):
+            if str(identifier) == 'chunk:2':
+                raise InvalidDataException()
+            return add_bundle(document_id, prov_bundle, identifier)
+
+        self.api.add_bundle = failing_add_bundle
+
+        with self.assertRaises(IncompleteUploadException) as context:
+            self.api.document.create(examples.large_document(100), name="test_incomplete", chunk_size=30)
+
+        exception = context.exception
+        self.assertEqual([str(result.item[0]) for result in exception.failures], ['chunk:2'])
+        self.assertEqual(len(self.store.documents[exception.document.id]['bundles']), 3)
+
+
+class ChunkedDedupTests(FakeProvStoreTestMixin, unittest.TestCase):
+    api_options = {'dedup': True}
+
+    def test_different_documents_same_skeleton(self):
+        first = self.api.document.create(examples.large_document(40), name="A", chunk_size=10)
+        second = self.api.document.create(examples.large_document(38), name="B", chunk_size=10)
+
+        self.assertNotEqual(first.id, second.id)
+        # Uploaded in parallel, in no particular order
+        self.assertEqual(sorted(bundle['identifier'] for bundle in self.store.documents[first.id]['bundles']),
+                         ['chunk:1', 'chunk:2', 'chunk:3', 'chunk:4'])
+
+    def test_same_document(self):
+        first = self.api.document.create(examples.large_document(40), name="A", chunk_size=10)
+        requests = self.store.requests
+
+        self.assertEqual(self.api.document.create(examples.large_document(40), name="A", chunk_size=10).id, first.id)
+        self.assertEqual(self.store.requests, requests)
+        self.assertEqual(len(self.store.documents[first.id]['bundles']), 4)
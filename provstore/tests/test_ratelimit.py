@@ -0,0 +1,102 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+import multiprocessing
+
+from provstore.api import Api, RateLimitException
+from provstore.ratelimit import TokenBucket, FileTokenBucket, RateLimiter
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+def _drain(path, count):
+    bucket = FileTokenBucket(path, rate=50, burst=1)
+    for _ in range(count):
+        bucket.acquire()
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=100, burst=5)
+
+        started_at = time.time()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertLess(time.time() - started_at, 0.02)
+
+        for _ in range(5):
+            bucket.acquire()
+        self.assertGreaterEqual(time.time() - started_at, 0.045)
+
+    def test_max_wait(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        self.assertTrue(bucket.acquire(max_wait=0))
+        self.assertFalse(bucket.acquire(max_wait=0.1))
+
+    def test_shared_by_threads(self):
+        bucket = TokenBucket(rate=200, burst=1)
+
+        def drain():
+            for _ in range(10):
+                bucket.acquire()
+
+        started_at = time.time()
+        threads = [threading.Thread(target=drain) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 40 tokens, the first of which was in the bucket
+        self.assertGreaterEqual(time.time() - started_at, 39 / 200.0 - 0.01)
+
+
+class FileTokenBucketTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'bucket')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_state_shared_between_instances(self):
+        FileTokenBucket(self.path, rate=1, burst=2).acquire(2)
+        self.assertFalse(FileTokenBucket(self.path, rate=1, burst=2).acquire(max_wait=0.1))
+
+    def test_shared_by_processes(self):
+        started_at = time.time()
+        processes = [multiprocessing.Process(target=_drain, args=(self.path, 5)) for _ in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        self.assertEqual([process.exitcode for process in processes], [0, 0])
+        self.assertGreaterEqual(time.time() - started_at, 9 / 50.0 - 0.01)
+
+
+class RateLimiterTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def test_per_method(self):
+        limiter = RateLimiter(default=TokenBucket(rate=1000), post=TokenBucket(rate=1, burst=1), max_wait=0.1)
+        self.api.rate_limiter = limiter
+
+        document = self.api.document.create(examples.flat_document(), name="rate limited")
+        with self.assertRaises(RateLimitException):
+            self.api.document.create(examples.flat_document(), name="rate limited")
+
+        # Reads have their own bucket
+        self.api.document.get(document.id)
+        self.assertEqual(self.store.requests, 3)
+
+    def test_bucket_limits_all_methods(self):
+        self.api.close()
+        self.api = Api(base_url=self.server.base_url, rate_limiter=TokenBucket(rate=1, burst=1))
+        self.api.rate_limiter.max_wait = 0
+
+        document = self.store.add_document(examples.flat_document().serialize(), "rate limited")
+        self.api.get_document_meta(document)
+        with self.assertRaises(RateLimitException):
+            self.api.get_document_meta(document)
@@ -0,0 +1,100 @@
+import time
+import unittest
+
+import requests
+
+from provstore.api import Api, ProvStoreException, NotFoundException
+from provstore.compat import clock as _clock
+from provstore.retry import RetryPolicy
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+class Response(object):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RetryPolicyTests(unittest.TestCase):
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=5, jitter=False)
+        self.assertEqual([policy.backoff(attempt) for attempt in range(5)], [1, 2, 4, 5, 5])
+
+        policy = RetryPolicy(backoff_factor=1, max_backoff=5)
+        for attempt in range(5):
+            self.assertTrue(0 <= policy.backoff(attempt) <= min(5, 2 ** attempt))
+
+    def test_idempotency(self):
+        policy = RetryPolicy()
+        started_at = _clock()
+
+        self.assertIsNotNone(policy.retry_delay('get', 0, started_at, response=Response(503)))
+        self.assertIsNotNone(policy.retry_delay('delete', 0, started_at, response=Response(503)))
+        self.assertIsNone(policy.retry_delay('post', 0, started_at, response=Response(503)))
+        self.assertIsNone(policy.retry_delay('get', 0, started_at, response=Response(404)))
+        self.assertIsNone(policy.retry_delay('get', 3, started_at, response=Response(503)))
+
+        # Never sent so always safe to retry
+        self.assertIsNotNone(policy.retry_delay('post', 0, started_at,
+                                                exception=requests.exceptions.ConnectTimeout()))
+        self.assertIsNone(policy.retry_delay('post', 0, started_at, exception=requests.exceptions.ReadTimeout()))
+
+        policy = RetryPolicy(retry_post=True)
+        self.assertIsNotNone(policy.retry_delay('post', 0, started_at, response=Response(503)))
+
+    def test_retry_after(self):
+        policy = RetryPolicy(jitter=False, backoff_factor=0.1)
+
+        self.assertEqual(policy.retry_delay('get', 0, _clock(), response=Response(503, {'Retry-After': '7'})), 7)
+        self.assertAlmostEqual(policy.retry_after(Response(503, {
+            'Retry-After': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 60))
+        })), 60, delta=2)
+
+    def test_deadline(self):
+        policy = RetryPolicy(jitter=False, backoff_factor=1, deadline=1.5)
+
+        self.assertEqual(policy.retry_delay('get', 0, _clock(), response=Response(503)), 1)
+        self.assertIsNone(policy.retry_delay('get', 1, _clock(), response=Response(503)))
+        self.assertIsNone(policy.retry_delay('get', 0, _clock() - 1, response=Response(503)))
+
+
+class ApiRetryTests(FakeProvStoreTestMixin, unittest.TestCase):
+    api_options = {'retry': RetryPolicy(backoff_factor=0.01)}
+
+    def setUp(self):
+        super(ApiRetryTests, self).setUp()
+        self.document_id = self.store.add_document(examples.flat_document().serialize(), "test_retry")
+
+    def test_retries_transient_errors(self):
+        self.store.fail(503, times=2)
+        self.assertEqual(self.api.get_document_meta(self.document_id)['document_name'], "test_retry")
+        self.assertEqual(self.store.requests, 3)
+
+    def test_gives_up(self):
+        self.store.fail(500, times=10)
+        with self.assertRaises(ProvStoreException):
+            self.api.get_document_meta(self.document_id)
+        self.assertEqual(self.store.requests, 4)
+
+    def test_post_not_retried(self):
+        self.store.fail(503)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.api.document.create(examples.flat_document(), name="test_post_not_retried")
+        self.assertEqual(self.store.requests, 1)
+
+    def test_post_opt_in(self):
+        self.api.retry = RetryPolicy(backoff_factor=0.01, retry_post=True)
+        self.store.fail(503)
+        self.api.document.create(examples.flat_document(), name="test_post_opt_in")
+        self.assertEqual(self.store.requests, 2)
+
+    def test_client_errors_not_retried(self):
+        with self.assertRaises(NotFoundException):
+            self.api.get_document_meta(-1)
+        self.assertEqual(self.store.requests, 1)
+
+    def test_connection_errors(self):
+        api = Api(base_url='http://127.0.0.1:1/store/api/v0', retry=RetryPolicy(backoff_factor=0.01))
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            api.get_document_meta(1)
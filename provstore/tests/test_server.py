@@ -0,0 +1,69 @@
+import time
+import unittest
+
+import requests
+
+from provstore.api import Api, InvalidCredentialsException, ForbiddenException
+from provstore.tests.server import FakeProvStore, FakeProvStoreServer
+import provstore.tests.examples as examples
+
+
+class FakeProvStoreTests(unittest.TestCase):
+    def serve(self, **options):
+        server = FakeProvStoreServer(FakeProvStore(**options)).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_latency(self):
+        server = self.serve(latency=(0.05, 0.06))
+        document_id = server.store.add_document(examples.flat_document().serialize(), "latency")
+
+        started_at = time.time()
+        Api(base_url=server.base_url).get_document_meta(document_id)
+        self.assertGreaterEqual(time.time() - started_at, 0.05)
+
+    def test_failure_rate(self):
+        server = self.serve(failure_rate=0.5, seed=1)
+        url = server.base_url + '/documents/1/'
+
+        statuses = [requests.get(url).status_code for _ in range(40)]
+        self.assertEqual(set(statuses), {503, 404})
+        self.assertTrue(10 < statuses.count(503) < 30)
+
+    def test_pagination(self):
+        server = self.serve(page_size=2)
+        document_id = server.store.add_document(examples.flat_document().serialize(), "pages")
+        for i in range(5):
+            server.store.add_bundle(document_id, examples.flat_document().serialize(), 'ex:bundle-%i' % i)
+
+        host = server.base_url.split('/store')[0]
+        url, identifiers = server.base_url + '/documents/%i/bundles/' % document_id, []
+        while url:
+            page = requests.get(url).json()
+            identifiers.extend(bundle['identifier'] for bundle in page['objects'])
+            self.assertEqual(page['meta']['total_count'], 5)
+            url = host + page['meta']['next'] if page['meta']['next'] else None
+
+        self.assertEqual(identifiers, ['ex:bundle-%i' % i for i in range(5)])
+
+    def test_authorization(self):
+        server = self.serve(api_keys={'owner': 'key', 'other': 'key'})
+        document = examples.flat_document()
+
+        owner = Api(username='owner', api_key='key', base_url=server.base_url)
+        private = owner.document.create(document, name="private")
+        public = owner.document.create(document, name="public", public=True)
+        self.assertEqual(private.owner, 'owner')
+
+        with self.assertRaises(InvalidCredentialsException):
+            Api(username='owner', api_key='bad', base_url=server.base_url).get_document_meta(public.id)
+        with self.assertRaises(InvalidCredentialsException):
+            Api(base_url=server.base_url).document.create(document, name="anonymous")
+
+        for api in (Api(base_url=server.base_url), Api(username='other', api_key='key', base_url=server.base_url)):
+            self.assertEqual(api.get_document_meta(public.id)['id'], public.id)
+            with self.assertRaises(ForbiddenException):
+                api.get_document_meta(private.id)
+
+        with self.assertRaises(ForbiddenException):
+            Api(username='other', api_key='key', base_url=server.base_url).delete_document(public.id)
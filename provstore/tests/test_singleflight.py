@@ -0,0 +1,90 @@
+import time
+import unittest
+import threading
+
+from provstore.api import NotFoundException
+from provstore.singleflight import SingleFlight
+from provstore.stats import StatsCollector
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+def run_threads(fn, count):
+    results = [None] * count
+
+    def worker(i):
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SingleFlightTests(unittest.TestCase):
+    def test_concurrent_calls_share(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return object()
+
+        results = run_threads(lambda: single_flight.do('key', slow), 5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(id(value) for value, shared in results)), 1)
+        self.assertEqual(sorted(shared for value, shared in results), [False] + [True] * 4)
+        self.assertEqual(single_flight.stats(), {'calls': 1, 'coalesced': 4})
+
+        # Nothing in flight, a new call is made
+        single_flight.do('key', slow)
+        self.assertEqual(len(calls), 2)
+
+    def test_exception_shared(self):
+        single_flight = SingleFlight()
+
+        def fail():
+            time.sleep(0.05)
+            raise ValueError()
+
+        results = run_threads(lambda: single_flight.do('key', fail), 3)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(single_flight.calls, 1)
+
+
+class ApiSingleFlightTests(FakeProvStoreTestMixin, unittest.TestCase):
+    api_options = {'single_flight': True}
+
+    def setUp(self):
+        super(ApiSingleFlightTests, self).setUp()
+        self.api.stats = StatsCollector()
+        self.store.latency = 0.1
+        self.document_id = self.store.add_document(examples.flat_document().serialize(), "popular")
+
+    def test_document_prov(self):
+        results = run_threads(lambda: self.api.get_document_prov(self.document_id), 8)
+
+        self.assertEqual(self.store.requests, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(results[0], examples.flat_document())
+        self.assertEqual(self.api.single_flight.coalesced, 7)
+        self.assertEqual(self.api.stats.as_dict()['coalesced'], 7)
+        self.assertEqual(self.api.stats.as_dict()['parsing']['count'], 1)
+
+    def test_formats_not_shared(self):
+        run_threads(lambda: self.api.get_document_prov(self.document_id), 2)
+        run_threads(lambda: self.api.get_document_prov(self.document_id, 'json'), 2)
+        self.assertEqual(self.store.requests, 2)
+
+    def test_errors_shared(self):
+        results = run_threads(lambda: self.api.get_document_prov(-1), 4)
+
+        self.assertEqual(self.store.requests, 1)
+        self.assertTrue(all(isinstance(result, NotFoundException) for result in results))
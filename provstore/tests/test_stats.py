@@ -0,0 +1,96 @@
+import unittest
+
+from provstore.api import Api
+from provstore.cache import MemoryCache
+from provstore.retry import RetryPolicy
+from provstore.stats import StatsCollector, RequestEvent
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+class StatsCollectorTests(unittest.TestCase):
+    def test_histogram(self):
+        stats = StatsCollector(buckets=(0.1, 1, float('inf')))
+        for elapsed in (0.05, 0.5, 0.5, 5):
+            event = RequestEvent('get', '/documents/1.json', 'documents')
+            event.elapsed = elapsed
+            stats.after_request(event)
+
+        documents = stats.as_dict()['endpoints']['documents']
+        self.assertEqual(documents['latency'], [(0.1, 1), (1, 3), (float('inf'), 4)])
+        self.assertEqual(documents['requests'], 4)
+        self.assertEqual(documents['statuses'], {None: 4})
+
+    def test_prometheus(self):
+        stats = StatsCollector(buckets=(1, float('inf')))
+        event = RequestEvent('post', '/documents/', 'documents', attempt=1, bytes_sent=10)
+        event.elapsed = 0.5
+        event.exception = ValueError()
+        stats.after_request(event)
+        stats.record_cache(True)
+
+        text = stats.to_prometheus()
+        self.assertIn('provstore_request_duration_seconds_bucket{endpoint="documents",le="1"} 1', text)
+        self.assertIn('provstore_request_duration_seconds_bucket{endpoint="documents",le="+Inf"} 1', text)
+        self.assertIn('provstore_requests_total{endpoint="documents",status="ValueError"} 1', text)
+        self.assertIn('provstore_retries_total{endpoint="documents"} 1', text)
+        self.assertIn('provstore_sent_bytes_total{endpoint="documents"} 10', text)
+        self.assertIn('provstore_cache_hits_total 1', text)
+        self.assertIn('# TYPE provstore_request_duration_seconds histogram', text)
+
+
+class ApiStatsTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(ApiStatsTests, self).setUp()
+        self.stats = StatsCollector()
+        self.api.close()
+        self.api = Api(username='provstore-api-test', api_key='secret', base_url=self.server.base_url,
+                       stats=self.stats, cache=MemoryCache(), retry=RetryPolicy(backoff_factor=0.01))
+
+    def test_requests(self):
+        document = self.api.document.create(examples.flat_document(), name="stats")
+        self.api.document.get(document.id)
+        # Provenance is only parsed once used
+        self.api.document.get(document.id).prov.get_records()
+
+        stats = self.stats.as_dict()
+        self.assertEqual(stats['endpoints']['documents']['requests'], 3)
+        self.assertEqual(stats['endpoints']['documents']['statuses'], {201: 1, 200: 1, 304: 1})
+        self.assertEqual(stats['endpoints']['metadata']['requests'], 2)
+        self.assertGreater(stats['endpoints']['documents']['bytes_sent'], 0)
+        self.assertGreater(stats['endpoints']['documents']['bytes_received'], 0)
+
+        self.assertEqual(stats['cache'], {'hits': 1, 'misses': 1})
+        self.assertEqual(stats['parsing']['count'], 1)
+        self.assertGreater(stats['wire_seconds'], 0)
+
+    def test_streamed_bytes(self):
+        document_id = self.store.add_document(examples.large_document(100).serialize(), "stats")
+        content = b''.join(self.api.get_document_prov(document_id, 'json', stream=True))
+
+        self.assertEqual(self.stats.as_dict()['endpoints']['documents']['bytes_received'], len(content))
+
+    def test_retries(self):
+        document_id = self.store.add_document(examples.flat_document().serialize(), "stats")
+        self.store.fail(503, times=2)
+        self.api.get_document_meta(document_id)
+
+        metadata = self.stats.as_dict()['endpoints']['metadata']
+        self.assertEqual(metadata['retries'], 2)
+        self.assertEqual(metadata['statuses'], {503: 2, 200: 1})
+
+    def test_hooks(self):
+        events = []
+        self.api.register_hook('before_request', lambda event: events.append(('before', event.elapsed)))
+        self.api.register_hook('after_request', lambda event: events.append(('after', event.status)))
+
+        document_id = self.store.add_document(examples.flat_document().serialize(), "stats")
+        self.api.get_document_meta(document_id)
+        self.assertEqual(events, [('before', None), ('after', 200)])
+
+        with self.assertRaises(ValueError):
+            self.api.register_hook('response', lambda event: None)
+
+    def test_timeout(self):
+        self.assertEqual(Api().timeout, 30)
+        self.assertEqual(Api(timeout=5).timeout, 5)
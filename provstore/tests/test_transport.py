@@ -0,0 +1,56 @@
+import unittest
+import threading
+
+from provstore.api import Api
+from provstore.tests.server import FakeProvStoreServer, FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+class PooledTransportTests(FakeProvStoreTestMixin, unittest.TestCase):
+    def test_connection_reuse(self):
+        document = self.api.document.create(examples.flat_document(), name="test_connection_reuse")
+
+        for _ in range(10):
+            self.api.document.get(document.id)
+
+        # Provenance and metadata are read concurrently, over at most two connections
+        self.assertLessEqual(self.store.connections, 2)
+
+    def test_shared_pool_across_threads(self):
+        api = Api(base_url=self.server.base_url, pool_maxsize=2, pool_block=True)
+        document_id = self.store.add_document(examples.flat_document().serialize(), "test_shared_pool")
+
+        def read():
+            for _ in range(5):
+                api.get_document_meta(document_id)
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.store.requests, 40)
+        self.assertLessEqual(self.store.connections, 2)
+        api.close()
+
+    def test_no_keep_alive(self):
+        api = Api(base_url=self.server.base_url, keep_alive=False)
+        document_id = self.store.add_document(examples.flat_document().serialize(), "test_no_keep_alive")
+
+        for _ in range(3):
+            api.get_document_meta(document_id)
+
+        self.assertEqual(self.store.connections, 3)
+        api.close()
+
+    def test_context_manager(self):
+        with FakeProvStoreServer() as server:
+            document_id = server.store.add_document(examples.flat_document().serialize(), "test_context_manager")
+
+            with Api(base_url=server.base_url) as api:
+                api.get_document_meta(document_id)
+
+            # Pooled connections are released on exit
+            api.get_document_meta(document_id)
+            self.assertEqual(server.store.connections, 2)
@@ -0,0 +1,95 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from concurrent.futures import CancelledError
+
+from provstore.api import InvalidDataException
+from provstore.retry import RetryPolicy
+from provstore.tests.server import FakeProvStoreTestMixin
+import provstore.tests.examples as examples
+
+
+class UploaderTests(FakeProvStoreTestMixin, unittest.TestCase):
+    api_options = {'retry': RetryPolicy(max_retries=0)}
+
+    def setUp(self):
+        super(UploaderTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.journal = os.path.join(self.directory, 'journal.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(UploaderTests, self).tearDown()
+
+    def journal_ops(self):
+        with open(self.journal) as f:
+            return [json.loads(line)['op'] for line in f]
+
+    def test_create_and_add_bundle(self):
+        prov_document = examples.flat_document()
+
+        with self.api.uploader(self.journal, workers=2) as uploader:
+            futures = [uploader.create(prov_document, name="test_uploader_%i" % i, public=True) for i in range(5)]
+            document_id = futures[0].result(timeout=5)
+            bundle = uploader.add_bundle(document_id, prov_document, 'ex:bundle')
+
+        self.assertEqual(bundle.result(), document_id)
+        self.assertEqual(uploader.uploaded, 6)
+        self.assertEqual(uploader.pending, 0)
+
+        for i, future in enumerate(futures):
+            document = self.store.documents[future.result()]
+            self.assertEqual(document['document_name'], "test_uploader_%i" % i)
+            self.assertTrue(document['public'])
+        self.assertEqual(self.store.documents[document_id]['bundles'][0]['identifier'], 'ex:bundle')
+
+        self.assertEqual(self.journal_ops().count('enqueue'), 6)
+        self.assertEqual(self.journal_ops().count('ack'), 6)
+        self.assertEqual(self.api.document.get(futures[1].result()).prov, prov_document)
+
+    def test_transient_failures_are_retried(self):
+        self.store.fail(503, times=2)
+
+        with self.api.uploader(self.journal, workers=1, retry_delay=0.01) as uploader:
+            future = uploader.create(examples.flat_document(), name="test_transient_failures_are_retried")
+            self.assertTrue(future.result(timeout=5) in self.store.documents)
+
+    def test_permanent_failures(self):
+        self.store.fail(400)
+
+        with self.api.uploader(self.journal, workers=1) as uploader:
+            future = uploader.create(examples.flat_document(), name="test_permanent_failures")
+            self.assertTrue(isinstance(future.exception(timeout=5), InvalidDataException))
+
+        self.assertEqual(uploader.failed, 1)
+        self.assertEqual(self.journal_ops(), ['enqueue', 'fail'])
+
+    def test_replay(self):
+        # No workers, as if the process stopped before uploading anything
+        uploader = self.api.uploader(self.journal, workers=0)
+        futures = [uploader.create(examples.flat_document(), name="test_replay_%i" % i) for i in range(3)]
+        self.assertFalse(uploader.close(timeout=0))
+        self.assertRaises(CancelledError, futures[0].result)
+
+        with open(self.journal, 'ab') as f:
+            f.write(b'{"op": "enqueue", "id": "trunc')
+
+        with self.api.uploader(self.journal) as uploader:
+            self.assertEqual(len(uploader.replayed), 3)
+            document_ids = [future.result(timeout=5) for future in uploader.replayed]
+
+        self.assertEqual([self.store.documents[document_id]['document_name'] for document_id in document_ids],
+                         ["test_replay_%i" % i for i in range(3)])
+
+        # Compacted on open, acknowledged entries are not replayed again
+        with self.api.uploader(self.journal) as uploader:
+            self.assertEqual(uploader.replayed, [])
+        self.assertEqual(self.journal_ops(), [])
+
+    def test_closed(self):
+        uploader = self.api.uploader()
+        uploader.close()
+        self.assertRaises(RuntimeError, uploader.create, examples.flat_document(), name="test_closed")
@@ -0,0 +1,373 @@
+"""
+Write-behind uploads for :py:class:`provstore.api.Api`.
+
+An :py:class:`Uploader` takes documents and bundles off the caller's hands: they are written to an append-only
+journal on local disk and uploaded by background threads, each call returning a future for the stored document's ID:
+  >>> with api.uploader('/var/lib/provstore/journal.jsonl', workers=4) as uploader:
+  ...     future = uploader.create(prov_document, name="name")
+  ...     uploader.add_bundle(148, prov_bundle, 'ex:bundle')
+  >>> future.result()
+  1042
+
+Uploads failing because the store is unavailable are retried until they succeed. Entries not uploaded when the
+process stops, or crashes, are uploaded again when an uploader is next opened on the journal, their futures are in
+:py:attr:`Uploader.replayed`.
+
+.. note::
+   Uploads are made at least once: an entry uploaded just before a crash, but not yet acknowledged in the journal, is
+   uploaded again on replay.
+"""
+import os
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, CancelledError
+
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue
+
+import requests
+from prov.model import ProvDocument
+from prov.serializers.provjson import encode_json_document
+from provstore.cache import _replace
+from provstore.compat import clock as _clock
+
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUE = 1000
+DEFAULT_BATCH_SIZE = 20
+
+
+class _Entry(object):
+    def __init__(self, entry_id, kind, content, prov_format, fields, future=None):
+        self.id = entry_id
+        self.kind = kind
+        # Encoded PROV-JSON, or the document serialized in prov_format
+        self.content = content
+        self.prov_format = prov_format
+        # Document properties or bundle location
+        self.fields = fields
+        self.future = future if future is not None else Future()
+        self.attempts = 0
+
+
+class Uploader(object):
+    """
+    Uploads documents and bundles in the background, journaling them until they are stored.
+
+    Entries are journaled before the call returns, one line each with ``"op": "enqueue"``. Workers take up to
+    ``batch_size`` entries at a time off a bounded queue, upload them one by one and then journal their outcome with
+    a single write (``"op": "ack"`` or ``"op": "fail"``). The journal is compacted to the entries still pending each
+    time an uploader is opened on it.
+
+    Errors from the store that retrying cannot fix, e.g. invalid data, fail the entry's future. Other failures, like
+    timeouts or server errors, are retried with exponential backoff for as long as the uploader runs.
+
+    :param api: The client to upload with
+    :type api: :py:class:`provstore.api.Api`
+    :param str journal: Path of the journal, None to keep entries in memory only
+    :param int workers: Number of upload threads
+    :param int max_queue: Most entries waiting for upload, beyond which :py:meth:`create` and :py:meth:`add_bundle`
+                          block
+    :param int batch_size: Most entries a worker takes at once
+    :param bool sync: Whether to fsync the journal after each write, so entries survive power loss and not only crashes
+    :param float retry_delay: Seconds to wait before the first retry of an entry, doubled on each retry
+    :param float max_retry_delay: Longest wait between two retries of an entry
+    """
+    def __init__(self, api, journal=None, workers=DEFAULT_WORKERS, max_queue=DEFAULT_MAX_QUEUE,
+                 batch_size=DEFAULT_BATCH_SIZE, sync=True, retry_delay=1.0, max_retry_delay=60.0):
+        self._api = api
+        self.journal = journal
+        self.batch_size = batch_size
+        self.sync = sync
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self.uploaded = 0
+        self.failed = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._stopping = threading.Event()
+        self._journal_lock = threading.Lock()
+        self._journal_file = None
+
+        replay = self._open_journal() if journal is not None else []
+
+        self._workers = [threading.Thread(target=self._work) for _ in range(workers)]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+
+        #: Futures of the entries left pending in the journal by a previous run, uploaded again
+        self.replayed = []
+        for entry in replay:
+            self._submit(entry)
+            self.replayed.append(entry.future)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return "<Uploader %i pending, %i uploaded, %i failed>" % (self.pending, self.uploaded, self.failed)
+
+    @property
+    def pending(self):
+        """
+        Number of entries not yet uploaded
+        """
+        with self._condition:
+            return len(self._pending)
+
+    # Journal
+    def _open_journal(self):
+        pending = OrderedDict()
+
+        if os.path.exists(self.journal):
+            with open(self.journal, 'rb') as f:
+                for line in f:
+                    try:
+                        record = self._api.codec.loads(line)
+                    except ValueError:
+                        # Partly written when the process stopped
+                        continue
+
+                    if record.get('op') == 'enqueue':
+                        pending[record['id']] = record
+                    else:
+                        pending.pop(record.get('id'), None)
+
+        entries = []
+        for record in pending.values():
+            content = record['content']
+            if record['format'] == 'json':
+                content = self._api.codec.dumps(content)
+            entries.append(_Entry(record['id'], record['kind'], content, record['format'], record['fields']))
+
+        # Compact to the pending entries
+        temp_path = '%s.%s.tmp' % (self.journal, uuid.uuid4().hex)
+        with open(temp_path, 'wb') as f:
+            for entry in entries:
+                f.write(self._enqueue_record(entry))
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(temp_path, self.journal)
+
+        self._journal_file = open(self.journal, 'ab')
+        return entries
+
+    def _enqueue_record(self, entry):
+        from provstore.api import _json_envelope
+
+        fields = dict(op='enqueue', id=entry.id, kind=entry.kind, format=entry.prov_format,
+                      fields=entry.fields)
+        return b''.join(_json_envelope(self._api.codec, entry.content, entry.prov_format, **fields)) + b'\n'
+
+    def _write_journal(self, records):
+        if self._journal_file is None:
+            return
+
+        with self._journal_lock:
+            self._journal_file.write(b''.join(records))
+            self._journal_file.flush()
+            if self.sync:
+                os.fsync(self._journal_file.fileno())
+
+    # Submission
+    def _encode(self, prov_document, prov_format):
+        codec = self._api.codec
+
+        if isinstance(prov_document, ProvDocument):
+            return codec.dumps(encode_json_document(prov_document)), 'json'
+
+        if prov_format is None or prov_format == 'json':
+            # Normalized to a single line of JSON for the journal
+            return codec.dumps(codec.loads(prov_document)), 'json'
+
+        if isinstance(prov_document, bytes):
+            prov_document = prov_document.decode('utf-8')
+        return prov_document, prov_format
+
+    def _submit(self, entry):
+        if self._stopping.is_set():
+            raise RuntimeError("The uploader is closed")
+
+        with self._condition:
+            self._pending[entry.id] = entry
+        self._queue.put(entry)
+        return entry.future
+
+    def create(self, prov_document, prov_format=None, **props):
+        """
+        Journal a document and queue it for upload, see :py:meth:`provstore.document.Document.create`
+
+        :param dict props: Properties for the document [**name** (required), **public** = False]
+        :return: A future resolving to the stored document's ID
+        :rtype: :py:class:`concurrent.futures.Future`
+        """
+        if not props.get('name'):
+            raise ValueError("Documents need a name")
+
+        content, prov_format = self._encode(prov_document, prov_format)
+        entry = _Entry(uuid.uuid4().hex, 'document', content, prov_format,
+                       {'name': props['name'], 'public': props.get('public', False)})
+
+        self._write_journal([self._enqueue_record(entry)])
+        return self._submit(entry)
+
+    def add_bundle(self, document_id, prov_bundle, identifier):
+        """
+        Journal a bundle and queue it for upload, see :py:meth:`provstore.document.Document.add_bundle`
+
+        :param int document_id: ID of the document to add the bundle to
+        :return: A future resolving to the document's ID
+        :rtype: :py:class:`concurrent.futures.Future`
+        """
+        content, prov_format = self._encode(prov_bundle, 'json')
+        entry = _Entry(uuid.uuid4().hex, 'bundle', content, prov_format,
+                       {'document_id': document_id, 'identifier': identifier})
+
+        self._write_journal([self._enqueue_record(entry)])
+        return self._submit(entry)
+
+    # Upload
+    def _upload(self, entry):
+        if entry.kind == 'document':
+            return self._api._create_document(entry.content, entry.prov_format, entry.fields['name'],
+                                              public=entry.fields['public'])
+
+        self._api.add_bundle(entry.fields['document_id'], entry.content, entry.fields['identifier'])
+        return entry.fields['document_id']
+
+    @staticmethod
+    def _transient(exception):
+        # Failures that may succeed if retried later
+        from provstore.api import (ProvStoreException, RequestTimeoutException, CircuitOpenException,
+                                   ConcurrencyLimitException, RateLimitException)
+
+        if isinstance(exception, (RequestTimeoutException, CircuitOpenException, ConcurrencyLimitException,
+                                  RateLimitException, requests.exceptions.ConnectionError,
+                                  requests.exceptions.Timeout)):
+            return True
+        if isinstance(exception, requests.exceptions.HTTPError):
+            response = exception.response
+            return response is None or response.status_code >= 500 or response.status_code == 429
+        # Server errors are raised as the base exception, client errors as subclasses
+        return type(exception) is ProvStoreException
+
+    def _take(self, retries):
+        # Entries to retry first, then whatever is queued up to the batch size, blocking only for the first entry
+        batch = list(retries)
+        while len(batch) < self.batch_size and not self._stopping.is_set():
+            try:
+                batch.append(self._queue.get(block=not batch, timeout=0.05))
+            except queue.Empty:
+                if batch:
+                    break
+        return batch
+
+    @staticmethod
+    def _resolve(future, value=None, exception=None):
+        # The caller may have cancelled the future meanwhile
+        if future.cancelled():
+            return
+        if exception is None:
+            future.set_result(value)
+        else:
+            future.set_exception(exception)
+
+    def _work(self):
+        retries = []
+
+        while not self._stopping.is_set():
+            batch = self._take(retries)
+
+            outcomes, retries = [], []
+            for entry in batch:
+                if entry.future.cancelled():
+                    outcomes.append((entry, None, CancelledError()))
+                    continue
+
+                try:
+                    outcomes.append((entry, self._upload(entry), None))
+                except Exception as e:
+                    if self._transient(e):
+                        retries.append(entry)
+                    else:
+                        outcomes.append((entry, None, e))
+
+            self._write_journal([
+                self._api.codec.dumps({'op': 'ack', 'id': entry.id, 'document_id': value} if exception is None else
+                                      {'op': 'fail', 'id': entry.id, 'error': repr(exception)}) + b'\n'
+                for entry, value, exception in outcomes
+            ])
+
+            with self._condition:
+                for entry, value, exception in outcomes:
+                    del self._pending[entry.id]
+                    if exception is None:
+                        self.uploaded += 1
+                    else:
+                        self.failed += 1
+                self._condition.notify_all()
+
+            for entry, value, exception in outcomes:
+                self._resolve(entry.future, value, exception)
+
+            if retries:
+                attempts = min(entry.attempts for entry in retries)
+                for entry in retries:
+                    entry.attempts += 1
+                # Interrupted by close, the entries stay in the journal
+                self._stopping.wait(min(self.max_retry_delay, self.retry_delay * 2 ** attempts))
+
+    def flush(self, timeout=None):
+        """
+        Wait for all entries queued so far to be uploaded or to fail
+
+        :return: Whether no entry is pending anymore
+        :rtype: bool
+        """
+        deadline = None if timeout is None else _clock() + timeout
+
+        with self._condition:
+            while self._pending:
+                remaining = None if deadline is None else deadline - _clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def close(self, timeout=None):
+        """
+        Wait for pending entries to be uploaded, then stop the workers.
+
+        Entries still pending after ``timeout`` seconds remain in the journal, to be uploaded by the next uploader
+        opened on it, and their futures are cancelled.
+
+        :param float timeout: Seconds to wait for pending entries, None to wait until they are all uploaded
+        :return: Whether all entries were uploaded or failed
+        :rtype: bool
+        """
+        drained = self.flush(timeout)
+
+        self._stopping.set()
+        for worker in self._workers:
+            worker.join()
+
+        with self._condition:
+            for entry in self._pending.values():
+                entry.future.cancel()
+
+        if self._journal_file is not None:
+            with self._journal_lock:
+                self._journal_file.close()
+                self._journal_file = None
+
+        return drained
@@ -10,8 +10,13 @@ setup(name='provstore-api',
     packages=['provstore'],
     install_requires=[
         'prov>=1.0.0',
-        'requests'
+        'requests',
+        'futures; python_version < "3.0"',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'fast': ['orjson; python_version >= "3.6"'],
+    },
     license="MIT",
-    test_suite='provstore.tests',
+    test_suite='provstore.tests.suite',
 )